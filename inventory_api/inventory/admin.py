@@ -1,6 +1,20 @@
 from django.contrib import admin
-from .models import Product, ProductMedia
+from .models import Product, ProductMedia, StockMovement
 
 # Register your models here.
 admin.site.register(Product)
-admin.site.register(ProductMedia)
+
+
+@admin.register(ProductMedia)
+class ProductMediaAdmin(admin.ModelAdmin):
+    list_display = ["__str__", "media_type", "created_at"]
+    # __str__ reads product.name; join it instead of one query per row
+    list_select_related = ["product"]
+    raw_id_fields = ["product"]
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(admin.ModelAdmin):
+    list_display = ["product_id", "delta", "reason", "reference", "created_at"]
+    list_filter = ["reason"]
+    search_fields = ["=product_id", "reference"]
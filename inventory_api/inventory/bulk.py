@@ -0,0 +1,191 @@
+import uuid
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import transaction
+from rest_framework.validators import UniqueValidator
+
+from .ledger import record_movements
+from .models import Product, StockMovement, touch_and_bulk_update
+from .serializers import ProductUpdateSerializer
+from .sync import record_deletions
+
+UPDATED = "updated"
+UNCHANGED = "unchanged"
+DELETED = "deleted"
+NOT_FOUND = "not_found"
+INVALID = "invalid"
+
+
+class ProductBulkMutation:
+    """
+    Apply a list of `{"id", "changes"}` and `{"id", "delete": true}`
+    operations. Targets are locked with one query, changes are
+    validated with `ProductUpdateSerializer` (partial), new skus are
+    checked with one query for the whole request, changes are written with
+    one `bulk_update` per set of changed columns, and deletes go out as one
+    DELETE. Every operation gets a result, in request order.
+    """
+
+    def __init__(self, operations):
+        self.operations = operations
+        self.results = [None] * len(operations)
+
+    def run(self):
+        ids = {}
+        for index, operation in enumerate(self.operations):
+            pk = self.parse_operation(index, operation)
+            if pk is None:
+                continue
+            if pk in ids.values():
+                self.fail(index, operation.get("id"), "Duplicate id in this request.")
+                continue
+            ids[index] = pk
+
+        with transaction.atomic():
+            # Locked in pk order, like order.stock, so quantities are
+            # overwritten and recorded against the values they replace
+            products = {
+                product.pk: product
+                for product in Product.objects.select_for_update()
+                .filter(pk__in=set(ids.values()))
+                .order_by("pk")
+            }
+            updates, deletes = self.plan(ids, products)
+            self.write(updates, deletes)
+        return self.results
+
+    def plan(self, ids, products):
+        self.quantities = {pk: product.quantity for pk, product in products.items()}
+        deletes = []
+        validated = []
+        for index, pk in ids.items():
+            operation = self.operations[index]
+            product = products.get(pk)
+            if product is None:
+                self.results[index] = {"id": str(pk), "status": NOT_FOUND}
+            elif operation.get("delete"):
+                deletes.append((index, pk))
+            else:
+                changes = self.validate_changes(index, product, operation["changes"])
+                if changes is not None:
+                    validated.append((index, product, changes))
+
+        conflicts = self.find_sku_conflicts(validated)
+        updates = defaultdict(list)
+        for index, product, changes in validated:
+            if index in conflicts:
+                self.results[index] = {
+                    "id": str(product.pk),
+                    "status": INVALID,
+                    "errors": {"sku": [conflicts[index]]},
+                }
+            else:
+                self.plan_update(index, product, changes, updates)
+        return updates, deletes
+
+    def parse_operation(self, index, operation):
+        if not isinstance(operation, dict):
+            self.fail(index, None, "Each operation must be an object.")
+            return None
+        try:
+            pk = uuid.UUID(str(operation.get("id")))
+        except ValueError:
+            self.fail(index, operation.get("id"), "A valid product id is required.")
+            return None
+        if operation.get("delete") is True:
+            return pk
+        if "delete" in operation or not isinstance(operation.get("changes"), dict):
+            self.fail(index, pk, 'Provide either "changes" or "delete": true.')
+            return None
+        return pk
+
+    def validate_changes(self, index, product, changes):
+        serializer = ProductUpdateSerializer(product, data=changes, partial=True)
+        # Replaced by the batched lookup in find_sku_conflicts
+        sku = serializer.fields["sku"]
+        sku.validators = [
+            validator
+            for validator in sku.validators
+            if not isinstance(validator, UniqueValidator)
+        ]
+        if not serializer.is_valid():
+            self.results[index] = {
+                "id": str(product.pk),
+                "status": INVALID,
+                "errors": serializer.errors,
+            }
+            return None
+        return serializer.validated_data
+
+    @staticmethod
+    def find_sku_conflicts(validated):
+        """
+        {index: message} for changes moving a product to a sku another
+        product holds, or that an earlier operation in the request takes.
+        """
+        wanted = {
+            index: changes["sku"]
+            for index, product, changes in validated
+            if changes.get("sku") and changes["sku"] != product.sku
+        }
+        holders = dict(
+            Product.objects.filter(sku__in=set(wanted.values())).values_list(
+                "sku", "pk"
+            )
+        )
+        conflicts = {}
+        seen = set()
+        for index, sku in wanted.items():
+            if sku in holders:
+                conflicts[index] = "product with this sku already exists."
+            elif sku in seen:
+                conflicts[index] = "Duplicate sku in this request."
+            seen.add(sku)
+        return conflicts
+
+    def plan_update(self, index, product, changes, updates):
+        changed = []
+        for name, value in changes.items():
+            if getattr(product, name) != value:
+                setattr(product, name, value)
+                changed.append(name)
+        if changed:
+            updates[frozenset(changed)].append(product)
+            self.results[index] = {"id": str(product.pk), "status": UPDATED}
+        else:
+            self.results[index] = {"id": str(product.pk), "status": UNCHANGED}
+
+    def write(self, updates, deletes):
+        for fields, products in updates.items():
+            touch_and_bulk_update(
+                products, fields, batch_size=settings.PRODUCT_BULK_CREATE_BATCH_SIZE
+            )
+        record_movements(
+            {
+                product.pk: product.quantity - self.quantities[product.pk]
+                for fields, products in updates.items()
+                if "quantity" in fields
+                for product in products
+            },
+            StockMovement.UPDATE,
+            before=self.quantities,
+        )
+        if deletes:
+            deleted_ids = [pk for _, pk in deletes]
+            record_movements(
+                {pk: -self.quantities[pk] for pk in deleted_ids},
+                StockMovement.DELETE,
+                before=self.quantities,
+            )
+            Product.objects.filter(pk__in=deleted_ids).delete()
+            record_deletions(deleted_ids)
+            for index, pk in deletes:
+                self.results[index] = {"id": str(pk), "status": DELETED}
+
+    def fail(self, index, pk, message):
+        self.results[index] = {
+            "id": None if pk is None else str(pk),
+            "status": INVALID,
+            "errors": [message],
+        }
@@ -0,0 +1,101 @@
+import hashlib
+from functools import wraps
+
+from django.core.cache import caches
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from rest_framework import status
+from rest_framework.response import Response
+
+from .models import CatalogVersion
+
+PRODUCT_CACHE_ALIAS = "products"
+
+
+def get_product_cache():
+    return caches[PRODUCT_CACHE_ALIAS]
+
+
+def get_catalog_version():
+    version = (
+        CatalogVersion.objects.filter(key=CatalogVersion.PRODUCTS)
+        .values_list("version", flat=True)
+        .first()
+    )
+    return version or 0
+
+
+def bump_catalog_version():
+    """
+    Retire every cached product response by moving the catalog version on.
+    """
+    updated = CatalogVersion.objects.filter(key=CatalogVersion.PRODUCTS).update(
+        version=F("version") + 1
+    )
+    if not updated:
+        try:
+            with transaction.atomic():
+                CatalogVersion.objects.create(key=CatalogVersion.PRODUCTS, version=1)
+        except IntegrityError:  # Created concurrently, bump that row instead
+            CatalogVersion.objects.filter(key=CatalogVersion.PRODUCTS).update(
+                version=F("version") + 1
+            )
+
+
+def build_cache_key(request, view_name, url_kwargs, version=None):
+    """
+    Key a response on the view, its URL arguments, the normalized query
+    string (sorted, blanks dropped) and the current catalog version, or a
+    fixed `version` for entries that should survive catalog writes.
+    """
+    params = sorted(
+        (key, sorted(value for value in values if value != ""))
+        for key, values in request.GET.lists()
+    )
+    params = [(key, values) for key, values in params if values]
+    raw = repr((request.get_host(), sorted(url_kwargs.items()), params))
+    digest = hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    if version is None:
+        version = get_catalog_version()
+    return f"{view_name}:v{version}:{digest}"
+
+
+def cache_product_response(view_method=None, *, timeout=DEFAULT_TIMEOUT):
+    """
+    Serve successful GET responses from the product cache, optionally with
+    a shorter `timeout` than the cache's default.
+    """
+    if view_method is None:
+        return lambda view_method: cache_product_response(view_method, timeout=timeout)
+
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        cache = get_product_cache()
+        key = build_cache_key(request, type(view).__name__, kwargs)
+        data = cache.get(key)
+        if data is not None:
+            return Response(data, status=status.HTTP_200_OK)
+
+        response = view_method(view, request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, timeout)
+        return response
+
+    return wrapper
+
+
+def invalidates_product_cache(view_method):
+    """
+    Bump the catalog version once the wrapped write has run, even if it
+    failed part way, so no cached page can outlive the data it shows.
+    """
+
+    @wraps(view_method)
+    def wrapper(view, request, *args, **kwargs):
+        try:
+            return view_method(view, request, *args, **kwargs)
+        finally:
+            bump_catalog_version()
+
+    return wrapper
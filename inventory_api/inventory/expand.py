@@ -0,0 +1,46 @@
+from django.conf import settings
+
+
+def expand_order_usage(product_id):
+    """
+    The product's most recent order lines, with their order, in one query.
+    """
+    from order.models import OrderPart
+    from order.serializers import OrderPartUsageSerializer
+
+    parts = (
+        OrderPart.objects.filter(product_id=product_id)
+        .select_related("order")
+        .only(
+            "id",
+            "quantity",
+            "created_at",
+            "order__id",
+            "order__order_number",
+            "order__status",
+            "order__customer_name",
+        )
+        .order_by("-created_at")[: settings.PRODUCT_EXPAND_LIMIT]
+    )
+    return OrderPartUsageSerializer(parts, many=True).data
+
+
+def expand_stock_movements(product_id):
+    """
+    The product's most recent stock movements, in one query.
+    """
+    from .models import StockMovement
+    from .serializers import StockMovementSerializer
+
+    movements = StockMovement.objects.filter(product_id=product_id).order_by(
+        "-created_at", "-id"
+    )[: settings.PRODUCT_EXPAND_LIMIT]
+    return StockMovementSerializer(movements, many=True).data
+
+
+# `?expand=` name -> callable(product_id) returning the extra data. Each costs
+# exactly one query, so a detail response stays within a fixed budget.
+PRODUCT_EXPANSIONS = {
+    "order_usage": expand_order_usage,
+    "stock_movements": expand_stock_movements,
+}
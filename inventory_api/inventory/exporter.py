@@ -0,0 +1,62 @@
+import csv
+import json
+
+from django.core.serializers.json import DjangoJSONEncoder
+
+from .importer import CSV_COLUMNS, iter_chunks
+
+CSV = "csv"
+NDJSON = "ndjson"
+FORMATS = [CSV, NDJSON]
+
+CONTENT_TYPES = {
+    CSV: "text/csv",
+    NDJSON: "application/x-ndjson",
+}
+
+
+class Echo:
+    """
+    File-like object whose write() hands the line back, so csv.writer can
+    format rows without buffering them.
+    """
+
+    def write(self, value):
+        return value
+
+
+def export_rows(queryset, chunk_size):
+    """
+    Stream the import columns of `queryset` through a server-side cursor.
+    """
+    return (
+        queryset.order_by("created_at", "id")
+        .values_list(*CSV_COLUMNS)
+        .iterator(chunk_size=chunk_size)
+    )
+
+
+def iter_csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_COLUMNS)
+    for row in rows:
+        # Dates render as YYYY-MM-DD and None as "", which the importer reads back
+        yield writer.writerow(row)
+
+
+def iter_ndjson_lines(rows):
+    for row in rows:
+        yield json.dumps(dict(zip(CSV_COLUMNS, row)), cls=DjangoJSONEncoder) + "\n"
+
+
+def stream_export(queryset, export_format, chunk_size):
+    """
+    Yield the export in blocks of `chunk_size` lines, one per cursor fetch.
+    """
+    rows = export_rows(queryset, chunk_size)
+    if export_format == NDJSON:
+        lines = iter_ndjson_lines(rows)
+    else:
+        lines = iter_csv_lines(rows)
+    for block in iter_chunks(lines, chunk_size):
+        yield "".join(block)
@@ -1,5 +1,8 @@
 import django_filters
-from .models import Product
+from datetime import datetime, time, timedelta
+from django.utils.timezone import make_aware
+from .models import Product, ProductMedia, StockMovement
+from .search import search_products
 
 
 class ProductFilter(django_filters.FilterSet):
@@ -8,23 +11,31 @@ class ProductFilter(django_filters.FilterSet):
     - Price range
     - Category match
     - Name search
+    - Full-text search across name, description, sku, codes and car details
     - Date range filtering
     - Exact date filtering
+    - Exact match on mobis status, vendor/item codes and car make/model
+
+    Every filter here is backed by an index on Product (see `Product.Meta`).
     """
 
     min_price = django_filters.NumberFilter(field_name="price", lookup_expr="gte")
     max_price = django_filters.NumberFilter(field_name="price", lookup_expr="lte")
     category = django_filters.CharFilter(field_name="category", lookup_expr="icontains")
     name = django_filters.CharFilter(field_name="name", lookup_expr="icontains")
-    created_on = django_filters.DateFilter(
-        field_name="created_at", lookup_expr="date"
-    )  # Exact date
+    created_on = django_filters.DateFilter(method="filter_created_on")  # Exact date
     created_after = django_filters.DateFilter(
         field_name="created_at", lookup_expr="gte"
     )  # Date range (after)
     created_before = django_filters.DateFilter(
         field_name="created_at", lookup_expr="lte"
     )  # Date range (before)
+    q = django_filters.CharFilter(method="filter_search")  # Ranked search
+    mobis_status = django_filters.ChoiceFilter(choices=Product.MOBIS_CHOICES)
+    vendorCode = django_filters.CharFilter(field_name="vendorCode")
+    itemCode = django_filters.CharFilter(field_name="itemCode")
+    car_make = django_filters.CharFilter(field_name="car_make")
+    car_model = django_filters.CharFilter(field_name="car_model")
 
     class Meta:
         model = Product
@@ -36,4 +47,63 @@ class ProductFilter(django_filters.FilterSet):
             "created_on",
             "created_after",
             "created_before",
+            "q",
+            "mobis_status",
+            "vendorCode",
+            "itemCode",
+            "car_make",
+            "car_model",
         ]
+
+    def filter_created_on(self, queryset, name, value):
+        # A half-open range on created_at instead of a `__date` cast, so the
+        # created_at index can serve the lookup.
+        start = make_aware(datetime.combine(value, time.min))
+        return queryset.filter(
+            created_at__gte=start, created_at__lt=start + timedelta(days=1)
+        )
+
+    def filter_search(self, queryset, name, value):
+        return search_products(queryset, value)
+
+
+class UUIDInFilter(django_filters.BaseInFilter, django_filters.UUIDFilter):
+    pass
+
+
+class ProductMediaFilter(django_filters.FilterSet):
+    """
+    Filter class for ProductMedia to load media for a batch of products:
+    `product_id__in=<id>,<id>,...`
+    """
+
+    product_id__in = UUIDInFilter(field_name="product_id", lookup_expr="in")
+
+    class Meta:
+        model = ProductMedia
+        fields = ["product_id__in"]
+
+
+class StockMovementFilter(django_filters.FilterSet):
+    """
+    Filter class for a product's stock movements between two dates,
+    `since` and `until` both inclusive.
+    """
+
+    since = django_filters.DateFilter(method="filter_since")
+    until = django_filters.DateFilter(method="filter_until")
+
+    class Meta:
+        model = StockMovement
+        fields = ["since", "until"]
+
+    @staticmethod
+    def start_of(value):
+        return make_aware(datetime.combine(value, time.min))
+
+    def filter_since(self, queryset, name, value):
+        return queryset.filter(created_at__gte=self.start_of(value))
+
+    def filter_until(self, queryset, name, value):
+        # Half-open like filter_created_on, so the index serves the range
+        return queryset.filter(created_at__lt=self.start_of(value) + timedelta(days=1))
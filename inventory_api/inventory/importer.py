@@ -0,0 +1,338 @@
+import codecs
+import csv
+from collections import defaultdict
+from datetime import datetime
+from itertools import islice
+
+from django.conf import settings
+from django.core.exceptions import ValidationError
+from django.db import transaction
+from django.db.models import Q
+
+from .ledger import record_movements
+from .models import Product, StockMovement, touch_and_bulk_update
+
+# Columns read from a product CSV, in the order they are exported.
+CSV_COLUMNS = [
+    "name",
+    "itemCode",
+    "sku",
+    "hsn",
+    "category",
+    "quantity",
+    "itemLocation",
+    "description",
+    "price",
+    "msp",
+    "mrp",
+    "gst",
+    "cgst",
+    "sgst",
+    "igst",
+    "vendorCode",
+    "vendorName",
+    "purchasePrice",
+    "purchaseLocation",
+    "purchaseOrderDate",
+    "purchaseOrderId",
+    "warrantyPeriod",
+    "lastUpdatedDate",
+    "mobis_status",
+]
+
+
+def read_csv_rows(csv_file, encoding="utf-8"):
+    """
+    Stream dict rows from an uploaded file, decoding line by line so the
+    upload is never held in memory as a whole.
+    """
+    return csv.DictReader(codecs.iterdecode(csv_file, encoding))
+
+
+def iter_chunks(rows, size):
+    rows = iter(rows)
+    while chunk := list(islice(rows, size)):
+        yield chunk
+
+
+def build_product(row):
+    """
+    Build an unsaved Product from a CSV row.
+    """
+    product = Product(
+        name=row.get("name"),
+        itemCode=row.get("itemCode") or None,
+        sku=row.get("sku") or None,
+        hsn=row.get("hsn") or None,
+        category=row.get("category") or None,
+        quantity=int(row.get("quantity", 0)),
+        itemLocation=row.get("itemLocation") or None,
+        description=row.get("description") or None,
+        price=row.get("price"),
+        msp=row.get("msp") or None,
+        mrp=row.get("mrp") or None,
+        gst=row.get("gst") or None,
+        cgst=row.get("cgst") or None,
+        sgst=row.get("sgst") or None,
+        igst=row.get("igst") or None,
+        vendorCode=row.get("vendorCode") or None,
+        vendorName=row.get("vendorName") or None,
+        purchasePrice=row.get("purchasePrice") or None,
+        purchaseLocation=row.get("purchaseLocation") or None,
+        purchaseOrderId=row.get("purchaseOrderId") or None,
+        warrantyPeriod=row.get("warrantyPeriod") or None,
+        mobis_status=row.get("mobis_status", Product.NON_MOBIS),
+    )
+
+    # Parse dates if provided (expected format: YYYY-MM-DD)
+    if row.get("purchaseOrderDate"):
+        product.purchaseOrderDate = datetime.strptime(
+            row["purchaseOrderDate"], "%Y-%m-%d"
+        ).date()
+    if row.get("lastUpdatedDate"):
+        product.lastUpdatedDate = datetime.strptime(
+            row["lastUpdatedDate"], "%Y-%m-%d"
+        ).date()
+    return product
+
+
+# A blank cell in these columns means "not provided" rather than "clear":
+# they identify the product or cannot be empty
+KEEP_ON_BLANK = {"name", "sku", "itemCode", "price"}
+
+
+def apply_row_changes(product, candidate, row):
+    """
+    Copy the CSV columns present in `row` from `candidate` onto `product`,
+    returning the names of the fields whose value changed. Blank cells
+    clear the field, except in the KEEP_ON_BLANK columns.
+    """
+    changed = []
+    for name, cell in row.items():
+        if name not in CSV_COLUMNS:
+            continue
+        if name in KEEP_ON_BLANK and not (cell or "").strip():
+            continue
+        field = Product._meta.get_field(name)
+        value = field.to_python(getattr(candidate, field.attname))
+        if getattr(product, field.attname) != value:
+            setattr(product, field.attname, value)
+            changed.append(field.name)
+    return changed
+
+
+class ProductCsvImporter:
+    """
+    Import CSV rows in chunks: each chunk is built and validated in Python,
+    then written with one `bulk_create` (and, when upserting, one
+    `bulk_update`) inside a transaction. A chunk the database rejects is
+    retried row by row, so errors still name the row.
+
+    In upsert mode rows are matched to existing products by sku, falling
+    back to itemCode, with one indexed lookup per chunk. Only the columns
+    present in the upload are compared, and unchanged rows are skipped.
+    Later rows for a product created earlier in the same chunk are merged
+    into its insert and counted as `merged`.
+    """
+
+    INSERT = "insert"
+    UPSERT = "upsert"
+    MODES = [INSERT, UPSERT]
+
+    def __init__(self, mode=INSERT, batch_size=None):
+        self.mode = mode
+        self.batch_size = batch_size or settings.CSV_IMPORT_BATCH_SIZE
+        self.created_products = []
+        self.updated_products = []
+        self.row_errors = []
+        self.summary = {
+            "created": 0,
+            "updated": 0,
+            "merged": 0,
+            "unchanged": 0,
+            "errors": 0,
+        }
+
+    def import_rows(self, rows, start_row=1):
+        numbered = enumerate(rows, start=start_row)
+        for chunk in iter_chunks(numbered, self.batch_size):
+            self.import_chunk(chunk)
+
+    def import_chunk(self, numbered_rows):
+        built = []
+        errors = []
+        for row_number, row in numbered_rows:
+            try:
+                built.append((row_number, row, build_product(row)))
+            except Exception as e:
+                errors.append((row_number, f"Row {row_number}: {str(e)}"))
+
+        with transaction.atomic():
+            if self.mode == self.UPSERT:
+                operations = self.plan_upsert(built, errors)
+            else:
+                operations = [
+                    {"product": product, "rows": [row_number], "create": True}
+                    for row_number, _, product in built
+                ]
+            written = self.write(operations, errors)
+        self.count_written(written)
+
+        self.summary["errors"] += len(errors)
+        self.row_errors.extend(sorted(errors))
+
+    @property
+    def errors(self):
+        return [message for _, message in self.row_errors]
+
+    def plan_upsert(self, built, errors):
+        skus = {product.sku for _, _, product in built if product.sku}
+        codes = {product.itemCode for _, _, product in built if product.itemCode}
+        by_sku = {}
+        by_code = defaultdict(list)
+
+        def register(product):
+            if product.sku:
+                by_sku[product.sku] = product
+            if product.itemCode and product not in by_code[product.itemCode]:
+                by_code[product.itemCode].append(product)
+
+        # Targets stay locked, in pk order like order.stock, until the chunk
+        # commits, so quantities are overwritten and recorded against the
+        # values they replace
+        targets = (
+            Product.objects.select_for_update()
+            .filter(Q(sku__in=skus) | Q(itemCode__in=codes))
+            .order_by("pk")
+        )
+        for product in targets:
+            register(product)
+
+        operations = {}
+        for row_number, row, candidate in built:
+            target = by_sku.get(candidate.sku) if candidate.sku else None
+            if target is None and candidate.itemCode:
+                matches = by_code[candidate.itemCode]
+                if len(matches) > 1:
+                    errors.append(
+                        (
+                            row_number,
+                            f"Row {row_number}: itemCode {candidate.itemCode} "
+                            f"matches {len(matches)} products",
+                        )
+                    )
+                    continue
+                target = matches[0] if matches else None
+
+            if target is None:
+                operations[candidate.pk] = {
+                    "product": candidate,
+                    "rows": [row_number],
+                    "create": True,
+                    "fields": set(),
+                }
+                register(candidate)
+                continue
+
+            if "quantity" in row and candidate.quantity < target.reserved_quantity:
+                errors.append(
+                    (
+                        row_number,
+                        f"Row {row_number}: {target.reserved_quantity} units are "
+                        "reserved by open orders; quantity cannot go below that.",
+                    )
+                )
+                continue
+            quantity = target.quantity
+            try:
+                changed = apply_row_changes(target, candidate, row)
+            except ValidationError as e:
+                errors.append((row_number, f"Row {row_number}: {str(e)}"))
+                continue
+            operation = operations.get(target.pk)
+            if not changed and operation is None:
+                self.summary["unchanged"] += 1
+                continue
+            if operation is None:
+                operation = operations[target.pk] = {
+                    "product": target,
+                    "rows": [],
+                    "create": False,
+                    "fields": set(),
+                    "quantity_before": quantity,
+                }
+            operation["rows"].append(row_number)
+            operation["fields"].update(changed)
+            register(target)
+        return list(operations.values())
+
+    def write(self, operations, errors):
+        """
+        Write the chunk's operations, returning those that were written.
+        Must run inside the chunk's transaction.
+        """
+        creates = [op for op in operations if op["create"]]
+        updates = [op for op in operations if not op["create"]]
+
+        try:
+            with transaction.atomic():
+                self.bulk_write(creates, updates)
+            written = creates + updates
+        except Exception:
+            written = []
+            for operation in creates + updates:
+                try:
+                    with transaction.atomic():
+                        self.save(operation)
+                    written.append(operation)
+                except Exception as e:
+                    errors.extend(
+                        (row_number, f"Row {row_number}: {str(e)}")
+                        for row_number in operation["rows"]
+                    )
+        record_movements(
+            {
+                operation["product"].pk: operation["product"].quantity
+                - operation.get("quantity_before", 0)
+                for operation in written
+            },
+            StockMovement.IMPORT,
+            before={
+                operation["product"].pk: operation["quantity_before"]
+                for operation in written
+                if "quantity_before" in operation
+            },
+        )
+        return written
+
+    def count_written(self, written):
+        for operation in written:
+            product_id = str(operation["product"].id)
+            if operation["create"]:
+                self.created_products.append(product_id)
+                self.summary["created"] += 1
+                # Later rows for the same sku were merged into the insert
+                self.summary["merged"] += len(operation["rows"]) - 1
+            else:
+                self.updated_products.append(product_id)
+                self.summary["updated"] += len(operation["rows"])
+
+    def bulk_write(self, creates, updates):
+        Product.objects.bulk_create(
+            [operation["product"] for operation in creates],
+            batch_size=self.batch_size,
+        )
+        if updates:
+            touch_and_bulk_update(
+                [operation["product"] for operation in updates],
+                set().union(*(operation["fields"] for operation in updates)),
+                batch_size=self.batch_size,
+            )
+
+    def save(self, operation):
+        if operation["create"]:
+            operation["product"].save()
+        else:
+            operation["product"].save(
+                update_fields=[*operation["fields"], "updated_at"]
+            )
@@ -0,0 +1,144 @@
+import csv
+import uuid
+from datetime import timedelta
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Q
+from django.utils.timezone import now
+
+from .cache import bump_catalog_version
+from .importer import ProductCsvImporter, iter_chunks, read_csv_rows
+from .models import ProductImportError, ProductImportJob
+
+
+class JobTakenOver(Exception):
+    """
+    Another worker claimed the job after this one's heartbeat went stale.
+    """
+
+
+def enqueue_import(csv_file, mode=ProductCsvImporter.INSERT):
+    """
+    Store an uploaded CSV and queue it for the import worker.
+    """
+    total_rows = sum(1 for _ in read_csv_rows(csv_file))
+    csv_file.seek(0)
+    return ProductImportJob.objects.create(
+        file=csv_file, mode=mode, total_rows=total_rows
+    )
+
+
+def claim_next_job():
+    """
+    Atomically take the oldest pending job, or a running one whose worker
+    stopped sending heartbeats, and mark it as running under a new claim
+    token. A job whose worker is mid-chunk is locked, so it is skipped.
+    """
+    stale_before = now() - timedelta(seconds=settings.IMPORT_JOB_STALE_SECONDS)
+    with transaction.atomic():
+        job = (
+            ProductImportJob.objects.select_for_update(skip_locked=True)
+            .filter(
+                Q(status=ProductImportJob.PENDING)
+                | Q(status=ProductImportJob.RUNNING, heartbeat_at__lt=stale_before)
+            )
+            .order_by("created_at")
+            .first()
+        )
+        if job is None:
+            return None
+        job.status = ProductImportJob.RUNNING
+        job.started_at = job.started_at or now()
+        job.heartbeat_at = now()
+        job.claim_token = uuid.uuid4()
+        job.save(update_fields=["status", "started_at", "heartbeat_at", "claim_token"])
+    return job
+
+
+def run_import_job(job):
+    """
+    Import the job's file chunk by chunk, skipping rows a previous run
+    already committed. Each chunk and the job's progress commit together,
+    with the job row locked; if another worker has taken the job over
+    meanwhile, this one stops without writing the chunk.
+    """
+    try:
+        with job.file.open("rb") as csv_file:
+            rows = islice(read_csv_rows(csv_file), job.rows_processed, None)
+            numbered = enumerate(rows, start=job.rows_processed + 1)
+            for chunk in iter_chunks(numbered, settings.CSV_IMPORT_BATCH_SIZE):
+                with transaction.atomic():
+                    lock_claimed_job(job)
+                    importer = ProductCsvImporter(mode=job.mode)
+                    importer.import_chunk(chunk)
+                    record_progress(job, len(chunk), importer)
+                bump_catalog_version()
+    except JobTakenOver:
+        return job
+    except (OSError, UnicodeDecodeError, csv.Error) as e:
+        job.status = ProductImportJob.FAILED
+        job.failure_reason = f"Failed to read CSV file: {str(e)}"
+        job.finished_at = now()
+        finish_job(job, "failure_reason")
+        return job
+
+    job.status = ProductImportJob.COMPLETED
+    job.finished_at = now()
+    if finish_job(job):
+        job.file.delete(save=True)
+    return job
+
+
+def lock_claimed_job(job):
+    """
+    Lock the job row, checking it is still ours and at the row we resume
+    from.
+    """
+    current = (
+        ProductImportJob.objects.select_for_update()
+        .filter(pk=job.pk)
+        .values_list("claim_token", "rows_processed")
+        .get()
+    )
+    if current != (job.claim_token, job.rows_processed):
+        raise JobTakenOver(job.pk)
+
+
+def record_progress(job, rows, importer):
+    """
+    Add the chunk's counts to the locked job row and append its errors.
+    """
+    counts = {
+        "rows_processed": rows,
+        "created_count": importer.summary["created"],
+        "updated_count": importer.summary["updated"],
+        "merged_count": importer.summary["merged"],
+        "unchanged_count": importer.summary["unchanged"],
+        "error_count": importer.summary["errors"],
+    }
+    job.heartbeat_at = now()
+    ProductImportJob.objects.filter(pk=job.pk).update(
+        heartbeat_at=job.heartbeat_at,
+        **{name: F(name) + count for name, count in counts.items()},
+    )
+    for name, count in counts.items():
+        setattr(job, name, getattr(job, name) + count)
+    ProductImportError.objects.bulk_create(
+        ProductImportError(job=job, row_number=row_number, message=message)
+        for row_number, message in importer.row_errors
+    )
+
+
+def finish_job(job, *fields):
+    """
+    Save the job's final status unless another worker has claimed it.
+    """
+    return ProductImportJob.objects.filter(
+        pk=job.pk, claim_token=job.claim_token
+    ).update(
+        status=job.status,
+        finished_at=job.finished_at,
+        **{name: getattr(job, name) for name in fields},
+    )
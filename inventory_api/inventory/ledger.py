@@ -0,0 +1,237 @@
+from datetime import datetime, timedelta, timezone as dt_timezone
+from itertools import islice
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case,
+    DateTimeField,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    Value,
+    When,
+)
+from django.db.models.functions import Coalesce
+from django.utils.timezone import now
+
+from .models import Product, StockMovement, StockSnapshot
+
+# Stands in for "no snapshot yet": every movement is after it
+EPOCH = Value(datetime(1970, 1, 1, tzinfo=dt_timezone.utc), DateTimeField())
+
+
+def without_history(product_ids):
+    """
+    Products among `product_ids` with neither movements nor snapshots yet:
+    their stock predates the ledger. (A first snapshot of such a product is
+    seeded from its quantity, so it serves as the opening balance.)
+    """
+    return Product.objects.filter(pk__in=product_ids).exclude(
+        Q(Exists(StockMovement.objects.filter(product_id=OuterRef("pk"))))
+        | Q(Exists(StockSnapshot.objects.filter(product_id=OuterRef("pk"))))
+    )
+
+
+def opening_balances(quantities):
+    """
+    Opening movements for the products in {product id: quantity} that have
+    no history, dated at their creation so reads of any earlier moment see
+    the stock they held before the ledger.
+    """
+    product_ids = [pk for pk, quantity in quantities.items() if quantity]
+    if not product_ids:
+        return []
+    return [
+        StockMovement(
+            product_id=pk,
+            delta=quantities[pk],
+            reason=StockMovement.OPENING,
+            created_at=created_at,
+        )
+        for pk, created_at in without_history(product_ids).values_list(
+            "pk", "created_at"
+        )
+    ]
+
+
+def record_movements(deltas, reason, reference=None, before=None):
+    """
+    Append one movement per {product id: delta}, skipping zeros, with a
+    single INSERT. Call it inside the transaction that moves the stock,
+    before deleting any of the products.
+
+    `before` is {product id: quantity the change started from}; a product
+    moving for the first time gets an opening balance of it as well.
+    """
+    deltas = {pk: delta for pk, delta in deltas.items() if delta}
+    movements = []
+    if before:
+        movements = opening_balances({pk: before.get(pk, 0) for pk in deltas})
+    movements += [
+        StockMovement(
+            product_id=product_id, delta=delta, reason=reason, reference=reference
+        )
+        for product_id, delta in deltas.items()
+    ]
+    StockMovement.objects.bulk_create(movements)
+
+
+def summed_movements(**lookups):
+    """
+    Subquery for the summed delta of the movements matching `lookups`
+    (usually `product_id=OuterRef("pk")` plus a time bound), 0 for none.
+    """
+    movements = (
+        StockMovement.objects.filter(**lookups)
+        .values("product_id")
+        .annotate(total=Sum("delta"))
+        .values("total")
+    )
+    return Coalesce(Subquery(movements), 0)
+
+
+def stock_before(product_id, moment):
+    """
+    The product's quantity just before `moment`: the nearest earlier
+    snapshot plus the movements after it, as two indexed range reads. A
+    product with no history at all has not moved since before the ledger,
+    so its current quantity is returned.
+    """
+    snapshot = (
+        StockSnapshot.objects.filter(product_id=product_id, taken_at__lt=moment)
+        .order_by("-taken_at")
+        .values_list("taken_at", "quantity")
+        .first()
+    )
+    movements = StockMovement.objects.filter(
+        product_id=product_id, created_at__lt=moment
+    )
+    quantity = 0
+    if snapshot is not None:
+        taken_at, quantity = snapshot
+        movements = movements.filter(created_at__gt=taken_at)
+    total = movements.aggregate(total=Sum("delta"))["total"]
+    if snapshot is None and total is None:
+        untouched = without_history([product_id])
+        quantity = untouched.values_list("quantity", flat=True).first() or 0
+    return quantity + (total or 0)
+
+
+def with_ledger_quantity(queryset):
+    """
+    Annotate products with `ledger_quantity`, their latest snapshot plus
+    the movements since, in the same query.
+    """
+    latest = StockSnapshot.objects.filter(product_id=OuterRef("pk")).order_by(
+        "-taken_at"
+    )
+    return queryset.annotate(
+        snapshot_at=Subquery(latest.values("taken_at")[:1]),
+        ledger_quantity=Coalesce(Subquery(latest.values("quantity")[:1]), 0)
+        + summed_movements(
+            product_id=OuterRef("pk"),
+            created_at__gt=Coalesce(OuterRef("snapshot_at"), EPOCH),
+        ),
+    )
+
+
+def take_snapshots(batch_size=2000):
+    """
+    Snapshot every product that moved since its last snapshot, or never had
+    one. The snapshot is taken STOCK_SNAPSHOT_LAG_SECONDS in the past, so
+    transactions still writing movements around it have committed. Its
+    quantity is the previous snapshot plus the movements since, so drift
+    between `Product.quantity` and the ledger stays visible to
+    `find_discrepancies`; only a product with no history at all is seeded
+    from its current quantity. Returns the number of snapshots written.
+    """
+    taken_at = now() - timedelta(seconds=settings.STOCK_SNAPSHOT_LAG_SECONDS)
+    latest = StockSnapshot.objects.filter(
+        product_id=OuterRef("pk"), taken_at__lt=taken_at
+    ).order_by("-taken_at")
+    moved = StockMovement.objects.filter(
+        product_id=OuterRef("pk"),
+        created_at__gt=Coalesce(OuterRef("last_taken"), EPOCH),
+        created_at__lte=taken_at,
+    )
+    rows = (
+        Product.objects.annotate(
+            last_taken=Subquery(latest.values("taken_at")[:1]),
+            last_quantity=Subquery(latest.values("quantity")[:1]),
+            has_history=Exists(StockMovement.objects.filter(product_id=OuterRef("pk"))),
+        )
+        .filter(Q(last_taken__isnull=True) | Q(Exists(moved)))
+        .annotate(
+            quantity_then=Case(
+                When(last_taken__isnull=True, has_history=False, then=F("quantity")),
+                default=Coalesce(F("last_quantity"), 0)
+                + summed_movements(
+                    product_id=OuterRef("pk"),
+                    created_at__gt=Coalesce(OuterRef("last_taken"), EPOCH),
+                    created_at__lte=taken_at,
+                ),
+                output_field=IntegerField(),
+            )
+        )
+        .values_list("pk", "quantity_then")
+        .order_by()
+    )
+    written = 0
+    rows = rows.iterator(chunk_size=batch_size)
+    while chunk := list(islice(rows, batch_size)):
+        StockSnapshot.objects.bulk_create(
+            [
+                StockSnapshot(product_id=pk, quantity=quantity, taken_at=taken_at)
+                for pk, quantity in chunk
+            ]
+        )
+        written += len(chunk)
+    return written
+
+
+def find_discrepancies():
+    """
+    (product id, quantity, ledger quantity) for every product whose
+    quantity disagrees with the ledger, checked in one query.
+    """
+    return (
+        with_ledger_quantity(Product.objects.order_by("pk"))
+        .exclude(quantity=F("ledger_quantity"))
+        .values_list("pk", "quantity", "ledger_quantity")
+    )
+
+
+def reconcile(product_ids):
+    """
+    Append adjustments bringing the ledger in line with the products'
+    current quantity. A product with no history at all gets an opening
+    balance instead, so its past stock reads right too. The products are
+    locked while the gap is measured. Returns {product id: adjustment}.
+    """
+    with transaction.atomic():
+        list(
+            Product.objects.select_for_update()
+            .filter(pk__in=product_ids)
+            .order_by("pk")
+            .values_list("pk")
+        )
+        gaps = {
+            pk: quantity - ledger
+            for pk, quantity, ledger in find_discrepancies().filter(pk__in=product_ids)
+        }
+        openings = opening_balances(
+            {pk: gaps[pk] for pk in without_history(gaps).values_list("pk", flat=True)}
+        )
+        StockMovement.objects.bulk_create(openings)
+        opened = {movement.product_id for movement in openings}
+        record_movements(
+            {pk: gap for pk, gap in gaps.items() if pk not in opened},
+            StockMovement.ADJUSTMENT,
+            reference="reconcile",
+        )
+    return gaps
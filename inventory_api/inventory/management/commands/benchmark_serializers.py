@@ -0,0 +1,87 @@
+import time
+import uuid
+from datetime import date
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from inventory.fastpath import FastReadSerializer
+from inventory.models import Product, ProductMedia
+from inventory.serializers import ProductListSerializer, ProductMediaSerializer
+
+
+class Command(BaseCommand):
+    help = "Compare the fast read path against the DRF list serializers"
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000)
+        parser.add_argument("--repeat", type=int, default=5)
+
+    def handle(self, *args, **options):
+        # Seed synthetic rows inside a transaction that is always rolled back
+        with transaction.atomic():
+            self.seed(options["rows"])
+            for label, queryset, serializer_class in (
+                (
+                    "products",
+                    Product.objects.order_by("-created_at"),
+                    ProductListSerializer,
+                ),
+                (
+                    "media",
+                    ProductMedia.objects.order_by("-created_at"),
+                    ProductMediaSerializer,
+                ),
+            ):
+                self.compare(label, queryset, serializer_class, options["repeat"])
+            transaction.set_rollback(True)
+
+    def seed(self, rows):
+        products = Product.objects.bulk_create(
+            Product(
+                name=f"Benchmark part {i}",
+                sku=f"BENCH-{uuid.uuid4().hex[:12]}",
+                category="Benchmark",
+                quantity=i,
+                price=Decimal("199.99"),
+                mrp=Decimal("249.00"),
+                gst=Decimal("18.00"),
+                purchaseOrderDate=date(2024, 1, 1),
+            )
+            for i in range(rows)
+        )
+        ProductMedia.objects.bulk_create(
+            ProductMedia(product=product, media_type=ProductMedia.IMAGE)
+            for product in products
+        )
+
+    def compare(self, label, queryset, serializer_class, repeat):
+        renderer = JSONRenderer()
+
+        def drf():
+            return renderer.render(serializer_class(queryset, many=True).data)
+
+        def fast():
+            serializer = FastReadSerializer(serializer_class())
+            return renderer.render(
+                serializer.serialize(serializer.get_values(queryset))
+            )
+
+        if drf() != fast():
+            self.stderr.write(self.style.ERROR(f"{label}: outputs differ"))
+            return
+
+        drf_time = min(self.time(drf) for _ in range(repeat))
+        fast_time = min(self.time(fast) for _ in range(repeat))
+        self.stdout.write(
+            f"{label}: {queryset.count()} rows, drf {drf_time * 1000:.1f} ms, "
+            f"fast {fast_time * 1000:.1f} ms ({drf_time / fast_time:.1f}x)"
+        )
+
+    @staticmethod
+    def time(func):
+        start = time.perf_counter()
+        func()
+        return time.perf_counter() - start
@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.jobs import claim_next_job, run_import_job
+
+
+class Command(BaseCommand):
+    help = "Run queued product CSV import jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--forever",
+            action="store_true",
+            help="Keep polling for new jobs instead of exiting once the queue is empty",
+        )
+        parser.add_argument("--sleep", type=float, default=5.0)
+
+    def handle(self, *args, **options):
+        while True:
+            job = claim_next_job()
+            if job is None:
+                if not options["forever"]:
+                    return
+                time.sleep(options["sleep"])
+                continue
+
+            self.stdout.write(
+                f"Running import {job.id} from row {job.rows_processed + 1}"
+            )
+            job = run_import_job(job)
+            self.stdout.write(
+                f"Import {job.id} {job.status}: {job.rows_processed}/{job.total_rows} "
+                f"rows, {job.error_count} errors"
+            )
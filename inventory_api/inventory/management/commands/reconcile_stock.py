@@ -0,0 +1,33 @@
+from itertools import islice
+
+from django.core.management.base import BaseCommand
+
+from inventory.ledger import find_discrepancies, reconcile
+
+
+class Command(BaseCommand):
+    help = "Report products whose quantity disagrees with the stock ledger"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--fix",
+            action="store_true",
+            help="Record adjustments so the ledger matches the current quantities",
+        )
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        batch_size = options["batch_size"]
+        rows = find_discrepancies().iterator(chunk_size=batch_size)
+        found = fixed = 0
+        while chunk := list(islice(rows, batch_size)):
+            for pk, quantity, ledger_quantity in chunk:
+                self.stdout.write(
+                    f"{pk}: quantity {quantity}, ledger {ledger_quantity}"
+                )
+            found += len(chunk)
+            if options["fix"]:
+                fixed += len(reconcile([pk for pk, _, _ in chunk]))
+        self.stdout.write(f"Found {found} discrepancies")
+        if options["fix"]:
+            self.stdout.write(f"Adjusted {fixed} products")
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from inventory.ledger import take_snapshots
+
+
+class Command(BaseCommand):
+    help = "Snapshot the stock of every product that moved since its last snapshot"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--forever",
+            action="store_true",
+            help="Keep snapshotting every --sleep seconds instead of exiting",
+        )
+        parser.add_argument("--sleep", type=float, default=3600.0)
+        parser.add_argument("--batch-size", type=int, default=2000)
+
+    def handle(self, *args, **options):
+        while True:
+            written = take_snapshots(options["batch_size"])
+            if written:
+                self.stdout.write(f"Snapshotted {written} products")
+            if not options["forever"]:
+                return
+            time.sleep(options["sleep"])
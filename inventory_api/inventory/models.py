@@ -1,4 +1,5 @@
 from django.db import models
+from django.utils.timezone import now
 import uuid
 
 
@@ -19,6 +20,9 @@ class Product(models.Model):
     hsn = models.CharField(max_length=50, null=True, blank=True)
     category = models.CharField(max_length=50, blank=True, null=True)
     quantity = models.PositiveIntegerField(default=0)
+    # Held by open order cards (order.StockReservation); quantity minus
+    # this is what is still available
+    reserved_quantity = models.PositiveIntegerField(default=0)
     itemLocation = models.CharField(max_length=500, blank=True, null=True)
     description = models.TextField(blank=True, null=True)
     price = models.DecimalField(max_digits=10, decimal_places=2)
@@ -53,10 +57,41 @@ class Product(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Chosen from ProductFilter lookups and the list orderings; the
+        # trailing `id` lets keyset pagination walk the index directly.
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="product_created_idx"),
+            models.Index(fields=["updated_at", "id"], name="product_updated_idx"),
+            models.Index(fields=["price", "id"], name="product_price_idx"),
+            models.Index(fields=["name", "id"], name="product_name_idx"),
+            models.Index(fields=["category", "id"], name="product_category_idx"),
+            models.Index(fields=["quantity", "id"], name="product_quantity_idx"),
+            models.Index(
+                fields=["mobis_status", "created_at"], name="product_mobis_idx"
+            ),
+            models.Index(fields=["vendorCode"], name="product_vendor_code_idx"),
+            models.Index(fields=["itemCode"], name="product_item_code_idx"),
+            models.Index(fields=["car_make", "car_model"], name="product_car_idx"),
+        ]
+
     def __str__(self):
         return self.name
 
 
+def touch_and_bulk_update(products, fields, batch_size=None):
+    """
+    `bulk_update` the given fields of `products` and move their
+    `updated_at` on, which bulk_update would skip (it ignores auto_now).
+    """
+    stamp = now()
+    for product in products:
+        product.updated_at = stamp
+    Product.objects.bulk_update(
+        products, sorted({*fields, "updated_at"}), batch_size=batch_size
+    )
+
+
 class ProductMedia(models.Model):
     IMAGE = "image"
     VIDEO = "video"
@@ -79,5 +114,211 @@ class ProductMedia(models.Model):
     thumbnail_url = models.CharField(max_length=255, blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="media_created_idx"),
+            models.Index(
+                fields=["product", "created_at", "id"], name="media_product_idx"
+            ),
+        ]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self.touch_product()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self.touch_product()
+        return result
+
+    def touch_product(self):
+        # Media is part of the product's representation, so move the
+        # product's updated_at on (for ETags and delta sync)
+        Product.objects.filter(pk=self.product_id).update(updated_at=now())
+
     def __str__(self):
         return f"{self.media_type} for {self.product.name}"
+
+
+class ProductTombstone(models.Model):
+    """
+    Record of a deleted product, so delta sync clients learn about the
+    removal (see `inventory.sync`).
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product_id = models.UUIDField()
+    deleted_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["deleted_at", "id"], name="tombstone_deleted_idx"),
+        ]
+
+    def __str__(self):
+        return f"Deleted product {self.product_id}"
+
+
+class StockMovement(models.Model):
+    """
+    One change to a product's quantity, written in the same transaction as
+    the change. Rows are only ever appended; with `StockSnapshot` they give
+    a product's stock at any moment (see `inventory.ledger`).
+    """
+
+    CREATE = "create"
+    IMPORT = "import"
+    UPDATE = "update"
+    DELETE = "delete"
+    ORDER = "order"
+    ADJUSTMENT = "adjustment"
+    OPENING = "opening"
+
+    REASON_CHOICES = [
+        (CREATE, "Product created"),
+        (IMPORT, "CSV import"),
+        (UPDATE, "Product updated"),
+        (DELETE, "Product deleted"),
+        (ORDER, "Order finalized"),
+        (ADJUSTMENT, "Reconciliation adjustment"),
+        (OPENING, "Stock held before the ledger"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product_id = models.UUIDField()  # Not a FK: history outlives the product
+    delta = models.IntegerField()
+    reason = models.CharField(max_length=20, choices=REASON_CHOICES)
+    reference = models.CharField(max_length=100, blank=True, null=True)
+    # Not auto_now_add: opening balances are backdated to the product's
+    # creation
+    created_at = models.DateTimeField(default=now)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["product_id", "created_at", "id"], name="movement_product_idx"
+            ),
+            models.Index(fields=["created_at", "id"], name="movement_created_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.delta:+d} {self.product_id} ({self.reason})"
+
+
+class StockSnapshot(models.Model):
+    """
+    A product's quantity as of `taken_at`, including every movement up to
+    then, so stock lookups replay only the movements after it.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product_id = models.UUIDField()
+    quantity = models.IntegerField()
+    taken_at = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["product_id", "taken_at"], name="snapshot_product_idx"
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.product_id} at {self.taken_at}: {self.quantity}"
+
+
+class CatalogVersion(models.Model):
+    """
+    Counter bumped on every catalog write. It is part of every cached
+    product response key, so a bump retires all cached pages at once.
+    """
+
+    PRODUCTS = "products"
+
+    key = models.CharField(max_length=50, primary_key=True)
+    version = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.key} v{self.version}"
+
+
+class ProductImportJob(models.Model):
+    """
+    A CSV import queued for the `process_import_jobs` worker. Progress is
+    committed together with each imported chunk, so a restarted worker
+    resumes after the last finished chunk.
+    """
+
+    PENDING = "pending"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    STATUS_CHOICES = [
+        (PENDING, "Pending"),
+        (RUNNING, "Running"),
+        (COMPLETED, "Completed"),
+        (FAILED, "Failed"),
+    ]
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    file = models.FileField(upload_to="product_imports/", blank=True, null=True)
+    mode = models.CharField(max_length=10, default="insert")
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    total_rows = models.PositiveIntegerField(default=0)
+    rows_processed = models.PositiveIntegerField(default=0)
+    created_count = models.PositiveIntegerField(default=0)
+    updated_count = models.PositiveIntegerField(default=0)
+    unchanged_count = models.PositiveIntegerField(default=0)
+    merged_count = models.PositiveIntegerField(default=0)
+    error_count = models.PositiveIntegerField(default=0)
+    failure_reason = models.TextField(blank=True, null=True)
+    # Replaced on every claim; a worker that finds another token on the
+    # row has been taken over and must stop
+    claim_token = models.UUIDField(blank=True, null=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    heartbeat_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["status", "created_at"], name="import_job_queue_idx"),
+        ]
+
+    def eta_seconds(self):
+        """Seconds left at the average rate so far, or None if unknown."""
+        if self.status != self.RUNNING or not self.started_at:
+            return None
+        if not self.rows_processed:
+            return None
+        elapsed = (now() - self.started_at).total_seconds()
+        remaining = max(self.total_rows - self.rows_processed, 0)
+        return round(remaining * elapsed / self.rows_processed, 1)
+
+    def __str__(self):
+        return f"Import {self.id} ({self.status})"
+
+
+class ProductImportError(models.Model):
+    """
+    A row a background import could not write. Appended with each chunk,
+    so progress updates never rewrite the errors reported so far.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    job = models.ForeignKey(
+        ProductImportJob, related_name="row_errors", on_delete=models.CASCADE
+    )
+    row_number = models.PositiveIntegerField()
+    message = models.TextField()
+
+    class Meta:
+        ordering = ["row_number"]
+        indexes = [
+            models.Index(fields=["job", "row_number"], name="import_error_job_idx"),
+        ]
+
+    def __str__(self):
+        return self.message
@@ -0,0 +1,195 @@
+import base64
+import binascii
+import json
+
+from django.core.exceptions import FieldDoesNotExist
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+
+class KeysetPagination(BasePagination):
+    """
+    Cursor (keyset) pagination keyed on (ordering field, id).
+
+    Each page is fetched with a `(field, id) > (last field, last id)`
+    predicate instead of an OFFSET, so page 1000 costs the same as page 1.
+    The cursor is an opaque token bound to the ordering it was issued for.
+    """
+
+    page_size = 50
+    max_page_size = 200
+    page_size_query_param = "page_size"
+    cursor_query_param = "cursor"
+    default_ordering = "-created_at"
+    # Model fields a client may order by; None allows any concrete field.
+    ordering_fields = None
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None, ordering=None):
+        self.request = request
+        self.ordering = ordering or self.default_ordering
+        self.descending = self.ordering.startswith("-")
+        self.field_name = self.ordering.lstrip("-")
+        self.field = self.get_ordering_field(queryset, self.field_name)
+        self.pk_field = queryset.model._meta.pk
+        self.page_size = self.get_page_size(request)
+
+        field_names, defer = queryset.query.deferred_loading
+        if field_names and not defer and self.field_name not in field_names:
+            # The cursor reads the ordering value; keep it out of `only()`
+            # deferral so it is not fetched row by row.
+            if self.field_name not in queryset.query.annotations:
+                queryset = queryset.only(*field_names, self.field_name)
+
+        queryset = queryset.order_by(*self.get_order_by())
+        cursor = self.decode_cursor(request)
+        if cursor is not None:
+            queryset = queryset.filter(self.get_after_filter(*cursor))
+
+        page = list(queryset[: self.page_size + 1])
+        self.has_next = len(page) > self.page_size
+        page = page[: self.page_size]
+        self.next_cursor = (
+            self.encode_cursor(page[-1]) if self.has_next and page else None
+        )
+        return page
+
+    def get_paginated_response(self, data):
+        return Response({"next": self.get_next_link(), "results": data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_next_link(self):
+        if self.next_cursor is None:
+            return None
+        url = self.request.build_absolute_uri()
+        return replace_query_param(url, self.cursor_query_param, self.next_cursor)
+
+    def get_page_size(self, request):
+        try:
+            page_size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if page_size <= 0:
+            return self.page_size
+        return min(page_size, self.max_page_size)
+
+    def get_ordering_field(self, queryset, name):
+        """
+        Resolve the ordering name to a concrete model field or an annotation.
+        """
+        annotation = queryset.query.annotations.get(name)
+        if annotation is not None:
+            return annotation.output_field
+        try:
+            field = queryset.model._meta.get_field(name)
+        except FieldDoesNotExist:
+            field = None
+        if (
+            field is None
+            or not field.concrete
+            or field.is_relation
+            or (self.ordering_fields is not None and name not in self.ordering_fields)
+        ):
+            raise ValidationError({"ordering": [f"Cannot order by '{name}'."]})
+        return field
+
+    def get_order_by(self):
+        name = self.field_name
+        if self.descending:
+            first = F(name).desc(nulls_first=True) if self.field.null else f"-{name}"
+            return [first, "-pk"]
+        first = F(name).asc(nulls_last=True) if self.field.null else name
+        return [first, "pk"]
+
+    def get_after_filter(self, value, pk):
+        """
+        Rows that sort strictly after (value, pk) under the current ordering.
+        NULLs sort last ascending and first descending, as on Postgres.
+        """
+        name = self.field_name
+        if self.descending:
+            if value is None:
+                return Q(**{f"{name}__isnull": True, "pk__lt": pk}) | Q(
+                    **{f"{name}__isnull": False}
+                )
+            return Q(**{f"{name}__lt": value}) | Q(**{name: value, "pk__lt": pk})
+
+        if value is None:
+            return Q(**{f"{name}__isnull": True, "pk__gt": pk})
+        after = Q(**{f"{name}__gt": value}) | Q(**{name: value, "pk__gt": pk})
+        if self.field.null:
+            after |= Q(**{f"{name}__isnull": True})
+        return after
+
+    def get_position(self, item):
+        if isinstance(item, dict):
+            return item[self.field_name], item["id"]
+        return getattr(item, self.field_name), item.pk
+
+    def encode_cursor(self, item):
+        value, pk = self.get_position(item)
+        if value is not None:
+            value = value.isoformat() if hasattr(value, "isoformat") else str(value)
+        payload = json.dumps({"o": self.ordering, "v": value, "id": str(pk)})
+        return base64.urlsafe_b64encode(payload.encode("utf-8")).decode("ascii")
+
+    def decode_cursor(self, request):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(encoded.encode("ascii")))
+            if payload["o"] != self.ordering:
+                raise ValueError("Cursor was issued for a different ordering")
+            value = payload["v"]
+            if value is not None:
+                value = self.field.to_python(value)
+            return value, self.pk_field.to_python(payload["id"])
+        except (
+            TypeError,
+            KeyError,
+            ValueError,
+            UnicodeError,
+            binascii.Error,
+            DjangoValidationError,
+        ):
+            raise NotFound(self.invalid_cursor_message)
+
+
+class ProductPagination(KeysetPagination):
+    """
+    Keyset pagination over Product, limited to orderings with a
+    supporting (field, id) index.
+    """
+
+    ordering_fields = ["created_at", "price", "name", "category", "quantity"]
+
+
+class ProductMediaPagination(KeysetPagination):
+    """
+    Keyset pagination over ProductMedia, newest first.
+    """
+
+    ordering_fields = ["created_at"]
+
+
+class StockMovementPagination(KeysetPagination):
+    """
+    Keyset pagination over one product's StockMovements, oldest first.
+    """
+
+    default_ordering = "created_at"
+    ordering_fields = ["created_at"]
@@ -0,0 +1,62 @@
+from decimal import Decimal
+
+from django.db.models import (
+    Count,
+    DecimalField,
+    ExpressionWrapper,
+    F,
+    Q,
+    Sum,
+    Value,
+)
+from django.db.models.functions import Coalesce
+
+# Report grouping name -> Product column.
+VALUATION_GROUPINGS = {
+    "category": "category",
+    "vendor": "vendorName",
+    "location": "itemLocation",
+}
+
+MONEY = DecimalField(max_digits=30, decimal_places=2)
+
+
+def stock_value(price_field):
+    """
+    Sum of quantity x `price_field`; products without a price count as 0.
+    """
+    return Coalesce(
+        Sum(ExpressionWrapper(F("quantity") * F(price_field), output_field=MONEY)),
+        Value(Decimal("0.00")),
+        output_field=MONEY,
+    )
+
+
+def valuation_aggregates():
+    return {
+        "product_count": Count("pk"),
+        "total_quantity": Coalesce(Sum("quantity"), 0),
+        "purchase_value": stock_value("purchasePrice"),
+        "retail_value": stock_value("mrp"),
+        "zero_stock_count": Count("pk", filter=Q(quantity=0)),
+        # Selling below cost
+        "negative_margin_count": Count("pk", filter=Q(price__lt=F("purchasePrice"))),
+    }
+
+
+def build_valuation_report(queryset, groupings):
+    """
+    Catalog-wide totals plus one GROUP BY per requested grouping, all
+    computed by the database.
+    """
+    queryset = queryset.order_by()
+    report = {"totals": queryset.aggregate(**valuation_aggregates())}
+    for name in groupings:
+        column = VALUATION_GROUPINGS[name]
+        rows = (
+            queryset.values(column)
+            .annotate(**valuation_aggregates())
+            .order_by("-purchase_value", column)
+        )
+        report[f"by_{name}"] = [{"key": row.pop(column), **row} for row in rows]
+    return report
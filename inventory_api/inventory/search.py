@@ -0,0 +1,101 @@
+import re
+
+from django.contrib.postgres.search import (
+    SearchQuery,
+    SearchRank,
+    SearchVector,
+    TrigramSimilarity,
+)
+from django.db import connections
+from django.db.models import FloatField, Q
+from django.db.models.functions import Cast
+
+# Columns folded into the full-text document, in index order.
+SEARCH_VECTOR_FIELDS = [
+    "name",
+    "description",
+    "sku",
+    "itemCode",
+    "hsn",
+    "car_make",
+    "car_model",
+]
+# Columns with a trigram index backing substring (icontains) lookups. Part
+# codes are here too since the text parser splits them on punctuation.
+TRIGRAM_FIELDS = ["name", "category", "sku", "itemCode"]
+SEARCH_CONFIG = "simple"
+SEARCH_RANK_ORDERING = "-rank"
+
+# Postgres-only DDL. The expressions must match what Django emits for
+# `icontains` and for `product_search_vector()` so the planner uses them.
+POSTGRES_SEARCH_DDL = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    *[
+        f'CREATE INDEX IF NOT EXISTS "inventory_product_{field}_trgm" '
+        f'ON "inventory_product" USING gin (UPPER("{field}"::text) gin_trgm_ops)'
+        for field in TRIGRAM_FIELDS
+    ],
+    'CREATE INDEX IF NOT EXISTS "inventory_product_search_vector" '
+    'ON "inventory_product" USING gin ('
+    f"to_tsvector('{SEARCH_CONFIG}'::regconfig, "
+    + " || ' ' || ".join(f"COALESCE(\"{field}\", '')" for field in SEARCH_VECTOR_FIELDS)
+    + "))",
+]
+
+
+def product_search_vector():
+    return SearchVector(*SEARCH_VECTOR_FIELDS, config=SEARCH_CONFIG)
+
+
+def prefix_search_query(term):
+    """
+    Build a `tok1:* & tok2:*` tsquery so partially typed words still match.
+    """
+    tokens = re.findall(r"\w+", term)
+    if not tokens:
+        return None
+    raw = " & ".join(f"{token}:*" for token in tokens)
+    return SearchQuery(raw, config=SEARCH_CONFIG, search_type="raw")
+
+
+def search_products(queryset, term):
+    """
+    Filter products matching `term` across the searchable columns.
+
+    On Postgres the match uses the tsvector and trigram GIN indexes and
+    annotates a `rank` for relevance ordering. Other backends fall back to
+    `icontains` lookups without ranking.
+    """
+    term = term.strip()
+    if not term:
+        return queryset
+
+    if connections[queryset.db].vendor != "postgresql":
+        match = Q()
+        for field in dict.fromkeys([*SEARCH_VECTOR_FIELDS, *TRIGRAM_FIELDS]):
+            match |= Q(**{f"{field}__icontains": term})
+        return queryset.filter(match)
+
+    match = Q()
+    for field in TRIGRAM_FIELDS:
+        match |= Q(**{f"{field}__icontains": term})
+    rank = TrigramSimilarity("name", term)
+    query = prefix_search_query(term)
+    if query is not None:
+        queryset = queryset.alias(search=product_search_vector())
+        match |= Q(search=query)
+        rank = SearchRank(product_search_vector(), query) + rank
+    # Cast to double precision so the rank round-trips exactly in cursors.
+    return queryset.filter(match).annotate(rank=Cast(rank, FloatField()))
+
+
+def create_search_indexes(sender, using="default", **kwargs):
+    """
+    post_migrate hook creating the Postgres search indexes.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        for statement in POSTGRES_SEARCH_DDL:
+            cursor.execute(statement)
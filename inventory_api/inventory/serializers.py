@@ -1,19 +1,207 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist
+from django.db import transaction
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Product, ProductMedia
+from rest_framework.validators import UniqueValidator
+from .models import (
+    Product,
+    ProductImportJob,
+    ProductMedia,
+    StockMovement,
+    touch_and_bulk_update,
+)
 
 
-class ProductMediaSerializer(serializers.ModelSerializer):
+def parse_fieldset(value):
+    """
+    Split a comma separated `fields=` / `exclude=` value into names.
+    """
+    if value is None:
+        return None
+    return [name.strip() for name in value.split(",") if name.strip()]
+
+
+def split_fieldset(paths):
+    """
+    Split dotted paths into top-level names and per-name nested paths.
+    """
+    top, nested = [], {}
+    for path in paths:
+        name, _, rest = path.partition(".")
+        if rest:
+            nested.setdefault(name, []).append(rest)
+        else:
+            top.append(name)
+    return top, nested
+
+
+class SparseFieldsetMixin:
+    """
+    Narrow a serializer with `?fields=` / `?exclude=` on a GET request
+    passed in the context, e.g. `?fields=id,name,order_parts.product.sku`.
+    Dotted names reach into nested serializers using this mixin.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        request = self.context.get("request")
+        if request is not None and request.method == "GET":
+            self.apply_fieldset(
+                parse_fieldset(request.query_params.get("fields")),
+                parse_fieldset(request.query_params.get("exclude")),
+            )
+
+    def apply_fieldset(self, include=None, exclude=None):
+        include_top, include_nested = split_fieldset(include or [])
+        exclude_top, exclude_nested = split_fieldset(exclude or [])
+
+        requested = set(include_top) | set(include_nested) | set(exclude_top)
+        unknown = sorted(requested.union(exclude_nested) - set(self.fields))
+        if unknown:
+            raise serializers.ValidationError(
+                {"fields": [f"Unknown field '{name}'." for name in unknown]}
+            )
+
+        for name in list(self.fields):
+            dropped = name in exclude_top
+            if include and name not in include_top and name not in include_nested:
+                dropped = True
+            if dropped:
+                self.fields.pop(name)
+
+        for name in set(include_nested) | set(exclude_nested):
+            field = self.fields.get(name)
+            nested = getattr(field, "child", field)
+            if isinstance(nested, SparseFieldsetMixin):
+                nested.apply_fieldset(
+                    None if name in include_top else include_nested.get(name),
+                    exclude_nested.get(name),
+                )
+
+    def get_select_fields(self):
+        """
+        Concrete model fields backing the remaining serializer fields, for
+        narrowing the queryset with `only()`.
+        """
+        model = self.Meta.model
+        select = []
+        for field in self.fields.values():
+            try:
+                model_field = model._meta.get_field(field.source)
+            except FieldDoesNotExist:
+                continue
+            if model_field.concrete and not model_field.many_to_many:
+                select.append(model_field.name)
+        return select
+
+
+class BatchListSerializer(serializers.ListSerializer):
+    """
+    List serializer that validates every item, then runs `validate_batch`
+    over the validated items so cross-item checks can share one query.
+    Errors from both are reported per item, in request order.
+    """
+
+    def to_internal_value(self, data):
+        self.validated_items = []
+        try:
+            validated = super().to_internal_value(data)
+            errors = [{} for _ in validated]
+        except serializers.ValidationError as exc:
+            if not isinstance(exc.detail, list):
+                raise
+            validated, errors = None, exc.detail
+
+        for index, item_errors in self.validate_batch(self.validated_items).items():
+            errors[index] = {**item_errors, **errors[index]}
+        if any(errors):
+            raise serializers.ValidationError(errors)
+        return validated
+
+    def run_child_validation(self, data):
+        self.validated_items.append(None)
+        validated = super().run_child_validation(data)
+        self.validated_items[-1] = validated
+        return validated
+
+    def validate_batch(self, items):
+        """
+        Return {index: {field: [message]}} for items that fail a batch
+        check. `items` holds None where an item failed its own validation.
+        """
+        return {}
+
+
+class ProductMediaBulkCreateSerializer(BatchListSerializer):
+    """
+    List serializer for registering many media rows in one request. All
+    referenced products are checked with one query, the rows are inserted
+    with `bulk_create`, and with the `set_cover` context flag each
+    product's cover is set from its first image, in the same transaction.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        if hasattr(self, "initial_data"):
+            # Checked for the whole batch in validate_batch
+            self.child.fields["product"] = serializers.UUIDField(source="product_id")
+
+    def validate_batch(self, items):
+        ids = {item["product_id"] for item in items if item}
+        self.products = self.context.get("products") or Product.objects.only(
+            "id", "cover_image", "cover_image_id"
+        ).in_bulk(ids)
+        return {
+            index: {
+                "product": [
+                    f'Invalid pk "{item["product_id"]}" - object does not exist.'
+                ]
+            }
+            for index, item in enumerate(items)
+            if item and item["product_id"] not in self.products
+        }
+
+    def create(self, validated_data):
+        media = [ProductMedia(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            ProductMedia.objects.bulk_create(media)
+            touched = {item.product_id for item in media}
+            if self.context.get("set_cover"):
+                touched -= self.set_covers(media)
+            if touched:
+                # bulk_create skips ProductMedia.save(), which does this
+                Product.objects.filter(pk__in=touched).update(updated_at=timezone.now())
+        return media
+
+    def set_covers(self, media):
+        covered = {}
+        for item in media:
+            if item.media_type == ProductMedia.IMAGE:
+                covered.setdefault(item.product_id, item)
+        products = []
+        for product_id, image in covered.items():
+            product = self.products[product_id]
+            product.cover_image = image.preview_url
+            product.cover_image_id = image.appwrite_file_id
+            products.append(product)
+        touch_and_bulk_update(products, ["cover_image", "cover_image_id"])
+        return set(covered)
+
+
+class ProductMediaSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for ProductMedia model
     """
 
     class Meta:
         model = ProductMedia
+        list_serializer_class = ProductMediaBulkCreateSerializer
         fields = "__all__"
         read_only_fields = ["id", "created_at"]  # Prevent modification of these fields
 
 
-class ProductListSerializer(serializers.ModelSerializer):
+class ProductListSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for listing products.
     """
@@ -27,6 +215,7 @@ class ProductListSerializer(serializers.ModelSerializer):
             "hsn",
             "category",
             "quantity",
+            "reserved_quantity",
             "price",
             "description",
             "itemCode",
@@ -52,6 +241,58 @@ class ProductListSerializer(serializers.ModelSerializer):
         ]
 
 
+class ProductBulkCreateSerializer(BatchListSerializer):
+    """
+    List serializer for creating many products in one request. Items are
+    validated in one pass with a single sku uniqueness query for the whole
+    batch, then inserted with `bulk_create` inside one transaction.
+    Errors are still reported per item, in request order.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        # Replaced by the batched lookup in validate_batch
+        sku = self.child.fields["sku"]
+        sku.validators = [
+            validator
+            for validator in sku.validators
+            if not isinstance(validator, UniqueValidator)
+        ]
+
+    def validate_batch(self, items):
+        skus = [item.get("sku") if item else None for item in items]
+        return {
+            index: {"sku": [message]}
+            for index, message in self.find_sku_conflicts(skus).items()
+        }
+
+    @staticmethod
+    def find_sku_conflicts(skus):
+        existing = set(
+            Product.objects.filter(sku__in={sku for sku in skus if sku}).values_list(
+                "sku", flat=True
+            )
+        )
+        conflicts = {}
+        seen = set()
+        for index, sku in enumerate(skus):
+            if not sku:
+                continue
+            if sku in existing:
+                conflicts[index] = "product with this sku already exists."
+            elif sku in seen:
+                conflicts[index] = "Duplicate sku in this request."
+            seen.add(sku)
+        return conflicts
+
+    def create(self, validated_data):
+        products = [Product(**attrs) for attrs in validated_data]
+        with transaction.atomic():
+            return Product.objects.bulk_create(
+                products, batch_size=settings.PRODUCT_BULK_CREATE_BATCH_SIZE
+            )
+
+
 class ProductCreateSerializer(serializers.ModelSerializer):
     """
     Serializer for creating a new product.
@@ -59,6 +300,7 @@ class ProductCreateSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = Product
+        list_serializer_class = ProductBulkCreateSerializer
         fields = [
             "name",
             "sku",
@@ -90,7 +332,7 @@ class ProductCreateSerializer(serializers.ModelSerializer):
         ]
 
 
-class ProductDetailSerializer(serializers.ModelSerializer):
+class ProductDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     """
     Serializer for retrieving a product's details with media included.
     """
@@ -104,7 +346,8 @@ class ProductDetailSerializer(serializers.ModelSerializer):
 
 class ProductUpdateSerializer(serializers.ModelSerializer):
     """
-    Serializer for updating a product.
+    Serializer for updating a product. The quantity cannot go below what
+    open orders have reserved, or their cards could no longer finalize.
     """
 
     class Meta:
@@ -138,3 +381,73 @@ class ProductUpdateSerializer(serializers.ModelSerializer):
             "created_at",
             "updated_at",
         ]
+
+    def validate_quantity(self, value):
+        reserved = self.instance.reserved_quantity if self.instance else 0
+        if value < reserved:
+            raise serializers.ValidationError(
+                f"{reserved} units are reserved by open orders; "
+                "quantity cannot go below that."
+            )
+        return value
+
+
+class ProductImportJobSerializer(serializers.ModelSerializer):
+    """
+    Serializer for polling the progress of a background CSV import.
+    """
+
+    eta_seconds = serializers.FloatField(read_only=True, allow_null=True)
+    errors = serializers.SlugRelatedField(
+        source="row_errors", slug_field="message", many=True, read_only=True
+    )
+
+    class Meta:
+        model = ProductImportJob
+        fields = [
+            "id",
+            "status",
+            "mode",
+            "total_rows",
+            "rows_processed",
+            "created_count",
+            "updated_count",
+            "merged_count",
+            "unchanged_count",
+            "error_count",
+            "errors",
+            "eta_seconds",
+            "failure_reason",
+            "created_at",
+            "started_at",
+            "finished_at",
+        ]
+        read_only_fields = fields
+
+
+class ValuationSerializer(serializers.Serializer):
+    """
+    Serializer for stock valuation figures computed by the database.
+    """
+
+    product_count = serializers.IntegerField()
+    total_quantity = serializers.IntegerField()
+    purchase_value = serializers.DecimalField(max_digits=30, decimal_places=2)
+    retail_value = serializers.DecimalField(max_digits=30, decimal_places=2)
+    zero_stock_count = serializers.IntegerField()
+    negative_margin_count = serializers.IntegerField()
+
+
+class ValuationGroupSerializer(ValuationSerializer):
+    key = serializers.CharField(allow_null=True)
+
+
+class StockMovementSerializer(serializers.ModelSerializer):
+    """
+    Serializer for a product's stock ledger entries.
+    """
+
+    class Meta:
+        model = StockMovement
+        fields = ["id", "delta", "reason", "reference", "created_at"]
+        read_only_fields = fields
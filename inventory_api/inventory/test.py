@@ -1,10 +1,40 @@
+import csv
+import json
+from unittest import skipUnless
+from django.db import connection, connections
+from datetime import date, timedelta
+import tempfile
+import uuid
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from io import StringIO
+from rest_framework.renderers import JSONRenderer
 from rest_framework.test import APITestCase
 from rest_framework import status
-from .models import Product
+from .cache import bump_catalog_version, get_product_cache
+from .fastpath import FastReadSerializer
+from .importer import CSV_COLUMNS
+from .ledger import find_discrepancies, stock_before, take_snapshots
+from .models import (
+    Product,
+    ProductImportJob,
+    ProductMedia,
+    StockMovement,
+    StockSnapshot,
+)
+from .serializers import ProductListSerializer, ProductMediaSerializer
+from .pagination import ProductPagination
+from .jobs import claim_next_job, run_import_job
+from .sync import after
+from .testing import IndexPlanTestCase
 
 
 class ProductAPITestCase(APITestCase):
     def setUp(self):
+        get_product_cache().clear()
         # Create some sample products
         Product.objects.create(
             name="Wireless Headphones",
@@ -23,30 +53,30 @@ class ProductAPITestCase(APITestCase):
 
     def test_list_products(self):
         """Test listing all products"""
-        response = self.client.get("/products/")
+        response = self.client.get("/api/products/")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 2)
+        self.assertEqual(len(response.data["results"]), 2)
 
     def test_filter_by_category(self):
         """Test filtering products by category"""
-        response = self.client.get("/products/?category=Electronics")
+        response = self.client.get("/api/products/?category=Electronics")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["name"], "Wireless Headphones")
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["name"], "Wireless Headphones")
 
     def test_filter_by_price_range(self):
         """Test filtering products by price range"""
-        response = self.client.get("/products/?min_price=100&max_price=1000")
+        response = self.client.get("/api/products/?min_price=100&max_price=1000")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
-        self.assertEqual(len(response.data), 1)
-        self.assertEqual(response.data[0]["name"], "Wireless Headphones")
+        self.assertEqual(len(response.data["results"]), 1)
+        self.assertEqual(response.data["results"][0]["name"], "Wireless Headphones")
 
     def test_ordering(self):
         """Test ordering products by price descending"""
-        response = self.client.get("/products/?ordering=-price")
+        response = self.client.get("/api/products/?ordering=-price")
         self.assertEqual(response.status_code, status.HTTP_200_OK)
         self.assertEqual(
-            response.data[0]["name"], "Gaming Laptop"
+            response.data["results"][0]["name"], "Gaming Laptop"
         )  # Most expensive product
 
     def test_create_product(self):
@@ -58,6 +88,1263 @@ class ProductAPITestCase(APITestCase):
             "price": 799.99,
             "quantity": 100,
         }
-        response = self.client.post("/products/", data)
+        response = self.client.post("/api/products/create/", data)
         self.assertEqual(response.status_code, status.HTTP_201_CREATED)
         self.assertEqual(response.data["name"], "Smartphone")
+
+    @override_settings(PRODUCT_BULK_CREATE_BATCH_SIZE=2)
+    def test_bulk_create_products(self):
+        """Test that a list payload is checked with one query and bulk inserted"""
+        data = [
+            {"name": f"Part {i}", "sku": f"BULK-{i}", "price": "1.00"} for i in range(5)
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post("/api/products/create/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [item["sku"] for item in response.data], [d["sku"] for d in data]
+        )
+        product_queries = [q["sql"] for q in queries if "inventory_product" in q["sql"]]
+        self.assertEqual(len([q for q in product_queries if q.startswith("SELECT")]), 1)
+        self.assertEqual(len([q for q in product_queries if q.startswith("INSERT")]), 3)
+        self.assertEqual(Product.objects.filter(sku__startswith="BULK-").count(), 5)
+
+    def test_bulk_create_reports_errors_per_item(self):
+        data = [
+            {"name": "Fine", "sku": "OK-1", "price": "1.00"},
+            {"name": "Taken", "sku": "WH-2024", "price": "1.00"},
+            {"name": "Repeated", "sku": "OK-1", "price": "1.00"},
+            {"name": "Bad price", "sku": "OK-2", "price": "abc"},
+        ]
+        response = self.client.post("/api/products/create/", data, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("sku", response.data[1])
+        self.assertIn("sku", response.data[2])
+        self.assertEqual(list(response.data[3]), ["price"])
+        self.assertEqual(Product.objects.count(), 2)
+
+    def test_bulk_mutate(self):
+        """Test batch patch and delete with one UPDATE and one DELETE"""
+        headphones = Product.objects.get(sku="WH-2024")
+        laptop = Product.objects.get(sku="GL-456")
+        extra = Product.objects.create(name="Mouse", sku="MS-1", price=10)
+        doomed = Product.objects.create(name="Cable", sku="CB-1", price=5)
+        missing = "00000000-0000-0000-0000-000000000000"
+        operations = [
+            {"id": str(headphones.id), "changes": {"price": "149.99"}},
+            {"id": str(laptop.id), "changes": {"price": "999.00", "quantity": 5}},
+            {"id": str(extra.id), "changes": {"price": "10.00"}},
+            {"id": str(doomed.id), "delete": True},
+            {"id": missing, "changes": {"price": "1.00"}},
+            {"id": str(headphones.id), "changes": {"quantity": 1}},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/products/bulk/", operations, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [result["status"] for result in response.data["results"]],
+            ["updated", "updated", "unchanged", "deleted", "not_found", "invalid"],
+        )
+        sql = [q["sql"] for q in queries]
+        updates = [q for q in sql if q.startswith('UPDATE "inventory_product"')]
+        deletes = [q for q in sql if q.startswith('DELETE FROM "inventory_product"')]
+        self.assertEqual(len(updates), 2)  # One per changed column set
+        self.assertEqual(len(deletes), 1)
+
+        headphones.refresh_from_db()
+        laptop.refresh_from_db()
+        self.assertEqual(str(headphones.price), "149.99")
+        self.assertEqual(headphones.quantity, 50)
+        self.assertEqual((str(laptop.price), laptop.quantity), ("999.00", 5))
+        self.assertFalse(Product.objects.filter(pk=doomed.pk).exists())
+
+    def test_bulk_mutate_validates_changes(self):
+        laptop = Product.objects.get(sku="GL-456")
+        operations = [
+            {"id": str(laptop.id), "changes": {"price": "abc"}},
+            {"id": "not-a-uuid", "delete": True},
+        ]
+        response = self.client.post("/api/products/bulk/", operations, format="json")
+        results = response.data["results"]
+        self.assertEqual(results[0]["status"], "invalid")
+        self.assertIn("price", results[0]["errors"])
+        self.assertEqual(results[1]["status"], "invalid")
+        self.assertEqual(str(Product.objects.get(pk=laptop.pk).price), "1299.99")
+
+    def test_bulk_mutate_checks_new_skus_together(self):
+        """Test that sku clashes are found with one query, in the request too"""
+        headphones = Product.objects.get(sku="WH-2024")
+        laptop = Product.objects.get(sku="GL-456")
+        mouse = Product.objects.create(name="Mouse", sku="MS-1", price=10)
+        operations = [
+            {"id": str(headphones.id), "changes": {"sku": "NEW-1"}},
+            {"id": str(laptop.id), "changes": {"sku": "NEW-1"}},
+            {"id": str(mouse.id), "changes": {"sku": "WH-2024"}},
+        ]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/products/bulk/", operations, format="json"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        results = response.data["results"]
+        self.assertEqual(
+            [result["status"] for result in results], ["updated", "invalid", "invalid"]
+        )
+        self.assertEqual(
+            results[1]["errors"]["sku"], ["Duplicate sku in this request."]
+        )
+        sku_lookups = [
+            q
+            for q in queries
+            if q["sql"].startswith("SELECT") and '"sku" IN' in q["sql"]
+        ]
+        self.assertEqual(len(sku_lookups), 1)
+        laptop.refresh_from_db()
+        self.assertEqual(laptop.sku, "GL-456")
+
+    def test_cursor_pagination(self):
+        """Test walking every page with a cursor on a field with ties and NULLs"""
+        for i in range(5):
+            Product.objects.create(
+                name=f"Filter {i}", sku=f"F-{i}", category=None, price=10
+            )
+        Product.objects.create(name="Oil", sku="OIL-1", category="Fluids", price=10)
+
+        for ordering in ("category", "-category", "price", "-price", "-created_at"):
+            seen = []
+            url = f"/api/products/?ordering={ordering}&page_size=3"
+            while url:
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, status.HTTP_200_OK)
+                self.assertLessEqual(len(response.data["results"]), 3)
+                seen.extend(item["id"] for item in response.data["results"])
+                url = response.data["next"]
+            self.assertEqual(len(seen), 8, ordering)
+            self.assertEqual(len(set(seen)), 8, ordering)
+
+    def test_page_size_is_capped(self):
+        """Test that page_size cannot exceed the paginator maximum"""
+        response = self.client.get("/api/products/?page_size=100000")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIsNone(response.data["next"])
+
+    def test_invalid_cursor_and_ordering(self):
+        """Test that malformed cursors and unknown orderings are rejected"""
+        response = self.client.get("/api/products/?cursor=not-a-cursor")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.get("/api/products/?ordering=media")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_search(self):
+        """Test the q search parameter across name, sku and description"""
+        Product.objects.create(
+            name="Brake Pad Set",
+            sku="BP-100",
+            description="Front axle, fits Creta",
+            car_make="Hyundai",
+            price=45,
+        )
+        for term in ("brake pad", "BP-100", "creta"):
+            response = self.client.get("/api/products/", {"q": term})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            names = [item["name"] for item in response.data["results"]]
+            self.assertEqual(names, ["Brake Pad Set"], term)
+
+    def test_list_is_cached_until_a_write(self):
+        """Test that cached pages are served until a write bumps the version"""
+        first = self.client.get("/api/products/?ordering=price")
+        with self.assertNumQueries(1):  # Catalog version lookup only
+            cached = self.client.get("/api/products/?ordering=price&cursor=")
+        self.assertEqual(cached.data, first.data)
+
+        product = Product.objects.get(sku="WH-2024")
+        response = self.client.patch(
+            f"/api/products/{product.id}/update/", {"price": "5.00"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.get("/api/products/?ordering=price")
+        self.assertEqual(response.data["results"][0]["price"], "5.00")
+
+    def test_detail_is_invalidated_by_media_write(self):
+        """Test that media writes retire the cached product detail"""
+        product = Product.objects.get(sku="GL-456")
+        url = f"/api/products/{product.id}/"
+        self.assertEqual(self.client.get(url).data["media"], [])
+        response = self.client.post(
+            f"/api/products/{product.id}/media/create/", {"media_type": "image"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(self.client.get(url).data["media"]), 1)
+
+    def test_sparse_fieldset(self):
+        """Test narrowing the list output and SELECT with fields="""
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/api/products/?fields=id,name,sku,quantity,price"
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        for item in response.data["results"]:
+            self.assertEqual(set(item), {"id", "name", "sku", "quantity", "price"})
+        product_queries = [
+            query["sql"] for query in queries if "inventory_product" in query["sql"]
+        ]
+        self.assertEqual(len(product_queries), 1)
+        self.assertNotIn('"description"', product_queries[0])
+
+        response = self.client.get("/api/products/?exclude=description,mrp")
+        self.assertNotIn("description", response.data["results"][0])
+        self.assertIn("name", response.data["results"][0])
+
+        response = self.client.get("/api/products/?fields=id,secret")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_detail_sparse_fieldset(self):
+        """Test narrowing the detail output, including nested media"""
+        product = Product.objects.get(sku="GL-456")
+        response = self.client.get(
+            f"/api/products/{product.id}/?fields=name,media.thumbnail_url"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(set(response.data), {"name", "media"})
+
+    def test_detail_prefetches_media_in_order(self):
+        product = Product.objects.get(sku="GL-456")
+        for media_type in (ProductMedia.VIDEO, ProductMedia.IMAGE):
+            ProductMedia.objects.create(product=product, media_type=media_type)
+        bump_catalog_version()
+        # updated_at, catalog version, product, media
+        with self.assertNumQueries(4):
+            response = self.client.get(f"/api/products/{product.id}/")
+        self.assertEqual(
+            [item["media_type"] for item in response.data["media"]],
+            [ProductMedia.VIDEO, ProductMedia.IMAGE],
+        )
+
+    def test_detail_conditional_get(self):
+        """Test ETag/Last-Modified revalidation from updated_at"""
+        product = Product.objects.get(sku="GL-456")
+        url = f"/api/products/{product.id}/"
+        response = self.client.get(url)
+        etag = response["ETag"]
+        self.assertTrue(response.has_header("Last-Modified"))
+
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"]
+        )
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        narrowed = self.client.get(f"{url}?fields=name", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(narrowed.status_code, status.HTTP_200_OK)
+
+        # A media write moves updated_at on, which changes the ETag
+        ProductMedia.objects.create(product=product, media_type=ProductMedia.IMAGE)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(len(response.data["media"]), 1)
+
+    def test_detail_expand_order_usage(self):
+        from order.models import OrderCard, OrderPart
+
+        product = Product.objects.get(sku="GL-456")
+        for i in range(3):
+            order = OrderCard.objects.create(
+                customer_name=f"Customer {i}", customer_address="-", customer_phone="1"
+            )
+            OrderPart.objects.create(
+                order=order, product=product, part_id=str(product.id), quantity=i + 1
+            )
+        url = f"/api/products/{product.id}/?expand=order_usage"
+        # updated_at, product, media, order usage
+        with self.assertNumQueries(4):
+            response = self.client.get(url)
+        self.assertFalse(response.has_header("ETag"))
+        usage = response.data["order_usage"]
+        self.assertEqual([row["quantity"] for row in usage], [3, 2, 1])
+        self.assertEqual(usage[0]["customer_name"], "Customer 2")
+
+        order = OrderCard.objects.create(
+            customer_name="Latest", customer_address="-", customer_phone="1"
+        )
+        OrderPart.objects.create(order=order, product=product, part_id=str(product.id))
+        response = self.client.get(url)
+        self.assertEqual(response.data["order_usage"][0]["customer_name"], "Latest")
+
+        response = self.client.get(f"/api/products/{product.id}/?expand=invoices")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductIndexPlanTestCase(IndexPlanTestCase):
+    """
+    Each supported filter and ordering must be answerable from an index.
+    """
+
+    table = "inventory_product"
+
+    # Each filter and the index that must answer it. A one-sided price
+    # range matches most of the table, so walking the ordering index is a
+    # fair plan for it and it is not listed.
+    FILTERS = [
+        ({"min_price": "10", "max_price": "100"}, "product_price_idx"),
+        (
+            {"created_after": "2024-01-01", "created_before": "2024-02-01"},
+            "product_created_idx",
+        ),
+        ({"created_on": "2024-01-15"}, "product_created_idx"),
+        ({"mobis_status": Product.MOBIS}, "product_mobis_idx"),
+        ({"vendorCode": "V-01"}, "product_vendor_code_idx"),
+        ({"itemCode": "IC-01"}, "product_item_code_idx"),
+        ({"car_make": "Hyundai"}, "product_car_idx"),
+        ({"car_make": "Hyundai", "car_model": "Creta"}, "product_car_idx"),
+    ]
+
+    def setUp(self):
+        super().setUp()
+        get_product_cache().clear()
+        Product.objects.create(name="Oil Filter", sku="OF-1", price=10)
+
+    def test_filters_use_indexes(self):
+        """Test each filter under the list's default ordering"""
+        for data, index in self.FILTERS:
+            plan = self.explain_request("/api/products/", data)
+            self.assertSearchesIndex(plan, index, f"{data}: {plan}")
+
+    def test_orderings_use_indexes(self):
+        for name in ProductPagination.ordering_fields:
+            for ordering in (name, f"-{name}"):
+                plan = self.explain_request("/api/products/", {"ordering": ordering})
+                self.assertIndexBacked(plan, f"{ordering}: {plan}")
+
+    def test_delta_sync_uses_index(self):
+        position = (now(), uuid.uuid4())
+        queryset = Product.objects.filter(
+            after("updated_at", position), updated_at__lte=now()
+        ).order_by("updated_at", "id")[:50]
+        plan = queryset.explain()
+        self.assertIndexBacked(plan, plan)
+
+    def test_ordering_outside_allow_list_is_rejected(self):
+        response = self.client.get("/api/products/?ordering=description")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class FastReadParityTestCase(APITestCase):
+    """
+    The fast read path must render byte-identical JSON to the serializers.
+    """
+
+    def setUp(self):
+        get_product_cache().clear()
+        full = Product.objects.create(
+            name="Brake Disc",
+            sku="BD-1",
+            hsn="8708",
+            category="Brakes",
+            quantity=4,
+            price="1499.50",
+            msp="1400",
+            mrp="1599.00",
+            gst="18",
+            purchaseOrderDate=date(2024, 3, 1),
+            mobis_status=Product.MOBIS,
+        )
+        Product.objects.create(name="Wiper", price="0.10")  # Mostly NULLs
+        ProductMedia.objects.create(
+            product=full, media_type=ProductMedia.IMAGE, preview_url="https://x/1"
+        )
+        ProductMedia.objects.create(product=full, media_type=ProductMedia.VIDEO)
+
+    def assertParity(self, serializer_class, queryset):
+        renderer = JSONRenderer()
+        expected = renderer.render(serializer_class(queryset, many=True).data)
+        fast = FastReadSerializer(serializer_class())
+        actual = renderer.render(fast.serialize(fast.get_values(queryset)))
+        self.assertEqual(actual, expected)
+
+    def test_serializer_parity(self):
+        self.assertParity(ProductListSerializer, Product.objects.order_by("name"))
+        self.assertParity(
+            ProductMediaSerializer, ProductMedia.objects.order_by("-created_at")
+        )
+
+    def test_endpoint_parity(self):
+        for url in (
+            "/api/products/?ordering=price&page_size=1",
+            "/api/products/?fields=id,name,price,created_at",
+            "/api/products/media/",
+        ):
+            with override_settings(FAST_READ_SERIALIZERS=False):
+                expected = self.client.get(url)
+            get_product_cache().clear()
+            with override_settings(FAST_READ_SERIALIZERS=True):
+                actual = self.client.get(url)
+            self.assertEqual(actual.status_code, status.HTTP_200_OK, url)
+            self.assertEqual(actual.content, expected.content, url)
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command("benchmark_serializers", rows=20, repeat=1, stdout=out)
+        self.assertIn("products: 22 rows", out.getvalue())
+        self.assertEqual(Product.objects.count(), 2)  # Seed rows rolled back
+
+
+class ProductCsvUploadTestCase(APITestCase):
+    HEADER = "name,sku,price,quantity,purchaseOrderDate\n"
+
+    def upload(self, body):
+        csv_file = SimpleUploadedFile("products.csv", (self.HEADER + body).encode())
+        return self.client.post(
+            "/api/products/upload-products-csv/", {"file": csv_file}, format="multipart"
+        )
+
+    @override_settings(CSV_IMPORT_BATCH_SIZE=2)
+    def test_rows_are_inserted_in_batches(self):
+        """Test that clean rows cost one INSERT per batch"""
+        body = "".join(f"Part {i},P-{i},10.50,{i},2024-01-0{i + 1}\n" for i in range(5))
+        with CaptureQueriesContext(connection) as queries:
+            response = self.upload(body)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["created_products"]), 5)
+        self.assertEqual(response.data["errors"], [])
+        inserts = [q for q in queries if q["sql"].startswith("INSERT INTO")]
+        self.assertEqual(
+            len([q for q in inserts if "inventory_product" in q["sql"]]), 3
+        )
+
+    @override_settings(CSV_IMPORT_BATCH_SIZE=2)
+    def test_errors_are_reported_per_row(self):
+        """Test that bad rows are reported by number and good rows still land"""
+        Product.objects.create(name="Existing", sku="DUP", price=1)
+        body = (
+            "Good,G-1,1.00,1,\n"
+            "Bad quantity,G-2,1.00,many,\n"
+            "Duplicate,DUP,1.00,1,\n"
+            "Bad date,G-3,1.00,1,01/02/2024\n"
+            "Bad price,G-4,abc,1,\n"
+            "Also good,G-5,2.00,3,\n"
+        )
+        response = self.upload(body)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(response.data["created_products"]), 2)
+        self.assertEqual(
+            [error.split(":")[0] for error in response.data["errors"]],
+            ["Row 2", "Row 3", "Row 4", "Row 5"],
+        )
+        self.assertEqual(
+            set(Product.objects.values_list("sku", flat=True)), {"DUP", "G-1", "G-5"}
+        )
+
+    @override_settings(CSV_IMPORT_BATCH_SIZE=3)
+    def test_upsert_mode(self):
+        """Test matching by sku then itemCode, skipping unchanged rows"""
+        by_sku = Product.objects.create(name="Belt", sku="B-1", price="5.00")
+        by_code = Product.objects.create(
+            name="Hose", itemCode="H-CODE", price="7.00", quantity=2
+        )
+        body = (
+            "name,sku,itemCode,price\n"
+            "Belt,B-1,,5.00\n"  # Unchanged
+            "Belt,B-1,,6.25\n"  # Price change by sku
+            "Hose,,H-CODE,7.50\n"  # Price change by itemCode
+            "Clamp,C-1,,1.00\n"  # New
+            "Bad,B-2,,abc\n"  # Error
+        )
+        csv_file = SimpleUploadedFile("prices.csv", body.encode())
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                "/api/products/upload-products-csv/",
+                {"file": csv_file, "mode": "upsert"},
+                format="multipart",
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["summary"],
+            {"created": 1, "updated": 2, "merged": 0, "unchanged": 1, "errors": 1},
+        )
+        self.assertEqual(
+            sorted(response.data["updated_products"]),
+            sorted([str(by_sku.id), str(by_code.id)]),
+        )
+        lookups = [q for q in queries if 'FROM "inventory_product"' in q["sql"]]
+        self.assertEqual(len(lookups), 2)  # One per chunk
+
+        by_sku.refresh_from_db()
+        by_code.refresh_from_db()
+        self.assertEqual(str(by_sku.price), "6.25")
+        self.assertEqual(str(by_code.price), "7.50")
+        self.assertEqual(by_code.quantity, 2)  # Column absent from the upload
+        self.assertEqual(Product.objects.count(), 3)
+
+    def test_upsert_keeps_identity_on_blank_cells(self):
+        """Test that blank sku/name/price cells leave the product alone"""
+        hose = Product.objects.create(
+            name="Hose", sku="H-1", itemCode="H-CODE", price="7.00", category="Pipes"
+        )
+        body = (
+            "name,sku,itemCode,price,category\n"
+            ",,H-CODE,,\n"  # Blank category clears it; the rest is kept
+            "Clamp,C-1,,1.00,\n"
+            "Clamp,C-1,,1.25,\n"  # Merged into the insert above
+        )
+        csv_file = SimpleUploadedFile("prices.csv", body.encode())
+        response = self.client.post(
+            "/api/products/upload-products-csv/",
+            {"file": csv_file, "mode": "upsert"},
+            format="multipart",
+        )
+        self.assertEqual(
+            response.data["summary"],
+            {"created": 1, "updated": 1, "merged": 1, "unchanged": 0, "errors": 0},
+        )
+        hose.refresh_from_db()
+        self.assertEqual(
+            (hose.name, hose.sku, str(hose.price), hose.category),
+            ("Hose", "H-1", "7.00", None),
+        )
+        self.assertEqual(str(Product.objects.get(sku="C-1").price), "1.25")
+
+    def test_missing_file(self):
+        response = self.client.post("/api/products/upload-products-csv/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(MEDIA_ROOT=tempfile.mkdtemp(), CSV_IMPORT_BATCH_SIZE=2)
+class ProductImportJobTestCase(APITestCase):
+    BODY = "name,sku,price,quantity\n" + "".join(
+        f"Part {i},J-{i},1.00,{i}\n" for i in range(5)
+    )
+
+    def enqueue(self):
+        csv_file = SimpleUploadedFile("products.csv", self.BODY.encode())
+        response = self.client.post(
+            "/api/products/upload-products-csv/",
+            {"file": csv_file, "background": "true"},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        return response.data["job_id"]
+
+    def get_status(self, job_id):
+        return self.client.get(f"/api/products/import-jobs/{job_id}/")
+
+    def test_background_import(self):
+        """Test that the upload is queued and the worker drains it"""
+        job_id = self.enqueue()
+        self.assertEqual(Product.objects.count(), 0)
+        response = self.get_status(job_id)
+        self.assertEqual(response.data["status"], ProductImportJob.PENDING)
+        self.assertEqual(response.data["total_rows"], 5)
+
+        call_command("process_import_jobs", stdout=StringIO())
+
+        response = self.get_status(job_id)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["status"], ProductImportJob.COMPLETED)
+        self.assertEqual(response.data["rows_processed"], 5)
+        self.assertEqual(response.data["created_count"], 5)
+        self.assertEqual(response.data["errors"], [])
+        self.assertEqual(Product.objects.count(), 5)
+        self.assertFalse(ProductImportJob.objects.get(pk=job_id).file)
+
+    def test_stale_job_resumes_after_last_chunk(self):
+        """Test that a job abandoned mid-import picks up where it stopped"""
+        job_id = self.enqueue()
+        Product.objects.create(name="Part 0", sku="J-0", price=1)
+        Product.objects.create(name="Part 1", sku="J-1", price=1)
+        ProductImportJob.objects.filter(pk=job_id).update(
+            status=ProductImportJob.RUNNING,
+            rows_processed=2,
+            created_count=2,
+            started_at=now(),
+            heartbeat_at=now() - timedelta(hours=1),
+        )
+
+        call_command("process_import_jobs", stdout=StringIO())
+
+        job = ProductImportJob.objects.get(pk=job_id)
+        self.assertEqual(job.status, ProductImportJob.COMPLETED)
+        self.assertEqual(job.created_count, 5)
+        self.assertFalse(job.row_errors.exists())
+        self.assertEqual(
+            sorted(Product.objects.values_list("sku", flat=True)),
+            [f"J-{i}" for i in range(5)],
+        )
+
+    def test_taken_over_worker_stops(self):
+        """Test that a worker whose job was re-claimed writes nothing more"""
+        job_id = self.enqueue()
+        stalled = claim_next_job()
+        ProductImportJob.objects.filter(pk=job_id).update(
+            heartbeat_at=now() - timedelta(hours=1)
+        )
+        self.assertEqual(claim_next_job().pk, stalled.pk)
+
+        run_import_job(stalled)
+        self.assertEqual(Product.objects.count(), 0)
+        job = ProductImportJob.objects.get(pk=job_id)
+        self.assertEqual(
+            (job.status, job.rows_processed), (ProductImportJob.RUNNING, 0)
+        )
+
+    def test_errors_are_appended_per_chunk(self):
+        self.BODY = "name,sku,price,quantity\n" + "".join(
+            f"Part {i},J-{i},1.00,{'x' if i % 2 else i}\n" for i in range(5)
+        )
+        job_id = self.enqueue()
+        call_command("process_import_jobs", stdout=StringIO())
+        response = self.get_status(job_id)
+        self.assertEqual(response.data["error_count"], 2)
+        self.assertEqual(
+            [error.split(":")[0] for error in response.data["errors"]],
+            ["Row 2", "Row 4"],
+        )
+
+    def test_unknown_job(self):
+        response = self.get_status("00000000-0000-0000-0000-000000000000")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class ProductExportTestCase(APITestCase):
+    def setUp(self):
+        Product.objects.create(
+            name="Brake Pad",
+            sku="BP-1",
+            itemCode="BP-CODE",
+            category="Brakes",
+            price="120.50",
+            quantity=4,
+            purchaseOrderDate=date(2024, 3, 1),
+            mobis_status=Product.MOBIS,
+        )
+        Product.objects.create(
+            name="Air Filter", sku="AF-1", category="Filters", price="15.00"
+        )
+
+    def export(self, **params):
+        response = self.client.get("/api/products/export/", params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b"".join(response.streaming_content).decode()
+
+    def test_csv_export_round_trips(self):
+        """Test that an exported CSV can be uploaded back unchanged"""
+        exported = self.export()
+        rows = list(csv.DictReader(StringIO(exported)))
+        self.assertEqual(list(rows[0].keys()), CSV_COLUMNS)
+        self.assertEqual([row["sku"] for row in rows], ["BP-1", "AF-1"])
+
+        before = list(Product.objects.order_by("sku").values(*CSV_COLUMNS))
+        Product.objects.all().delete()
+        response = self.client.post(
+            "/api/products/upload-products-csv/",
+            {"file": SimpleUploadedFile("products.csv", exported.encode())},
+            format="multipart",
+        )
+        self.assertEqual(response.data["errors"], [])
+        after = list(Product.objects.order_by("sku").values(*CSV_COLUMNS))
+        self.assertEqual(after, before)
+
+    def test_ndjson_export_honors_filters(self):
+        exported = self.export(export_format="ndjson", category="brake")
+        lines = exported.splitlines()
+        self.assertEqual(len(lines), 1)
+        row = json.loads(lines[0])
+        self.assertEqual(row["sku"], "BP-1")
+        self.assertEqual(row["price"], "120.50")
+        self.assertEqual(row["purchaseOrderDate"], "2024-03-01")
+
+    def test_invalid_export_format(self):
+        response = self.client.get("/api/products/export/?export_format=xml")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@override_settings(PRODUCT_SYNC_LAG_SECONDS=0)
+class ProductChangesTestCase(APITestCase):
+    def setUp(self):
+        self.kept = Product.objects.create(name="Belt", sku="B-1", price=5)
+        self.removed = Product.objects.create(name="Hose", sku="H-1", price=7)
+
+    def sync(self, since=None):
+        params = {"since": since} if since else {}
+        response = self.client.get("/api/products/changes/", params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return response.data
+
+    def test_changes_and_tombstones_since_watermark(self):
+        """Test that only rows touched after the watermark come back"""
+        first = self.sync()
+        self.assertEqual(len(first["changed"]), 2)
+        self.assertEqual(first["deleted"], [])
+        self.assertFalse(first["has_more"])
+
+        self.assertEqual(self.sync(first["watermark"])["changed"], [])
+
+        self.client.patch(
+            f"/api/products/{self.kept.id}/update/", {"price": "6.00"}, format="json"
+        )
+        self.client.delete(f"/api/products/{self.removed.id}/delete/")
+        second = self.sync(first["watermark"])
+        self.assertEqual([p["id"] for p in second["changed"]], [str(self.kept.id)])
+        self.assertEqual(second["changed"][0]["price"], "6.00")
+        self.assertEqual(second["deleted"], [str(self.removed.id)])
+
+        third = self.sync(second["watermark"])
+        self.assertEqual((third["changed"], third["deleted"]), ([], []))
+
+    @override_settings(PRODUCT_SYNC_PAGE_SIZE=1)
+    def test_paging_through_identical_timestamps(self):
+        """Test that rows sharing one updated_at (bulk_update) are not skipped"""
+        self.client.post(
+            "/api/products/bulk/",
+            [
+                {"id": str(self.kept.id), "changes": {"quantity": 3}},
+                {"id": str(self.removed.id), "changes": {"quantity": 4}},
+            ],
+            format="json",
+        )
+        seen = []
+        data = {"watermark": None, "has_more": True}
+        while data["has_more"]:
+            data = self.sync(data["watermark"])
+            seen.extend(product["id"] for product in data["changed"])
+        self.assertEqual(
+            sorted(seen), sorted([str(self.kept.id), str(self.removed.id)])
+        )
+
+    def test_invalid_watermark(self):
+        response = self.client.get("/api/products/changes/?since=nonsense")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs concurrent writers")
+class ProductChangesOpenWriteTestCase(TransactionTestCase):
+    def test_late_commit_is_not_skipped(self):
+        """Test that a write committing after a sync is still delivered"""
+        product = Product.objects.create(name="Belt", sku="B-1", price=5)
+        watermark = self.sync()["watermark"]
+        writer = connections.create_connection("default")
+        try:
+            with writer.cursor() as cursor:
+                # Stamped at its start, committed after the syncs below
+                cursor.execute("BEGIN")
+                cursor.execute(
+                    "UPDATE inventory_product SET price = 6, updated_at = now() "
+                    "WHERE id = %s",
+                    [product.pk],
+                )
+                later = Product.objects.create(name="Hose", sku="H-1", price=7)
+                data = self.sync(watermark)
+                seen = [p["id"] for p in data["changed"]]
+                watermark = data["watermark"]
+                cursor.execute("COMMIT")
+        finally:
+            writer.close()
+
+        seen += [p["id"] for p in self.sync(watermark)["changed"]]
+        self.assertEqual(sorted(seen), sorted([str(product.id), str(later.id)]))
+
+    def sync(self, since=None):
+        params = {"since": since} if since else {}
+        with override_settings(PRODUCT_SYNC_LAG_SECONDS=0):
+            return self.client.get("/api/products/changes/", params).data
+
+
+class ProductFacetsTestCase(APITestCase):
+    def setUp(self):
+        get_product_cache().clear()
+        for name, category, make, model in [
+            ("Brake Pad", "Brakes", "Hyundai", "Creta"),
+            ("Brake Disc", "Brakes", "Hyundai", "i20"),
+            ("Oil Filter", "Filters", "Kia", "Seltos"),
+            ("Air Filter", None, "Hyundai", "Creta"),
+        ]:
+            Product.objects.create(
+                name=name, category=category, car_make=make, car_model=model, price=10
+            )
+
+    def test_facets_in_one_query(self):
+        """Test that all facets come back from one grouped round trip"""
+        # One query for the catalog version, one for every facet
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/products/facets/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["category"],
+            [
+                {"value": "Brakes", "count": 2},
+                {"value": None, "count": 1},
+                {"value": "Filters", "count": 1},
+            ],
+        )
+        self.assertEqual(
+            response.data["mobis_status"], [{"value": Product.NON_MOBIS, "count": 4}]
+        )
+        self.assertEqual(len(response.data["vendorName"]), 1)
+
+        with self.assertNumQueries(1):  # Cached
+            self.client.get("/api/products/facets/")
+
+    def test_facets_follow_filters(self):
+        response = self.client.get(
+            "/api/products/facets/", {"facets": "car_model", "car_make": "Hyundai"}
+        )
+        self.assertEqual(list(response.data), ["car_model"])
+        self.assertEqual(
+            response.data["car_model"],
+            [{"value": "Creta", "count": 2}, {"value": "i20", "count": 1}],
+        )
+
+    def test_unknown_facet(self):
+        response = self.client.get("/api/products/facets/?facets=price")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class ProductValuationReportTestCase(APITestCase):
+    URL = "/api/products/reports/valuation/"
+
+    def setUp(self):
+        get_product_cache().clear()
+        Product.objects.create(
+            name="Brake Pad",
+            category="Brakes",
+            vendorName="Mobis",
+            itemLocation="A1",
+            quantity=10,
+            price="90.00",
+            purchasePrice="100.00",
+            mrp="150.00",
+        )
+        Product.objects.create(
+            name="Brake Disc",
+            category="Brakes",
+            vendorName="Bosch",
+            itemLocation="A1",
+            quantity=2,
+            price="400.00",
+            purchasePrice="250.50",
+            mrp="500.00",
+        )
+        Product.objects.create(
+            name="Oil Filter", category="Filters", quantity=0, price="10.00"
+        )
+
+    def test_valuation_report(self):
+        """Test totals and groups are aggregated by the database"""
+        with self.assertNumQueries(4):  # Totals plus one query per grouping
+            response = self.client.get(self.URL)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["totals"],
+            {
+                "product_count": 3,
+                "total_quantity": 12,
+                "purchase_value": "1501.00",
+                "retail_value": "2500.00",
+                "zero_stock_count": 1,
+                "negative_margin_count": 1,
+            },
+        )
+        self.assertEqual(
+            [
+                (row["key"], row["purchase_value"])
+                for row in response.data["by_category"]
+            ],
+            [("Brakes", "1501.00"), ("Filters", "0.00")],
+        )
+        self.assertEqual(len(response.data["by_vendor"]), 3)
+        self.assertEqual(response.data["by_location"][0]["key"], "A1")
+
+    def test_grouping_and_filters(self):
+        response = self.client.get(
+            self.URL, {"group_by": "vendor", "category": "brake"}
+        )
+        self.assertNotIn("by_category", response.data)
+        self.assertEqual(response.data["totals"]["product_count"], 2)
+        response = self.client.get(self.URL, {"group_by": "colour"})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_snapshot_survives_writes(self):
+        first = self.client.get(self.URL, {"snapshot": "true"})
+        Product.objects.create(name="Clamp", quantity=5, price=1, purchasePrice=1)
+        with self.assertNumQueries(0):
+            second = self.client.get(self.URL, {"snapshot": "true"})
+        self.assertEqual(second.data, first.data)
+        live = self.client.get(self.URL)
+        self.assertEqual(live.data["totals"]["product_count"], 4)
+
+
+class ProductMediaAPITestCase(APITestCase):
+    def setUp(self):
+        get_product_cache().clear()
+        bump_catalog_version()  # Writes then cost one UPDATE, not a create
+        self.products = [
+            Product.objects.create(name=f"Part {i}", price=1) for i in range(3)
+        ]
+        for product in self.products:
+            for media_type in (ProductMedia.IMAGE, ProductMedia.VIDEO):
+                ProductMedia.objects.create(product=product, media_type=media_type)
+
+    def test_media_list_is_paginated(self):
+        seen = []
+        url = "/api/products/media/?page_size=4"
+        while url:
+            with self.assertNumQueries(1):
+                response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            seen.extend(item["id"] for item in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(len(seen), 6)
+        self.assertEqual(len(set(seen)), 6)
+
+    def test_media_for_a_batch_of_products(self):
+        ids = ",".join(str(product.id) for product in self.products[:2])
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/products/media/?product_id__in={ids}")
+        self.assertEqual(len(response.data["results"]), 4)
+        self.assertEqual(
+            {item["product"] for item in response.data["results"]},
+            {product.id for product in self.products[:2]},
+        )
+        response = self.client.get("/api/products/media/?product_id__in=nope")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_media_by_product(self):
+        product = self.products[0]
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/products/{product.id}/media/")
+        self.assertEqual(len(response.data), 2)
+
+        bare = Product.objects.create(name="Bare", price=1)
+        with self.assertNumQueries(2):
+            response = self.client.get(f"/api/products/{bare.id}/media/")
+        self.assertEqual(response.data, [])
+        response = self.client.get(
+            "/api/products/00000000-0000-0000-0000-000000000000/media/"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_media_by_id_and_writes(self):
+        media = ProductMedia.objects.filter(product=self.products[0]).first()
+        with self.assertNumQueries(1):
+            response = self.client.get(f"/api/products/media/{media.id}/")
+        self.assertEqual(response.data["id"], str(media.id))
+
+        # Product lookup, serializer's product check, INSERT, product
+        # updated_at touch, catalog bump
+        with self.assertNumQueries(5):
+            response = self.client.post(
+                f"/api/products/{self.products[0].id}/media/create/",
+                {"media_type": ProductMedia.IMAGE},
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+        # Media lookup, UPDATE, product touch, catalog bump
+        with self.assertNumQueries(4):
+            response = self.client.patch(
+                f"/api/products/media/{media.id}/update/",
+                {"preview_url": "https://x/1"},
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+        # Media lookup, DELETE, product touch, catalog bump
+        with self.assertNumQueries(4):
+            response = self.client.delete(f"/api/products/media/{media.id}/delete/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+
+    def test_bulk_media_for_one_product(self):
+        """Test a gallery upload costs a fixed number of queries"""
+        product = self.products[0]
+        gallery = [
+            {"media_type": ProductMedia.VIDEO, "preview_url": "https://x/v"},
+            *(
+                {
+                    "media_type": ProductMedia.IMAGE,
+                    "preview_url": f"https://x/{i}",
+                    "appwrite_file_id": f"file-{i}",
+                }
+                for i in range(20)
+            ),
+        ]
+        # Product lookup, INSERT, cover UPDATE, catalog bump
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(
+                f"/api/products/{product.id}/media/bulk/?set_cover=true",
+                gallery,
+                format="json",
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        statements = [
+            q["sql"]
+            for q in queries
+            if not q["sql"].startswith(("SAVEPOINT", "RELEASE"))
+        ]
+        self.assertEqual(len(statements), 4, statements)
+        self.assertEqual(len(response.data), 21)
+        self.assertEqual(ProductMedia.objects.filter(product=product).count(), 23)
+        product.refresh_from_db()
+        self.assertEqual(
+            (product.cover_image, product.cover_image_id), ("https://x/0", "file-0")
+        )
+
+    def test_bulk_media_across_products(self):
+        missing = "00000000-0000-0000-0000-000000000000"
+        items = [
+            {"product": str(self.products[1].id), "media_type": ProductMedia.IMAGE},
+            {"product": missing, "media_type": ProductMedia.IMAGE},
+            {"product": str(self.products[2].id), "media_type": "audio"},
+        ]
+        response = self.client.post("/api/products/media/bulk/", items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data[0], {})
+        self.assertIn("product", response.data[1])
+        self.assertIn("media_type", response.data[2])
+        self.assertEqual(ProductMedia.objects.count(), 6)
+
+        items = [items[0], {**items[2], "media_type": ProductMedia.VIDEO}]
+        response = self.client.post("/api/products/media/bulk/", items, format="json")
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(
+            [item["product"] for item in response.data],
+            [str(self.products[1].id), str(self.products[2].id)],
+        )
+        self.assertIsNone(Product.objects.get(pk=self.products[1].pk).cover_image)
+
+
+class StockLedgerTestCase(APITestCase):
+    def setUp(self):
+        get_product_cache().clear()
+        response = self.client.post(
+            "/api/products/create/",
+            {"name": "Brake Pad", "sku": "BP-1", "price": "40.00", "quantity": 10},
+            format="json",
+        )
+        self.product = Product.objects.get(sku=response.data["sku"])
+
+    def movements(self):
+        return list(
+            StockMovement.objects.filter(product_id=self.product.pk)
+            .order_by("created_at", "id")
+            .values_list("reason", "delta")
+        )
+
+    def test_writes_record_movements(self):
+        """Test that every quantity change appends a matching movement"""
+        self.client.patch(
+            f"/api/products/{self.product.id}/update/", {"quantity": 7}, format="json"
+        )
+        # Changes that leave the quantity alone record nothing
+        self.client.patch(
+            f"/api/products/{self.product.id}/update/",
+            {"price": "41.00"},
+            format="json",
+        )
+        self.client.post(
+            "/api/products/bulk/",
+            [{"id": str(self.product.id), "changes": {"quantity": 12}}],
+            format="json",
+        )
+        self.client.delete(f"/api/products/{self.product.id}/delete/")
+        self.assertEqual(
+            self.movements(),
+            [
+                (StockMovement.CREATE, 10),
+                (StockMovement.UPDATE, -3),
+                (StockMovement.UPDATE, 5),
+                (StockMovement.DELETE, -12),
+            ],
+        )
+
+    def test_import_records_movements(self):
+        body = "name,sku,price,quantity\nBrake Pad,BP-1,40.00,4\nWiper,WP-1,9.00,6\n"
+        csv_file = SimpleUploadedFile("products.csv", body.encode())
+        response = self.client.post(
+            "/api/products/upload-products-csv/?mode=upsert",
+            {"file": csv_file},
+            format="multipart",
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.movements()[-1], (StockMovement.IMPORT, -6))
+        wiper = Product.objects.get(sku="WP-1")
+        self.assertEqual(
+            list(
+                StockMovement.objects.filter(product_id=wiper.pk).values_list(
+                    "reason", "delta"
+                )
+            ),
+            [(StockMovement.IMPORT, 6)],
+        )
+
+    def test_stock_before_starts_from_a_snapshot(self):
+        """Test that a past quantity is the snapshot plus later movements"""
+        created = StockMovement.objects.get(product_id=self.product.pk)
+        StockMovement.objects.filter(pk=created.pk).update(
+            created_at=now() - timedelta(days=3)
+        )
+        with override_settings(STOCK_SNAPSHOT_LAG_SECONDS=2 * 86400):
+            self.assertEqual(take_snapshots(), 1)
+        # The snapshot is all the history a lookup reads
+        StockMovement.objects.filter(pk=created.pk).delete()
+        self.client.patch(
+            f"/api/products/{self.product.id}/update/", {"quantity": 4}, format="json"
+        )
+
+        self.assertEqual(stock_before(self.product.pk, now() - timedelta(days=1)), 10)
+        self.assertEqual(stock_before(self.product.pk, now()), 4)
+        self.assertEqual(stock_before(self.product.pk, now() - timedelta(days=4)), 0)
+
+    def test_snapshots_skip_products_that_did_not_move(self):
+        still = Product.objects.create(name="Still", sku="ST-1", price=1)
+        StockSnapshot.objects.create(product_id=still.pk, quantity=0, taken_at=now())
+        with override_settings(STOCK_SNAPSHOT_LAG_SECONDS=0):
+            out = StringIO()
+            call_command("snapshot_stock", stdout=out)
+            self.assertIn("Snapshotted 1 products", out.getvalue())
+            # Nothing moved since, so a second run writes nothing
+            self.assertEqual(take_snapshots(), 0)
+        self.assertEqual(
+            StockSnapshot.objects.get(product_id=self.product.pk).quantity, 10
+        )
+
+    def test_snapshots_keep_drift_visible(self):
+        """Test that a snapshot is built from the ledger, not the product row"""
+        Product.objects.filter(pk=self.product.pk).update(quantity=7)
+        with override_settings(STOCK_SNAPSHOT_LAG_SECONDS=0):
+            self.assertEqual(take_snapshots(), 1)
+        self.assertEqual(
+            StockSnapshot.objects.get(product_id=self.product.pk).quantity, 10
+        )
+        self.assertEqual(list(find_discrepancies()), [(self.product.pk, 7, 10)])
+
+        # A product with no history at all starts from its quantity
+        legacy = Product.objects.create(name="Legacy", sku="LG-1", price=1, quantity=4)
+        with override_settings(STOCK_SNAPSHOT_LAG_SECONDS=0):
+            take_snapshots()
+        self.assertEqual(StockSnapshot.objects.get(product_id=legacy.pk).quantity, 4)
+
+    def test_product_predating_the_ledger_opens_with_its_stock(self):
+        """Test that a first move records the stock held before the ledger"""
+        legacy = Product.objects.create(name="Legacy", sku="LG-1", price=1, quantity=50)
+        created = now()
+        Product.objects.filter(pk=legacy.pk).update(
+            created_at=created - timedelta(days=30)
+        )
+        # Unmoved, its history is its current quantity
+        self.assertEqual(stock_before(legacy.pk, created - timedelta(days=1)), 50)
+
+        self.client.patch(
+            f"/api/products/{legacy.id}/update/", {"quantity": 47}, format="json"
+        )
+        self.assertEqual(
+            list(
+                StockMovement.objects.filter(product_id=legacy.pk)
+                .order_by("created_at")
+                .values_list("reason", "delta")
+            ),
+            [(StockMovement.OPENING, 50), (StockMovement.UPDATE, -3)],
+        )
+        self.assertEqual(stock_before(legacy.pk, created - timedelta(days=1)), 50)
+        self.assertEqual(stock_before(legacy.pk, now()), 47)
+        with override_settings(STOCK_SNAPSHOT_LAG_SECONDS=0):
+            take_snapshots()
+        self.assertEqual(StockSnapshot.objects.get(product_id=legacy.pk).quantity, 47)
+        self.assertEqual(list(find_discrepancies()), [])
+
+        response = self.client.get(
+            f"/api/products/{legacy.id}/movements/",
+            {"since": (created - timedelta(days=1)).date().isoformat()},
+        )
+        self.assertEqual(
+            (response.data["opening_quantity"], response.data["closing_quantity"]),
+            (50, 47),
+        )
+
+    def test_reconcile_opens_products_without_history(self):
+        legacy = Product.objects.create(name="Legacy", sku="LG-1", price=1, quantity=5)
+        call_command("reconcile_stock", "--fix", stdout=StringIO())
+        movement = StockMovement.objects.get(product_id=legacy.pk)
+        self.assertEqual((movement.reason, movement.delta), (StockMovement.OPENING, 5))
+        self.assertEqual(movement.created_at, legacy.created_at)
+
+    def test_bulk_and_import_lock_their_targets(self):
+        """Test that quantities are rewritten against locked rows"""
+        with CaptureQueriesContext(connection) as queries:
+            self.client.post(
+                "/api/products/bulk/",
+                [{"id": str(self.product.id), "changes": {"quantity": 12}}],
+                format="json",
+            )
+            csv_file = SimpleUploadedFile(
+                "products.csv", b"name,sku,price,quantity\nBrake Pad,BP-1,40.00,3\n"
+            )
+            self.client.post(
+                "/api/products/upload-products-csv/",
+                {"file": csv_file, "mode": "upsert"},
+                format="multipart",
+            )
+        if connection.features.has_select_for_update:
+            locks = [q["sql"] for q in queries if "FOR UPDATE" in q["sql"]]
+            self.assertEqual(len(locks), 2, locks)
+        self.assertEqual(
+            self.movements()[1:],
+            [(StockMovement.UPDATE, 2), (StockMovement.IMPORT, -9)],
+        )
+        self.assertEqual(list(find_discrepancies()), [])
+
+    def test_movements_endpoint(self):
+        self.client.patch(
+            f"/api/products/{self.product.id}/update/", {"quantity": 6}, format="json"
+        )
+        today = now().date()
+        response = self.client.get(
+            f"/api/products/{self.product.id}/movements/",
+            {"since": today.isoformat(), "page_size": 1},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["opening_quantity"], 0)
+        self.assertEqual(response.data["closing_quantity"], 6)
+        self.assertEqual(response.data["results"][0]["delta"], 10)
+        response = self.client.get(response.data["next"])
+        self.assertEqual(response.data["results"][0]["delta"], -4)
+        self.assertIsNone(response.data["next"])
+
+        response = self.client.get(
+            f"/api/products/{self.product.id}/movements/",
+            {"until": (today - timedelta(days=1)).isoformat()},
+        )
+        self.assertEqual(response.data["results"], [])
+        self.assertEqual(response.data["closing_quantity"], 0)
+
+        missing = "00000000-0000-0000-0000-000000000000"
+        response = self.client.get(f"/api/products/{missing}/movements/")
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_expand_stock_movements(self):
+        response = self.client.get(
+            f"/api/products/{self.product.id}/", {"expand": "stock_movements"}
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            [m["reason"] for m in response.data["stock_movements"]],
+            [StockMovement.CREATE],
+        )
+
+    def test_reconcile_reports_and_fixes_drift(self):
+        Product.objects.filter(pk=self.product.pk).update(quantity=13)
+        out = StringIO()
+        call_command("reconcile_stock", stdout=out)
+        self.assertIn(f"{self.product.pk}: quantity 13, ledger 10", out.getvalue())
+        self.assertIn("Found 1 discrepancies", out.getvalue())
+
+        out = StringIO()
+        call_command("reconcile_stock", "--fix", stdout=out)
+        self.assertIn("Adjusted 1 products", out.getvalue())
+        self.assertEqual(self.movements()[-1], (StockMovement.ADJUSTMENT, 3))
+
+        out = StringIO()
+        call_command("reconcile_stock", stdout=out)
+        self.assertIn("Found 0 discrepancies", out.getvalue())
@@ -0,0 +1,67 @@
+import re
+
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+
+class IndexPlanTestCase(TestCase):
+    """
+    Base for tests asserting that queries on `table` are answered from an
+    index. Tiny test tables always favour a seq scan, so on Postgres the
+    planner is asked for the index plan instead.
+    """
+
+    table = None
+
+    def setUp(self):
+        super().setUp()
+        if connection.vendor == "postgresql":
+            with connection.cursor() as cursor:
+                cursor.execute("SET enable_seqscan = off")
+
+    def explain_request(self, path, data=None):
+        """
+        Plan of the query that reads `table` with an ORDER BY while serving
+        GET `path`, as run by the view.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path, data)
+        self.assertEqual(response.status_code, 200, response.content)
+        reads = [
+            query["sql"]
+            for query in queries
+            if query["sql"].startswith("SELECT")
+            and f'FROM "{self.table}"' in query["sql"]
+            and "ORDER BY" in query["sql"]
+        ]
+        self.assertEqual(len(reads), 1, reads)
+        explain = (
+            "EXPLAIN" if connection.vendor == "postgresql" else "EXPLAIN QUERY PLAN"
+        )
+        with connection.cursor() as cursor:
+            cursor.execute(f"{explain} {reads[0]}")
+            return "\n".join(" ".join(map(str, row)) for row in cursor.fetchall())
+
+    def assertIndexBacked(self, plan, msg=None):
+        if connection.vendor == "postgresql":
+            self.assertNotIn("Seq Scan", plan, msg)
+        else:
+            for line in plan.splitlines():
+                if self.table in line:
+                    self.assertIn("USING", line, msg)
+            self.assertNotIn("TEMP B-TREE", plan, msg)
+
+    def assertSearchesIndex(self, plan, index, msg=None):
+        """
+        The plan looks rows up in `index` by a condition, rather than
+        walking another index or the whole table. The matched rows may
+        still be sorted afterwards.
+        """
+        if connection.vendor == "postgresql":
+            # "Index Scan using <index> ..." or "Bitmap Index Scan on
+            # <index> ...", followed by its "Index Cond:"
+            pattern = rf"\b{index}\b.*\n\s*Index Cond:"
+        else:
+            pattern = rf"SEARCH {self.table} USING (COVERING )?INDEX {index} \("
+        self.assertRegex(plan, re.compile(pattern), msg)
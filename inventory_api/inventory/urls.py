@@ -2,20 +2,37 @@ from django.urls import path
 from .views import (
     ProductListView,
     ProductCreateView,
+    ProductValuationReportView,
+    ProductFacetsView,
+    ProductChangesView,
+    ProductExportView,
     ProductDetailView,
     ProductUpdateView,
     ProductDeleteView,
+    ProductBulkMutateView,
     ProductMediaListView,
     ProductMediaByProductView,
+    ProductStockMovementsView,
     CreateProductMediaView,
+    BulkCreateProductMediaView,
     GetProductMediaByIdView,
     UpdateProductMediaView,
     DeleteProductMediaView,
     ProductCsvUploadView,
+    ProductImportJobStatusView,
 )
 
 urlpatterns = [
     path("products/", ProductListView.as_view(), name="product-list"),
+    path("products/export/", ProductExportView.as_view(), name="product-export"),
+    path("products/bulk/", ProductBulkMutateView.as_view(), name="product-bulk"),
+    path("products/facets/", ProductFacetsView.as_view(), name="product-facets"),
+    path(
+        "products/reports/valuation/",
+        ProductValuationReportView.as_view(),
+        name="product-valuation-report",
+    ),
+    path("products/changes/", ProductChangesView.as_view(), name="product-changes"),
     path("products/create/", ProductCreateView.as_view(), name="product-create"),
     path("products/<uuid:pk>/", ProductDetailView.as_view(), name="product-detail"),
     path(
@@ -24,6 +41,11 @@ urlpatterns = [
     path(
         "products/<uuid:pk>/delete/", ProductDeleteView.as_view(), name="product-delete"
     ),
+    path(
+        "products/<uuid:pk>/movements/",
+        ProductStockMovementsView.as_view(),
+        name="product-stock-movements",
+    ),
     path("products/media/", ProductMediaListView.as_view(), name="all-product-media"),
     path(
         "products/<uuid:product_id>/media/",
@@ -35,6 +57,16 @@ urlpatterns = [
         CreateProductMediaView.as_view(),
         name="create-product-media",
     ),
+    path(
+        "products/<uuid:product_id>/media/bulk/",
+        BulkCreateProductMediaView.as_view(),
+        name="bulk-create-product-media",
+    ),
+    path(
+        "products/media/bulk/",
+        BulkCreateProductMediaView.as_view(),
+        name="bulk-create-media",
+    ),
     path(
         "products/media/<uuid:media_id>/update/",
         UpdateProductMediaView.as_view(),
@@ -55,4 +87,9 @@ urlpatterns = [
         ProductCsvUploadView.as_view(),
         name="upload_products_csv",
     ),
+    path(
+        "products/import-jobs/<uuid:job_id>/",
+        ProductImportJobStatusView.as_view(),
+        name="product-import-job",
+    ),
 ]
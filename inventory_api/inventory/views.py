@@ -2,33 +2,69 @@ from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
 from rest_framework.permissions import AllowAny
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.http import Http404, StreamingHttpResponse
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response, quote_etag
+from django.utils.http import http_date
+from django.utils import timezone
 import csv
-import io
-from datetime import datetime
+from datetime import timedelta
+import hashlib
 
-from .models import Product, ProductMedia
+from .models import Product, ProductImportJob, ProductMedia, StockMovement
 from .serializers import (
     ProductListSerializer,
     ProductCreateSerializer,
     ProductDetailSerializer,
     ProductUpdateSerializer,
     ProductMediaSerializer,
+    ProductImportJobSerializer,
+    StockMovementSerializer,
+    ValuationGroupSerializer,
+    ValuationSerializer,
+    parse_fieldset,
 )
 
-from .filters import ProductFilter
+from .bulk import ProductBulkMutation
+from .cache import (
+    build_cache_key,
+    cache_product_response,
+    get_product_cache,
+    invalidates_product_cache,
+)
+from .exporter import CONTENT_TYPES, CSV, FORMATS, stream_export
+from .expand import PRODUCT_EXPANSIONS
+from .facets import FACET_FIELDS, count_facets
+from .fastpath import FastReadSerializer, fast_read_enabled
+from .filters import ProductFilter, ProductMediaFilter, StockMovementFilter
+from .importer import ProductCsvImporter, read_csv_rows
+from .jobs import enqueue_import
+from .ledger import record_movements, stock_before
+from .reports import VALUATION_GROUPINGS, build_valuation_report
+from .search import SEARCH_RANK_ORDERING
+from .sync import InvalidWatermark, ProductChanges, record_deletions
+from .pagination import (
+    ProductMediaPagination,
+    ProductPagination,
+    StockMovementPagination,
+)
 
 
 class ProductListView(APIView):
     """
     Handle GET requests to list all products with:
     - Filtering (price range, category, name, creation date)
-    - Searching (name or other fields)
+    - Searching (`q`, ranked by relevance on Postgres)
     - Ordering (ascending/descending)
+    - Cursor pagination (`cursor`, `page_size`)
     """
 
     permission_classes = [AllowAny]
 
+    @cache_product_response
     def get(self, request):
         products = Product.objects.all()
 
@@ -41,12 +77,176 @@ class ProductListView(APIView):
 
         # Apply ordering
         ordering = request.GET.get("ordering")
-        if ordering:
-            products = products.order_by(ordering)
+        if not ordering and "rank" in products.query.annotations:
+            ordering = SEARCH_RANK_ORDERING
+        paginator = ProductPagination()
+        context = {"request": request}
+        list_serializer = ProductListSerializer(context=context)
+
+        if fast_read_enabled():
+            # Page over values() rows and encode them without model instances
+            fast = FastReadSerializer(list_serializer)
+            ordering_name = (ordering or paginator.default_ordering).lstrip("-")
+            paginator.get_ordering_field(products, ordering_name)
+            page = paginator.paginate_queryset(
+                fast.get_values(products, ordering_name),
+                request,
+                view=self,
+                ordering=ordering,
+            )
+            return paginator.get_paginated_response(fast.serialize(page))
+
+        # Only select the columns the requested fieldset needs, then paginate
+        products = products.only(*list_serializer.get_select_fields())
+        page = paginator.paginate_queryset(
+            products, request, view=self, ordering=ordering
+        )
 
         # Serialize and return the response
-        serializer = ProductListSerializer(products, many=True)
-        return Response(serializer.data, status=200)
+        serializer = ProductListSerializer(page, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
+
+
+class ProductExportView(APIView):
+    """
+    Stream products as CSV (the columns `ProductCsvUploadView` accepts, so
+    an export can be uploaded again) or NDJSON. Takes every `ProductFilter`
+    parameter; pick the format with `export_format=csv|ndjson`.
+    """
+
+    def get(self, request):
+        export_format = request.GET.get("export_format", CSV)
+        if export_format not in FORMATS:
+            return Response(
+                {"error": f"Invalid export_format. Use one of {FORMATS}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        filterset = ProductFilter(data=request.GET, queryset=Product.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        response = StreamingHttpResponse(
+            stream_export(filterset.qs, export_format, settings.EXPORT_CHUNK_SIZE),
+            content_type=CONTENT_TYPES[export_format],
+        )
+        response["Content-Disposition"] = (
+            f'attachment; filename="products.{export_format}"'
+        )
+        return response
+
+
+class ProductFacetsView(APIView):
+    """
+    Count products per category, mobis status, car make/model and vendor
+    under the same filters as `ProductListView`. Pick facets with
+    `facets=category,car_make`; all are returned by default.
+    """
+
+    @cache_product_response(timeout=settings.PRODUCT_FACETS_CACHE_TIMEOUT)
+    def get(self, request):
+        names = request.GET.get("facets")
+        names = (
+            [name.strip() for name in names.split(",") if name.strip()]
+            if names
+            else FACET_FIELDS
+        )
+        unknown = [name for name in names if name not in FACET_FIELDS]
+        if unknown:
+            return Response(
+                {"error": f"Unknown facets {unknown}. Use any of {FACET_FIELDS}."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        filterset = ProductFilter(data=request.GET, queryset=Product.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        facets = count_facets(filterset.qs, list(dict.fromkeys(names)))
+        return Response(facets, status=status.HTTP_200_OK)
+
+
+class ProductValuationReportView(APIView):
+    """
+    Stock valuation (quantity x purchasePrice and quantity x mrp) with
+    zero-stock and negative-margin counts, in total and grouped by
+    `group_by=category,vendor,location`. Takes every `ProductFilter`
+    parameter. With `snapshot=true` a cached copy up to
+    `VALUATION_SNAPSHOT_TIMEOUT` seconds old is served instead.
+    """
+
+    def get(self, request):
+        group_by = request.GET.get("group_by")
+        groupings = (
+            [name.strip() for name in group_by.split(",") if name.strip()]
+            if group_by
+            else list(VALUATION_GROUPINGS)
+        )
+        unknown = [name for name in groupings if name not in VALUATION_GROUPINGS]
+        if unknown:
+            return Response(
+                {
+                    "error": f"Unknown group_by {unknown}. "
+                    f"Use any of {list(VALUATION_GROUPINGS)}."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        filterset = ProductFilter(data=request.GET, queryset=Product.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+
+        if request.GET.get("snapshot", "").lower() not in ("true", "1"):
+            data = self.get_report(filterset.qs, groupings)
+            return Response(data, status=status.HTTP_200_OK)
+
+        cache = get_product_cache()
+        key = build_cache_key(request, type(self).__name__, {}, version="snapshot")
+        data = cache.get(key)
+        if data is None:
+            data = self.get_report(filterset.qs, groupings)
+            cache.set(key, data, settings.VALUATION_SNAPSHOT_TIMEOUT)
+        return Response(data, status=status.HTTP_200_OK)
+
+    def get_report(self, queryset, groupings):
+        report = build_valuation_report(queryset, list(dict.fromkeys(groupings)))
+        data = {
+            "generated_at": timezone.now(),
+            "totals": ValuationSerializer(report.pop("totals")).data,
+        }
+        for name, rows in report.items():
+            data[name] = ValuationGroupSerializer(rows, many=True).data
+        return data
+
+
+class ProductChangesView(APIView):
+    """
+    Delta sync: products changed and ids deleted since `since`, a
+    watermark returned by the previous call (omit it for a full sync).
+    Keep calling with the new watermark while `has_more` is true.
+    """
+
+    def get(self, request):
+        try:
+            changes = ProductChanges(since=request.GET.get("since"))
+        except InvalidWatermark as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        context = {"request": request}
+        list_serializer = ProductListSerializer(context=context)
+        products = Product.objects.only(*list_serializer.get_select_fields())
+        changed = changes.get_changed(products)
+        deleted = changes.get_deleted()
+        serializer = ProductListSerializer(changed, many=True, context=context)
+        return Response(
+            {
+                "changed": serializer.data,
+                "deleted": deleted,
+                "watermark": changes.get_watermark(),
+                "has_more": changes.has_more,
+            },
+            status=status.HTTP_200_OK,
+        )
 
 
 class ProductCreateView(APIView):
@@ -56,6 +256,7 @@ class ProductCreateView(APIView):
 
     permission_classes = [AllowAny]
 
+    @invalidates_product_cache
     def post(self, request):
         if isinstance(
             request.data, list
@@ -65,45 +266,161 @@ class ProductCreateView(APIView):
             serializer = ProductCreateSerializer(data=request.data)
 
         if serializer.is_valid():
-            serializer.save()
+            with transaction.atomic():
+                created = serializer.save()
+                if not isinstance(created, list):
+                    created = [created]
+                record_movements(
+                    {product.pk: product.quantity for product in created},
+                    StockMovement.CREATE,
+                )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
         return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
 
 class ProductDetailView(APIView):
     """
-    Handle GET requests to retrieve a specific product.
+    Handle GET requests to retrieve a specific product, with its media in
+    one prefetch and optional related data via `expand=` (see
+    `PRODUCT_EXPANSIONS`). Without `expand=` the response carries an ETag
+    and Last-Modified derived from `updated_at`, so clients can
+    revalidate with a conditional GET.
     """
 
     def get(self, request, pk):
+        updated_at = (
+            Product.objects.filter(pk=pk).values_list("updated_at", flat=True).first()
+        )
+        if updated_at is None:
+            return Response(
+                {"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+
+        expand = parse_fieldset(request.GET.get("expand")) or []
+        unknown = [name for name in expand if name not in PRODUCT_EXPANSIONS]
+        if unknown:
+            return Response(
+                {
+                    "error": f"Unknown expand {unknown}. "
+                    f"Use any of {list(PRODUCT_EXPANSIONS)}."
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if expand:
+            # Expanded data changes without touching the product, so these
+            # responses are neither cached nor given validators
+            response = self.get_detail(request, pk)
+            if response.status_code == status.HTTP_200_OK:
+                for name in expand:
+                    response.data[name] = PRODUCT_EXPANSIONS[name](pk)
+            return response
+
+        etag = self.get_etag(request, updated_at)
+        last_modified = int(updated_at.timestamp())
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = self.get_cached_detail(request, pk=pk, updated_at=updated_at)
+        response["ETag"] = etag
+        response["Last-Modified"] = http_date(last_modified)
+        return response
+
+    def get_etag(self, request, updated_at):
+        # The representation also depends on the requested fieldset
+        raw = repr(
+            (
+                updated_at.isoformat(),
+                request.GET.get("fields"),
+                request.GET.get("exclude"),
+            )
+        )
+        return quote_etag(hashlib.sha1(raw.encode("utf-8")).hexdigest())
+
+    @cache_product_response
+    def get_cached_detail(self, request, pk, updated_at):
+        # updated_at is part of the cache key, so the cached body always
+        # matches the ETag even if the product changed outside a view
+        return self.get_detail(request, pk)
+
+    def get_detail(self, request, pk):
+        context = {"request": request}
+        serializer = ProductDetailSerializer(context=context)
+        products = Product.objects.only(*serializer.get_select_fields())
+        if "media" in serializer.fields:
+            media_serializer = serializer.fields["media"].child
+            media = ProductMedia.objects.only(
+                *media_serializer.get_select_fields(), "product"
+            ).order_by("created_at", "id")
+            products = products.prefetch_related(Prefetch("media", queryset=media))
         try:
-            product = Product.objects.get(pk=pk)
-            serializer = ProductDetailSerializer(product)
-            return Response(serializer.data)
+            product = products.get(pk=pk)
         except Product.DoesNotExist:
             return Response(
                 {"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
+        serializer = ProductDetailSerializer(product, context=context)
+        return Response(serializer.data)
+
 
 class ProductUpdateView(APIView):
     """
     Handle PUT requests to update a product.
     """
 
+    @invalidates_product_cache
     def patch(self, request, pk):
+        with transaction.atomic():
+            try:
+                # Locked so the quantity change is recorded against the
+                # value it replaced
+                product = Product.objects.select_for_update().get(pk=pk)
+            except Product.DoesNotExist:
+                return Response(
+                    {"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND
+                )
+
+            serializer = ProductUpdateSerializer(
+                product, data=request.data, partial=True
+            )
+            if not serializer.is_valid():
+                return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+            before = product.quantity
+            serializer.save()
+            record_movements(
+                {product.pk: product.quantity - before},
+                StockMovement.UPDATE,
+                before={product.pk: before},
+            )
+        return Response(serializer.data)
+
+
+class ProductBulkMutateView(APIView):
+    """
+    Handle POST requests that patch or delete many products at once.
+    The body is a list of `{"id", "changes"}` or `{"id", "delete": true}`
+    operations; see `ProductBulkMutation`.
+    """
+
+    @invalidates_product_cache
+    def post(self, request):
+        if not isinstance(request.data, list) or not request.data:
+            return Response(
+                {"error": "Expected a non-empty list of operations."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
         try:
-            product = Product.objects.get(pk=pk)
-        except Product.DoesNotExist:
+            results = ProductBulkMutation(request.data).run()
+        except IntegrityError:
+            # A concurrent write took a sku after it was checked
             return Response(
-                {"error": "Product not found"}, status=status.HTTP_404_NOT_FOUND
+                {
+                    "error": "The changes conflict with another write; nothing was saved."
+                },
+                status=status.HTTP_409_CONFLICT,
             )
-
-        serializer = ProductUpdateSerializer(product, data=request.data, partial=True)
-        if serializer.is_valid():
-            serializer.save()
-            return Response(serializer.data)
-        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+        return Response({"results": results}, status=status.HTTP_200_OK)
 
 
 class ProductDeleteView(APIView):
@@ -111,10 +428,19 @@ class ProductDeleteView(APIView):
     Handle DELETE requests to delete a product.
     """
 
+    @invalidates_product_cache
     def delete(self, request, pk):
         try:
-            product = Product.objects.get(pk=pk)
-            product.delete()
+            with transaction.atomic():
+                # Locked so the DELETE movement takes the final quantity
+                product = Product.objects.select_for_update().get(pk=pk)
+                record_movements(
+                    {pk: -product.quantity},
+                    StockMovement.DELETE,
+                    before={pk: product.quantity},
+                )
+                product.delete()
+                record_deletions([pk])
             return Response(
                 {"message": "Product deleted successfully"},
                 status=status.HTTP_204_NO_CONTENT,
@@ -127,18 +453,30 @@ class ProductDeleteView(APIView):
 
 class ProductMediaListView(APIView):
     """
-    Fetch all media for all products
+    Fetch media for all products, newest first, with cursor pagination
+    (`cursor`, `page_size`) and an optional `product_id__in` batch filter.
     """
 
     def get(self, request):
-        try:
-            media = ProductMedia.objects.all().order_by("-created_at")
-            serializer = ProductMediaSerializer(media, many=True)
-            return Response(serializer.data, status=status.HTTP_200_OK)
-        except Exception as e:
-            return Response(
-                {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
+        filterset = ProductMediaFilter(
+            data=request.GET, queryset=ProductMedia.objects.all()
+        )
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        media = filterset.qs
+        paginator = ProductMediaPagination()
+        context = {"request": request}
+
+        if fast_read_enabled():
+            fast = FastReadSerializer(ProductMediaSerializer(context=context))
+            page = paginator.paginate_queryset(
+                fast.get_values(media, "created_at"), request, view=self
             )
+            return paginator.get_paginated_response(fast.serialize(page))
+
+        page = paginator.paginate_queryset(media, request, view=self)
+        serializer = ProductMediaSerializer(page, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
 
 
 class ProductMediaByProductView(APIView):
@@ -148,21 +486,64 @@ class ProductMediaByProductView(APIView):
 
     def get(self, request, product_id):
         try:
-            product = get_object_or_404(Product, id=product_id)
-            media = ProductMedia.objects.filter(product=product)
+            media = list(ProductMedia.objects.filter(product_id=product_id))
+            # Only an empty result needs the product lookup, to tell "no
+            # media" apart from "no such product"
+            if not media:
+                get_object_or_404(Product.objects.only("id"), id=product_id)
             serializer = ProductMediaSerializer(media, many=True)
             return Response(serializer.data, status=status.HTTP_200_OK)
+        except Http404:
+            raise
         except Exception as e:
             return Response(
                 {"error": str(e)}, status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
 
 
+class ProductStockMovementsView(APIView):
+    """
+    A product's stock ledger, oldest first, with cursor pagination and an
+    optional `since`/`until` date range. `opening_quantity` and
+    `closing_quantity` are the stock at the range's edges, read from the
+    nearest snapshot rather than by replaying the whole history.
+    """
+
+    def get(self, request, pk):
+        filterset = StockMovementFilter(
+            data=request.GET, queryset=StockMovement.objects.filter(product_id=pk)
+        )
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        since = filterset.form.cleaned_data.get("since")
+        until = filterset.form.cleaned_data.get("until")
+
+        # Movements outlive their product, so only a product with neither
+        # is unknown
+        if not filterset.qs.exists():
+            get_object_or_404(Product.objects.only("id"), id=pk)
+
+        paginator = StockMovementPagination()
+        page = paginator.paginate_queryset(filterset.qs, request, view=self)
+        response = paginator.get_paginated_response(
+            StockMovementSerializer(page, many=True).data
+        )
+        start_of = StockMovementFilter.start_of
+        response.data["opening_quantity"] = (
+            stock_before(pk, start_of(since)) if since else 0
+        )
+        response.data["closing_quantity"] = stock_before(
+            pk, start_of(until) + timedelta(days=1) if until else timezone.now()
+        )
+        return response
+
+
 class CreateProductMediaView(APIView):
     """
     Create a new media entry for a product
     """
 
+    @invalidates_product_cache
     def post(self, request, product_id):
         try:
             product = get_object_or_404(Product, id=product_id)
@@ -182,11 +563,50 @@ class CreateProductMediaView(APIView):
             )
 
 
+class BulkCreateProductMediaView(APIView):
+    """
+    Register a list of media rows in one request, either for the product
+    in the URL or, without one, for the `product` given on each item.
+    With `set_cover=true` each product's cover image is set from the first
+    image in the list.
+    """
+
+    @invalidates_product_cache
+    def post(self, request, product_id=None):
+        if not isinstance(request.data, list) or not request.data:
+            return Response(
+                {"error": "Expected a non-empty list of media."},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        context = {
+            "set_cover": request.GET.get("set_cover", "").lower() in ("true", "1")
+        }
+        data = request.data
+        if product_id is not None:
+            product = get_object_or_404(
+                Product.objects.only("id", "cover_image", "cover_image_id"),
+                id=product_id,
+            )
+            context["products"] = {product.id: product}
+            data = [
+                {**item, "product": product.id} if isinstance(item, dict) else item
+                for item in data
+            ]
+
+        serializer = ProductMediaSerializer(data=data, many=True, context=context)
+        if serializer.is_valid():
+            serializer.save()
+            return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
+
+
 class UpdateProductMediaView(APIView):
     """
     Update an existing product media entry.
     """
 
+    @invalidates_product_cache
     def patch(self, request, media_id):
         """
         Partial update for media (e.g., update only `appwrite_file_id` or `media_type`).
@@ -214,6 +634,7 @@ class DeleteProductMediaView(APIView):
     Delete a media entry by ID
     """
 
+    @invalidates_product_cache
     def delete(self, request, media_id):
         try:
             media = get_object_or_404(ProductMedia, id=media_id)
@@ -255,8 +676,14 @@ class GetProductMediaByIdView(APIView):
 class ProductCsvUploadView(APIView):
     """
     Handle CSV uploads to create products in the database.
+    The file is streamed and inserted in batches (see `ProductCsvImporter`).
+    With `mode=upsert`, rows matching an existing sku or itemCode update
+    that product instead of creating a duplicate.
+    With `background=true` the file is queued for the `process_import_jobs`
+    worker instead, and the response carries the job id to poll.
     """
 
+    @invalidates_product_cache
     def post(self, request):
         csv_file = request.FILES.get("file")
         if not csv_file:
@@ -265,64 +692,66 @@ class ProductCsvUploadView(APIView):
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        try:
-            decoded_file = csv_file.read().decode("utf-8")
-            io_string = io.StringIO(decoded_file)
-            reader = csv.DictReader(io_string)
-        except Exception as e:
+        mode = request.data.get("mode") or request.GET.get(
+            "mode", ProductCsvImporter.INSERT
+        )
+        if mode not in ProductCsvImporter.MODES:
             return Response(
-                {"error": f"Failed to read CSV file: {str(e)}"},
+                {"error": f"Invalid mode. Use one of {ProductCsvImporter.MODES}."},
                 status=status.HTTP_400_BAD_REQUEST,
             )
 
-        created_products = []
-        errors = []
-        row_number = 1
-
-        for row in reader:
+        background = request.data.get("background") or request.GET.get("background")
+        if str(background).lower() in ("true", "1"):
             try:
-                product = Product(
-                    name=row.get("name"),
-                    itemCode=row.get("itemCode") or None,
-                    sku=row.get("sku") or None,
-                    hsn=row.get("hsn") or None,
-                    category=row.get("category") or None,
-                    quantity=int(row.get("quantity", 0)),
-                    itemLocation=row.get("itemLocation") or None,
-                    description=row.get("description") or None,
-                    price=row.get("price"),
-                    msp=row.get("msp") or None,
-                    mrp=row.get("mrp") or None,
-                    gst=row.get("gst") or None,
-                    cgst=row.get("cgst") or None,
-                    sgst=row.get("sgst") or None,
-                    igst=row.get("igst") or None,
-                    vendorCode=row.get("vendorCode") or None,
-                    vendorName=row.get("vendorName") or None,
-                    purchasePrice=row.get("purchasePrice") or None,
-                    purchaseLocation=row.get("purchaseLocation") or None,
-                    purchaseOrderId=row.get("purchaseOrderId") or None,
-                    warrantyPeriod=row.get("warrantyPeriod") or None,
-                    mobis_status=row.get("mobis_status", Product.NON_MOBIS),
+                job = enqueue_import(csv_file, mode)
+            except (UnicodeDecodeError, csv.Error) as e:
+                return Response(
+                    {"error": f"Failed to read CSV file: {str(e)}"},
+                    status=status.HTTP_400_BAD_REQUEST,
                 )
+            return Response(
+                {"job_id": str(job.id), "status": job.status},
+                status=status.HTTP_202_ACCEPTED,
+            )
 
-                # Parse dates if provided (expected format: YYYY-MM-DD)
-                if row.get("purchaseOrderDate"):
-                    product.purchaseOrderDate = datetime.strptime(
-                        row["purchaseOrderDate"], "%Y-%m-%d"
-                    ).date()
-                if row.get("lastUpdatedDate"):
-                    product.lastUpdatedDate = datetime.strptime(
-                        row["lastUpdatedDate"], "%Y-%m-%d"
-                    ).date()
-
-                product.save()
-                created_products.append(str(product.id))
-            except Exception as e:
-                errors.append(f"Row {row_number}: {str(e)}")
-            row_number += 1
+        importer = ProductCsvImporter(mode=mode)
+        try:
+            importer.import_rows(read_csv_rows(csv_file))
+        except (UnicodeDecodeError, csv.Error) as e:
+            return Response(
+                {
+                    "error": f"Failed to read CSV file: {str(e)}",
+                    **self.get_result(importer),
+                },
+                status=status.HTTP_400_BAD_REQUEST,
+            )
 
-        return Response(
-            {"created_products": created_products, "errors": errors},
-            status=status.HTTP_200_OK,
-        )
+        return Response(self.get_result(importer), status=status.HTTP_200_OK)
+
+    def get_result(self, importer):
+        result = {
+            "created_products": importer.created_products,
+            "errors": importer.errors,
+        }
+        if importer.mode == ProductCsvImporter.UPSERT:
+            result["updated_products"] = importer.updated_products
+            result["summary"] = importer.summary
+        return result
+
+
+class ProductImportJobStatusView(APIView):
+    """
+    Report the progress of a background CSV import: rows processed,
+    errors so far and an ETA.
+    """
+
+    def get(self, request, job_id):
+        try:
+            job = ProductImportJob.objects.get(pk=job_id)
+        except ProductImportJob.DoesNotExist:
+            return Response(
+                {"error": "Import job not found"}, status=status.HTTP_404_NOT_FOUND
+            )
+        serializer = ProductImportJobSerializer(job)
+        return Response(serializer.data, status=status.HTTP_200_OK)
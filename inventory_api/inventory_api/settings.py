@@ -118,6 +118,75 @@ import dj_database_url
 DATABASES = {"default": dj_database_url.config(default=os.getenv("DATABASE_URL"))}
 # yamabiko.proxy.rlwy.net:21936 #Railway.app postgres instance. test whenever
 
+# Caches
+# Product responses use a local-memory cache by default. Point
+# PRODUCT_CACHE_BACKEND / PRODUCT_CACHE_LOCATION at a shared backend (e.g.
+# django.core.cache.backends.redis.RedisCache) to share it across workers.
+# Invalidation does not depend on the backend: keys embed a database-held
+# catalog version (see inventory.cache).
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    "products": {
+        "BACKEND": os.getenv(
+            "PRODUCT_CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"
+        ),
+        "LOCATION": os.getenv("PRODUCT_CACHE_LOCATION", "products"),
+        "TIMEOUT": int(os.getenv("PRODUCT_CACHE_TIMEOUT", "300")),
+    },
+}
+
+# Serve read-only list endpoints through inventory.fastpath, which encodes
+# values() rows directly. Output is identical to the DRF serializers.
+FAST_READ_SERIALIZERS = os.getenv("FAST_READ_SERIALIZERS", "False") == "True"
+
+# Rows per bulk INSERT (and per transaction) when importing product CSVs.
+CSV_IMPORT_BATCH_SIZE = int(os.getenv("CSV_IMPORT_BATCH_SIZE", "500"))
+
+# How long parts added to an order card stay reserved without the card
+# being touched, before release_expired_reservations hands them back.
+STOCK_RESERVATION_TTL_SECONDS = int(
+    os.getenv("STOCK_RESERVATION_TTL_SECONDS", str(3 * 24 * 3600))
+)
+
+# How far behind now stock snapshots are taken, so the movements of
+# transactions still in flight are settled before a snapshot covers them.
+STOCK_SNAPSHOT_LAG_SECONDS = int(os.getenv("STOCK_SNAPSHOT_LAG_SECONDS", "60"))
+
+# Number each invoice type from its own series instead of one global series.
+INVOICE_NUMBER_SERIES_PER_TYPE = (
+    os.getenv("INVOICE_NUMBER_SERIES_PER_TYPE", "False") == "True"
+)
+
+# Rows per bulk INSERT when ProductCreateView receives a list.
+PRODUCT_BULK_CREATE_BATCH_SIZE = int(os.getenv("PRODUCT_BULK_CREATE_BATCH_SIZE", "500"))
+
+# Rows returned per ?expand= section of a product detail response.
+PRODUCT_EXPAND_LIMIT = int(os.getenv("PRODUCT_EXPAND_LIMIT", "20"))
+
+# Seconds a products/facets/ response is cached. Writes still retire it
+# immediately through the catalog version.
+PRODUCT_FACETS_CACHE_TIMEOUT = int(os.getenv("PRODUCT_FACETS_CACHE_TIMEOUT", "60"))
+
+# Maximum age in seconds of products/reports/valuation/?snapshot=true.
+VALUATION_SNAPSHOT_TIMEOUT = int(os.getenv("VALUATION_SNAPSHOT_TIMEOUT", "900"))
+
+# Delta sync (products/changes/): rows per response, and how far behind now
+# the watermark stays so slow transactions can commit before it passes them.
+PRODUCT_SYNC_PAGE_SIZE = int(os.getenv("PRODUCT_SYNC_PAGE_SIZE", "500"))
+PRODUCT_SYNC_LAG_SECONDS = int(os.getenv("PRODUCT_SYNC_LAG_SECONDS", "2"))
+
+# Rows fetched per server-side cursor round trip when streaming exports.
+EXPORT_CHUNK_SIZE = int(os.getenv("EXPORT_CHUNK_SIZE", "2000"))
+
+# Background imports: uploads wait under MEDIA_ROOT for the
+# process_import_jobs worker, which takes over a running job once its
+# heartbeat is older than IMPORT_JOB_STALE_SECONDS.
+MEDIA_ROOT = os.getenv("MEDIA_ROOT", os.path.join(BASE_DIR, "media"))
+IMPORT_JOB_STALE_SECONDS = int(os.getenv("IMPORT_JOB_STALE_SECONDS", "300"))
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -1,4 +1,5 @@
 from django.contrib import admin
-from .models import Invoice
+from .models import Invoice, InvoiceNumberReservation
 
 admin.site.register(Invoice)
+admin.site.register(InvoiceNumberReservation)
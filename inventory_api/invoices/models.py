@@ -1,4 +1,4 @@
-from django.db import models, transaction
+from django.db import models
 import uuid
 from order.models import OrderCard
 
@@ -25,17 +25,14 @@ class Invoice(models.Model):
         return f"Invoice {self.invoice_number} - {self.invoice_type} for Order {self.order_card.order_number}"
 
     @classmethod
-    def get_next_invoice_number(cls) -> int:
+    def get_next_invoice_number(cls, invoice_type=None) -> int:
         """
-        Fetch the next available invoice number globally across all orders.
-        Uses transaction locking to prevent concurrency issues.
+        Peek at the number the next new reservation in the series would get.
+        Nothing is reserved, so use `get_or_create_invoice_number` to keep it.
         """
-        with transaction.atomic():  # Prevents race conditions
-            last_invoice = (
-                cls.objects.select_for_update().order_by("-invoice_number").first()
-            )
-            next_invoice_number = last_invoice.invoice_number + 1 if last_invoice else 1
-            return next_invoice_number
+        from .numbering import peek_invoice_number
+
+        return peek_invoice_number(invoice_type)
 
     @classmethod
     def get_or_create_invoice_number(
@@ -44,17 +41,40 @@ class Invoice(models.Model):
         """
         Get the invoice number for a specific order and invoice type.
         Ensures that invoices of the same type in the same `OrderCard` share the same number.
+        The number is reserved on first use, so a peek and a later create agree.
         """
-        with transaction.atomic():
-            # Check if this `invoice_type` already has a number assigned for the given order
-            existing_invoice = cls.objects.filter(
-                order_card=order_card, invoice_type=invoice_type
-            ).first()
-
-            if existing_invoice:
-                return (
-                    existing_invoice.invoice_number
-                )  # ✅ Return the existing invoice number
-
-            # Otherwise, get the next global invoice number
-            return cls.get_next_invoice_number()
+        from .numbering import reserve_invoice_number
+
+        return reserve_invoice_number(order_card, invoice_type)
+
+
+class InvoiceNumberReservation(models.Model):
+    """
+    An invoice number handed out to an (order_card, invoice_type) pair.
+    Numbers are only taken together with a reservation, so a reservation
+    with no matching Invoice is the only way a series can have a gap.
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    order_card = models.ForeignKey(
+        OrderCard, related_name="invoice_reservations", on_delete=models.CASCADE
+    )
+    invoice_type = models.CharField(max_length=50)
+    series = models.CharField(max_length=100)
+    invoice_number = models.PositiveIntegerField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order_card", "invoice_type"],
+                name="invoice_reservation_order_type_uniq",
+            ),
+            models.UniqueConstraint(
+                fields=["series", "invoice_number"],
+                name="invoice_reservation_number_uniq",
+            ),
+        ]
+
+    def __str__(self):
+        return f"{self.series} #{self.invoice_number} for {self.invoice_type}"
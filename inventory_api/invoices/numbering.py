@@ -0,0 +1,127 @@
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Max
+
+from order.models import SequenceCounter
+from order.sequences import next_counter_value
+from .models import Invoice, InvoiceNumberReservation
+
+INVOICE_NUMBER_START = 1
+
+
+def invoice_series(invoice_type):
+    """
+    Name of the counter an invoice type draws from: one global series, or
+    one per type with INVOICE_NUMBER_SERIES_PER_TYPE.
+    """
+    if settings.INVOICE_NUMBER_SERIES_PER_TYPE and invoice_type:
+        return f"invoice:{invoice_type}"
+    return "invoice"
+
+
+def highest_invoice_number(series, invoice_type):
+    """
+    Highest number already used in a series, to seed a missing counter.
+    """
+    invoices = Invoice.objects.all()
+    if series != invoice_series(None):
+        invoices = invoices.filter(invoice_type=invoice_type)
+    return max(
+        invoices.aggregate(highest=Max("invoice_number"))["highest"] or 0,
+        InvoiceNumberReservation.objects.filter(series=series).aggregate(
+            highest=Max("invoice_number")
+        )["highest"]
+        or 0,
+    )
+
+
+def take_invoice_numbers(series, invoice_type, count=1):
+    return next_counter_value(
+        series,
+        start=INVOICE_NUMBER_START,
+        seed=partial(highest_invoice_number, series, invoice_type),
+        count=count,
+    )
+
+
+def peek_invoice_number(invoice_type=None):
+    series = invoice_series(invoice_type)
+    value = (
+        SequenceCounter.objects.filter(name=series)
+        .values_list("value", flat=True)
+        .first()
+    )
+    if value is None:
+        value = max(
+            INVOICE_NUMBER_START - 1, highest_invoice_number(series, invoice_type)
+        )
+    return value + 1
+
+
+def assigned_invoice_numbers(order_card_ids, invoice_type):
+    """
+    Numbers already tied to the orders for this type, by order_card id.
+    Invoices created before reservations existed count as well.
+    """
+    numbers = dict(
+        Invoice.objects.filter(
+            order_card_id__in=order_card_ids, invoice_type=invoice_type
+        )
+        .order_by()
+        .values_list("order_card_id", "invoice_number")
+    )
+    numbers.update(
+        InvoiceNumberReservation.objects.filter(
+            order_card_id__in=order_card_ids, invoice_type=invoice_type
+        ).values_list("order_card_id", "invoice_number")
+    )
+    return numbers
+
+
+def reserve_invoice_number(order_card, invoice_type):
+    """
+    Return the order's number for this invoice type, reserving the next
+    one in the series on first use. The counter row is only held for the
+    reservation insert, and a losing concurrent reservation rolls its
+    number back into the series instead of skipping it.
+    """
+    return reserve_invoice_numbers([order_card.pk], invoice_type)[order_card.pk]
+
+
+def reserve_invoice_numbers(order_card_ids, invoice_type, retry=True):
+    """
+    Block variant of `reserve_invoice_number` for bulk invoicing: orders
+    without a number take one consecutive block from a single counter bump.
+    Returns {order_card_id: invoice_number}.
+    """
+    order_card_ids = list(dict.fromkeys(order_card_ids))
+    numbers = assigned_invoice_numbers(order_card_ids, invoice_type)
+    missing = [pk for pk in order_card_ids if pk not in numbers]
+    if not missing:
+        return numbers
+
+    series = invoice_series(invoice_type)
+    try:
+        with transaction.atomic():
+            first = take_invoice_numbers(series, invoice_type, count=len(missing))
+            reservations = InvoiceNumberReservation.objects.bulk_create(
+                InvoiceNumberReservation(
+                    order_card_id=pk,
+                    invoice_type=invoice_type,
+                    series=series,
+                    invoice_number=first + offset,
+                )
+                for offset, pk in enumerate(missing)
+            )
+    except IntegrityError:
+        if not retry:
+            raise
+        # Some of these orders were reserved concurrently; take their numbers
+        return reserve_invoice_numbers(order_card_ids, invoice_type, retry=False)
+    numbers.update(
+        (reservation.order_card_id, reservation.invoice_number)
+        for reservation in reservations
+    )
+    return numbers
@@ -1,3 +1,141 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from unittest import skipUnless
+from django.db import connection, connections, transaction
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIRequestFactory
+from order.models import OrderCard
+from .models import Invoice, InvoiceNumberReservation
+from .numbering import reserve_invoice_number, reserve_invoice_numbers
+from .views import (
+    CreateInvoiceView,
+    GetNextInvoiceNumberView,
+    ReserveInvoiceNumbersView,
+)
 
-# Create your tests here.
+
+def create_order(i):
+    return OrderCard.objects.create(
+        customer_name=f"Customer {i}",
+        customer_address="Pune",
+        customer_phone=f"98{i:08d}",
+    )
+
+
+class InvoiceNumberTestCase(TestCase):
+    def setUp(self):
+        self.order = create_order(1)
+        self.factory = APIRequestFactory()
+
+    def test_peek_and_create_agree(self):
+        request = self.factory.get("/")
+        response = GetNextInvoiceNumberView.as_view()(
+            request, order_id=self.order.id, invoice_type="Quote"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        peeked = response.data["invoice_number"]
+
+        # Another order asking in between does not take the peeked number
+        other = reserve_invoice_number(create_order(2), "Quote")
+        self.assertEqual(other, peeked + 1)
+
+        request = self.factory.post(
+            "/",
+            {
+                "order_card": str(self.order.id),
+                "invoice_type": "Quote",
+                "invoice_url": "https://example.com/quote.pdf",
+            },
+            format="json",
+        )
+        response = CreateInvoiceView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data["invoice_number"], peeked)
+
+    def test_numbers_are_consecutive_per_series(self):
+        self.assertEqual(reserve_invoice_number(self.order, "Quote"), 1)
+        self.assertEqual(reserve_invoice_number(self.order, "Tax Invoice"), 2)
+        self.assertEqual(reserve_invoice_number(self.order, "Quote"), 1)
+        with override_settings(INVOICE_NUMBER_SERIES_PER_TYPE=True):
+            self.assertEqual(reserve_invoice_number(create_order(2), "Quote"), 1)
+            self.assertEqual(reserve_invoice_number(create_order(3), "Quote"), 2)
+        self.assertEqual(Invoice.get_next_invoice_number(), 3)
+
+    def test_counter_continues_after_existing_invoices(self):
+        Invoice.objects.create(
+            order_card=self.order,
+            invoice_type="Quote",
+            invoice_number=41,
+            invoice_url="https://example.com/quote.pdf",
+        )
+        self.assertEqual(reserve_invoice_number(self.order, "Quote"), 41)
+        self.assertEqual(reserve_invoice_number(self.order, "Tax Invoice"), 42)
+
+    def test_rolled_back_reservation_leaves_no_gap(self):
+        with self.assertRaises(RuntimeError):
+            with transaction.atomic():
+                reserve_invoice_number(self.order, "Quote")
+                raise RuntimeError
+        self.assertEqual(reserve_invoice_number(create_order(2), "Quote"), 1)
+
+    def test_block_reservation(self):
+        orders = [create_order(i) for i in range(2, 6)]
+        reserve_invoice_number(orders[1], "Quote")
+        # Assigned numbers, counter UPDATE and SELECT, one INSERT
+        with CaptureQueriesContext(connection) as queries:
+            numbers = reserve_invoice_numbers([order.pk for order in orders], "Quote")
+        statements = [
+            q["sql"]
+            for q in queries
+            if not q["sql"].startswith(("SAVEPOINT", "RELEASE"))
+        ]
+        self.assertEqual(len(statements), 5, statements)
+        self.assertEqual([numbers[order.pk] for order in orders], [2, 1, 3, 4])
+        self.assertEqual(InvoiceNumberReservation.objects.count(), 4)
+
+    def test_reserve_view(self):
+        other = create_order(2)
+        request = self.factory.post(
+            "/",
+            {
+                "order_cards": [str(self.order.id), str(other.id)],
+                "invoice_type": "Quote",
+            },
+            format="json",
+        )
+        response = ReserveInvoiceNumbersView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["invoice_numbers"],
+            {str(self.order.id): 1, str(other.id): 2},
+        )
+
+        request = self.factory.post(
+            "/",
+            {"order_cards": [str(self.order.id), "nope"], "invoice_type": "Quote"},
+            format="json",
+        )
+        response = ReserveInvoiceNumbersView.as_view()(request)
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(response.data["order_cards"], ["nope"])
+
+
+@skipUnless(connection.vendor == "postgresql", "needs row locks")
+class InvoiceNumberConcurrencyTestCase(TransactionTestCase):
+    def test_parallel_reservations(self):
+        orders = [create_order(i) for i in range(40)]
+
+        def reserve(args):
+            try:
+                return reserve_invoice_number(*args)
+            finally:
+                connections.close_all()
+
+        # Every order asks twice, racing itself as well as the others
+        calls = [(order, "Tax Invoice") for order in orders] * 2
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            numbers = list(pool.map(reserve, calls))
+
+        self.assertEqual(numbers[:40], numbers[40:])
+        self.assertEqual(sorted(numbers[:40]), list(range(1, 41)))
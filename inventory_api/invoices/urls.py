@@ -4,6 +4,7 @@ from .views import (
     CreateInvoiceView,
     InvoiceListView,
     InvoiceDetailView,
+    ReserveInvoiceNumbersView,
 )
 
 urlpatterns = [
@@ -14,6 +15,11 @@ urlpatterns = [
     ),
     path("invoices/<uuid:order_id>/", InvoiceListView.as_view(), name="invoice-list"),
     path("invoices/create/", CreateInvoiceView.as_view(), name="create-invoice"),
+    path(
+        "invoices/reserve/",
+        ReserveInvoiceNumbersView.as_view(),
+        name="reserve-invoice-numbers",
+    ),
     path(
         "invoices/<uuid:invoice_id>/",
         InvoiceDetailView.as_view(),
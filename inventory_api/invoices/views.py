@@ -4,8 +4,10 @@ from rest_framework import status
 from django.shortcuts import get_object_or_404
 from order.models import OrderCard
 from .models import Invoice
+from .numbering import reserve_invoice_numbers
 from .serializers import InvoiceSerializer
 from django.db import transaction
+import uuid
 
 
 class GetNextInvoiceNumberView(APIView):
@@ -72,6 +74,55 @@ class CreateInvoiceView(APIView):
             )
 
 
+class ReserveInvoiceNumbersView(APIView):
+    """
+    Reserve invoice numbers for a batch of orders in one block, for bulk
+    invoicing. Orders that already have a number for the type keep it.
+    """
+
+    def post(self, request):
+        order_card_ids = request.data.get("order_cards")
+        invoice_type = request.data.get("invoice_type")
+
+        if not isinstance(order_card_ids, list) or not order_card_ids:
+            return Response(
+                {"error": "order_cards must be a non-empty list"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if not invoice_type:
+            return Response(
+                {"error": "Missing required fields"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        order_cards = {}
+        for order_card_id in order_card_ids:
+            try:
+                order_cards[str(order_card_id)] = uuid.UUID(str(order_card_id))
+            except ValueError:
+                order_cards[str(order_card_id)] = None
+        found = OrderCard.objects.filter(
+            id__in=[pk for pk in order_cards.values() if pk is not None]
+        ).values_list("id", flat=True)
+        missing = [key for key, pk in order_cards.items() if pk not in set(found)]
+        if missing:
+            return Response(
+                {"error": "Orders not found", "order_cards": missing},
+                status=status.HTTP_404_NOT_FOUND,
+            )
+
+        numbers = reserve_invoice_numbers(order_cards.values(), invoice_type)
+        return Response(
+            {
+                "invoice_type": invoice_type,
+                "invoice_numbers": {
+                    key: numbers[pk] for key, pk in order_cards.items()
+                },
+            },
+            status=status.HTTP_200_OK,
+        )
+
+
 class InvoiceListView(APIView):
     """
     Fetch all invoices.
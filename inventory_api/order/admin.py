@@ -1,6 +1,7 @@
 from django.contrib import admin
-from .models import OrderPart, OrderCard
+from .models import OrderPart, OrderCard, StockReservation
 
 admin.site.register(OrderCard)
 admin.site.register(OrderPart)
+admin.site.register(StockReservation)
 # Register your models here.
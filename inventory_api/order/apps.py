@@ -1,6 +1,12 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_migrate
 
 
 class OrderConfig(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
     name = "order"
+
+    def ready(self):
+        from .sequences import create_order_number_sequence
+
+        post_migrate.connect(create_order_number_sequence, sender=self)
@@ -0,0 +1,49 @@
+import django_filters
+from datetime import datetime, time, timedelta
+from django.utils.timezone import make_aware
+from .models import OrderCard
+
+
+class OrderCardFilter(django_filters.FilterSet):
+    """
+    Filter class for OrderCard model to handle:
+    - Exact match on status, progress status and customer phone
+    - Team lead / sales executive
+    - Date range filtering
+    - Exact date filtering
+
+    Every filter here is backed by an index on OrderCard (see `OrderCard.Meta`).
+    """
+
+    status = django_filters.CharFilter(field_name="status")
+    progress_status = django_filters.NumberFilter(field_name="progress_status")
+    team_lead = django_filters.UUIDFilter(field_name="team_lead")
+    sales_executive = django_filters.UUIDFilter(field_name="sales_executive")
+    customer_phone = django_filters.CharFilter(field_name="customer_phone")
+    created_on = django_filters.DateFilter(method="filter_created_on")  # Exact date
+    created_after = django_filters.DateFilter(
+        field_name="created_at", lookup_expr="gte"
+    )  # Date range (after)
+    created_before = django_filters.DateFilter(
+        field_name="created_at", lookup_expr="lte"
+    )  # Date range (before)
+
+    class Meta:
+        model = OrderCard
+        fields = [
+            "status",
+            "progress_status",
+            "team_lead",
+            "sales_executive",
+            "customer_phone",
+            "created_on",
+            "created_after",
+            "created_before",
+        ]
+
+    def filter_created_on(self, queryset, name, value):
+        # A half-open range on created_at so the created_at index can serve it
+        start = make_aware(datetime.combine(value, time.min))
+        return queryset.filter(
+            created_at__gte=start, created_at__lt=start + timedelta(days=1)
+        )
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from order.stock import backfill_stock_deducted
+
+
+class Command(BaseCommand):
+    help = (
+        "Mark orders finalized before stock_deducted_at existed as deducted, "
+        "so finalizing them again does not take their stock twice"
+    )
+
+    def handle(self, *args, **options):
+        marked = backfill_stock_deducted()
+        self.stdout.write(f"Marked {marked} orders as deducted")
@@ -0,0 +1,36 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from order.stock import release_expired_reservations, resync_reserved_quantities
+
+
+class Command(BaseCommand):
+    help = "Release stock reserved by order cards that were not touched in time"
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--forever",
+            action="store_true",
+            help="Keep sweeping every --sleep seconds instead of exiting",
+        )
+        parser.add_argument("--sleep", type=float, default=60.0)
+        parser.add_argument("--batch-size", type=int, default=500)
+        parser.add_argument(
+            "--resync",
+            action="store_true",
+            help="Also recompute every product's reserved quantity from the reservations",
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            released = release_expired_reservations(options["batch_size"])
+            if released:
+                self.stdout.write(f"Released {released} expired reservations")
+            if options["resync"]:
+                fixed = resync_reserved_quantities()
+                if fixed:
+                    self.stdout.write(f"Resynced reserved quantity of {fixed} products")
+            if not options["forever"]:
+                return
+            time.sleep(options["sleep"])
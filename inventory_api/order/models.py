@@ -1,4 +1,4 @@
-from django.db import models, transaction
+from django.db import models
 import pyotp
 import uuid
 from django.utils.timezone import now
@@ -63,23 +63,39 @@ class OrderCard(models.Model):
         related_name="orders_as_sales_executive",
     )
 
+    # Set when finalization deducts stock, so a repeated finalize is a no-op
+    stock_deducted_at = models.DateTimeField(blank=True, null=True)
+
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        # Chosen from OrderCardFilter lookups; each ends in created_at so a
+        # filtered page is read in list order straight from the index.
+        indexes = [
+            models.Index(fields=["created_at", "id"], name="order_created_idx"),
+            models.Index(fields=["status", "created_at"], name="order_status_idx"),
+            models.Index(
+                fields=["progress_status", "created_at"], name="order_progress_idx"
+            ),
+            models.Index(
+                fields=["team_lead", "created_at"], name="order_team_lead_idx"
+            ),
+            models.Index(
+                fields=["sales_executive", "created_at"],
+                name="order_sales_exec_idx",
+            ),
+            models.Index(
+                fields=["customer_phone", "created_at"], name="order_phone_idx"
+            ),
+        ]
+
     def save(self, *args, **kwargs):
         # If this is a new order, assign the next available order number
         if not self.order_number:
-            with transaction.atomic():  # Ensure atomicity
-                # Lock the table to prevent race conditions
-                last_order = (
-                    OrderCard.objects.select_for_update()
-                    .order_by("-order_number")
-                    .first()
-                )
-                if last_order:
-                    self.order_number = last_order.order_number + 1
-                else:
-                    self.order_number = 100  # Start at 1 if no orders exist
+            from .sequences import next_order_number
+
+            self.order_number = next_order_number()
 
         super().save(*args, **kwargs)  # Call the base save method
 
@@ -144,3 +160,59 @@ class OrderPart(models.Model):
     quantity = models.PositiveIntegerField(default=1)
 
     created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        indexes = [
+            # Recent use of a product (ProductDetailView ?expand=order_usage)
+            models.Index(
+                fields=["product", "created_at"], name="order_part_product_idx"
+            ),
+        ]
+
+
+class StockReservation(models.Model):
+    """
+    Stock held for an open order card, mirrored in
+    `Product.reserved_quantity`. Finalizing turns it into a deduction; an
+    abandoned card's reservations are released once `expires_at` passes
+    (see `release_expired_reservations`).
+    """
+
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    order = models.ForeignKey(
+        OrderCard, related_name="stock_reservations", on_delete=models.CASCADE
+    )
+    product = models.ForeignKey(
+        Product, related_name="reservations", on_delete=models.CASCADE
+    )
+    quantity = models.PositiveIntegerField()
+    expires_at = models.DateTimeField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["order", "product"], name="reservation_order_product_uniq"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["expires_at"], name="reservation_expiry_idx"),
+        ]
+
+    def __str__(self):
+        return f"{self.quantity} x {self.product_id} for order {self.order_id}"
+
+
+class SequenceCounter(models.Model):
+    """
+    A named number series kept in one row, for backends without sequences
+    and for series that must not skip numbers (see `order.sequences`).
+    """
+
+    ORDER_NUMBER = "order_number"
+
+    name = models.CharField(max_length=100, primary_key=True)
+    value = models.PositiveBigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name} at {self.value}"
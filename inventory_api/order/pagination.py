@@ -0,0 +1,12 @@
+from inventory.pagination import KeysetPagination
+
+
+class OrderCardPagination(KeysetPagination):
+    """
+    Keyset pagination over OrderCard, newest first, limited to orderings
+    with a supporting index.
+    """
+
+    page_size = 20
+    max_page_size = 100
+    ordering_fields = ["created_at", "order_number"]
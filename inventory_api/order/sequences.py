@@ -0,0 +1,93 @@
+from django.db import IntegrityError, connections, router, transaction
+from django.db.models import F, Max
+
+from .models import OrderCard, SequenceCounter
+
+ORDER_NUMBER_START = 100
+ORDER_NUMBER_SEQUENCE = "order_number_seq"
+
+
+def next_order_number():
+    """
+    Allocate an order number without reading or locking OrderCard.
+
+    Postgres takes it from `order_number_seq`, which never blocks but may
+    leave gaps behind rolled back saves. Other backends bump a counter row.
+    """
+    using = router.db_for_write(OrderCard)
+    connection = connections[using]
+    if connection.vendor == "postgresql":
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT nextval(%s)", [ORDER_NUMBER_SEQUENCE])
+            return cursor.fetchone()[0]
+    return next_counter_value(
+        SequenceCounter.ORDER_NUMBER,
+        start=ORDER_NUMBER_START,
+        seed=highest_order_number,
+        using=using,
+    )
+
+
+def highest_order_number():
+    return OrderCard.objects.aggregate(highest=Max("order_number"))["highest"] or 0
+
+
+def next_counter_value(name, start=1, seed=None, count=1, using="default"):
+    """
+    Take the next `count` values of the named counter and return the first.
+
+    The counter row stays locked until the surrounding transaction ends, so
+    a rollback hands the numbers back. A missing row is created on first
+    use, continuing after `seed()` (the highest number already in use).
+    """
+    with transaction.atomic(using=using):
+        if not bump_counter(name, count, using):
+            initial = max(start - 1, seed() if seed else 0)
+            try:
+                with transaction.atomic(using=using):
+                    SequenceCounter.objects.using(using).create(
+                        name=name, value=initial
+                    )
+            except IntegrityError:  # Created concurrently, bump that row instead
+                pass
+            bump_counter(name, count, using)
+        value = (
+            SequenceCounter.objects.using(using)
+            .values_list("value", flat=True)
+            .get(name=name)
+        )
+    return value - count + 1
+
+
+def bump_counter(name, count, using):
+    return (
+        SequenceCounter.objects.using(using)
+        .filter(name=name)
+        .update(value=F("value") + count)
+    )
+
+
+def create_order_number_sequence(sender, using="default", **kwargs):
+    """
+    post_migrate hook creating `order_number_seq` on Postgres, and moving
+    it past any order number already taken.
+    """
+    connection = connections[using]
+    if connection.vendor != "postgresql":
+        return
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"CREATE SEQUENCE IF NOT EXISTS {ORDER_NUMBER_SEQUENCE} "
+            f"START WITH {ORDER_NUMBER_START}"
+        )
+        # Only ever moves forward, so live allocations are never reissued
+        cursor.execute(
+            f"""
+            SELECT setval(%s, highest)
+            FROM (SELECT MAX(order_number) AS highest FROM {OrderCard._meta.db_table}) taken,
+                 {ORDER_NUMBER_SEQUENCE} seq
+            WHERE highest >= CASE WHEN seq.is_called
+                                  THEN seq.last_value + 1 ELSE seq.last_value END
+            """,
+            [ORDER_NUMBER_SEQUENCE],
+        )
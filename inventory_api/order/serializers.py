@@ -1,9 +1,9 @@
 from rest_framework import serializers
 from .models import OrderCard, OrderPart
-from inventory.serializers import ProductListSerializer
+from inventory.serializers import ProductListSerializer, SparseFieldsetMixin
 
 
-class OrderPartSerializer(serializers.ModelSerializer):
+class OrderPartSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     product = ProductListSerializer(read_only=True)
 
     class Meta:
@@ -18,6 +18,26 @@ class OrderPartSerializer(serializers.ModelSerializer):
         ]
 
 
+class OrderPartUsageSerializer(serializers.ModelSerializer):
+    """Serializer for a product's appearance on an order."""
+
+    order_number = serializers.IntegerField(source="order.order_number")
+    order_status = serializers.CharField(source="order.status")
+    customer_name = serializers.CharField(source="order.customer_name")
+
+    class Meta:
+        model = OrderPart
+        fields = [
+            "id",
+            "order",
+            "order_number",
+            "order_status",
+            "customer_name",
+            "quantity",
+            "created_at",
+        ]
+
+
 class OrderCardCreateSerializer(serializers.ModelSerializer):
     class Meta:
         model = OrderCard
@@ -41,7 +61,7 @@ class OrderCardCreateSerializer(serializers.ModelSerializer):
         ]
 
 
-class OrderCardDetailSerializer(serializers.ModelSerializer):
+class OrderCardDetailSerializer(SparseFieldsetMixin, serializers.ModelSerializer):
     order_parts = OrderPartSerializer(many=True)
 
     class Meta:
@@ -0,0 +1,263 @@
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import (
+    Case,
+    Exists,
+    F,
+    IntegerField,
+    OuterRef,
+    Q,
+    Subquery,
+    Sum,
+    When,
+)
+from django.db.models.functions import Coalesce, Greatest
+from django.utils.timezone import now
+
+from inventory.cache import bump_catalog_version
+from inventory.ledger import record_movements
+from inventory.models import Product, StockMovement
+from .models import OrderCard, StockReservation
+
+# Locks are always taken in this order: order card, its reservations, then
+# products by pk. Anything that follows it cannot deadlock with the others.
+
+
+class StockConflict(Exception):
+    """
+    A locked product changed under us; nothing was written.
+    """
+
+
+class InsufficientStock(StockConflict):
+    def __init__(self, product):
+        super().__init__(f"Not enough stock for {product.name}")
+        self.product = product
+
+
+def lock_products(pks):
+    """
+    Lock products in pk order, keyed by pk.
+    """
+    products = (
+        Product.objects.select_for_update()
+        .filter(pk__in=pks)
+        .only("id", "name", "quantity", "reserved_quantity")
+        .order_by("pk")
+    )
+    return {product.pk: product for product in products}
+
+
+def get_locked(products, pk):
+    try:
+        return products[pk]
+    except KeyError:
+        raise Product.DoesNotExist(f"Product with ID {pk} not found") from None
+
+
+def apply_stock_changes(changes):
+    """
+    Apply {product pk: (quantity delta, reserved delta)} in one UPDATE.
+
+    A change that takes more than the product's unreserved stock matches
+    no row, so the caller sees fewer rows updated than it asked for and
+    must roll back. Releases always apply.
+    """
+    if not changes:
+        return
+    allowed = Q()
+    quantity_cases, reserved_cases = [], []
+    for pk, (quantity, reserved) in changes.items():
+        match = Q(pk=pk)
+        if reserved - quantity > 0:
+            match &= Q(quantity__gte=F("reserved_quantity") + reserved - quantity)
+        if quantity < 0:
+            match &= Q(quantity__gte=-quantity)
+        allowed |= match
+        if quantity:
+            quantity_cases.append(When(pk=pk, then=F("quantity") + quantity))
+        if reserved:
+            reserved_cases.append(
+                When(
+                    pk=pk,
+                    then=Greatest(
+                        F("reserved_quantity") + reserved,
+                        0,
+                        output_field=IntegerField(),
+                    ),
+                )
+            )
+
+    fields = {"updated_at": now()}  # update() skips auto_now
+    if quantity_cases:
+        fields["quantity"] = Case(
+            *quantity_cases, default=F("quantity"), output_field=IntegerField()
+        )
+    if reserved_cases:
+        fields["reserved_quantity"] = Case(
+            *reserved_cases,
+            default=F("reserved_quantity"),
+            output_field=IntegerField(),
+        )
+    if Product.objects.filter(allowed).update(**fields) != len(changes):
+        raise StockConflict("Stock changed during the update, please retry.")
+
+
+def reservation_expiry():
+    return now() + timedelta(seconds=settings.STOCK_RESERVATION_TTL_SECONDS)
+
+
+def reserve_order_stock(order, wanted):
+    """
+    Make the order's reservations match {product pk: quantity}, holding
+    only the difference from what it already has, and restart their TTL.
+    The order row must already be locked.
+    """
+    current = {
+        reservation.product_id: reservation.quantity
+        for reservation in StockReservation.objects.select_for_update().filter(
+            order=order
+        )
+    }
+    changes = {}
+    for pk in wanted.keys() | current.keys():
+        delta = wanted.get(pk, 0) - current.get(pk, 0)
+        if delta:
+            changes[pk] = (0, delta)
+
+    products = lock_products(changes)
+    for pk, (_, delta) in changes.items():
+        product = get_locked(products, pk)
+        if delta > product.quantity - product.reserved_quantity:
+            raise InsufficientStock(product)
+    apply_stock_changes(changes)
+
+    if current:
+        StockReservation.objects.filter(order=order).delete()
+    expires_at = reservation_expiry()
+    StockReservation.objects.bulk_create(
+        StockReservation(
+            order=order, product_id=pk, quantity=quantity, expires_at=expires_at
+        )
+        for pk, quantity in wanted.items()
+        if quantity
+    )
+
+
+def deduct_order_stock(order, wanted):
+    """
+    Take {product pk: quantity} out of stock for the order, consuming its
+    reservations. Stock reserved by other orders is not touched. The order
+    row must already be locked.
+    """
+    reservations = list(
+        StockReservation.objects.select_for_update().filter(order=order)
+    )
+    held = {}
+    for reservation in reservations:
+        held[reservation.product_id] = reservation.quantity
+
+    products = lock_products(wanted.keys() | held.keys())
+    changes = {}
+    for pk in wanted.keys() | held.keys():
+        quantity, own = wanted.get(pk, 0), held.get(pk, 0)
+        product = get_locked(products, pk)
+        if quantity - own > product.quantity - product.reserved_quantity:
+            raise InsufficientStock(product)
+        changes[pk] = (-quantity, -own)
+    apply_stock_changes(changes)
+    record_movements(
+        {pk: delta for pk, (delta, _) in changes.items()},
+        StockMovement.ORDER,
+        reference=str(order.pk),
+        before={pk: product.quantity for pk, product in products.items()},
+    )
+
+    if reservations:
+        StockReservation.objects.filter(order=order).delete()
+
+
+def release_reservations(reservations):
+    """
+    Hand locked reservations' stock back and delete them.
+    """
+    changes = {}
+    for reservation in reservations:
+        _, reserved = changes.get(reservation.product_id, (0, 0))
+        changes[reservation.product_id] = (0, reserved - reservation.quantity)
+    lock_products(changes)
+    apply_stock_changes(changes)
+    StockReservation.objects.filter(
+        pk__in=[reservation.pk for reservation in reservations]
+    ).delete()
+
+
+def release_order_reservations(order):
+    """
+    Release everything the order holds; the order row must be locked.
+    """
+    reservations = list(
+        StockReservation.objects.select_for_update().filter(order=order)
+    )
+    if reservations:
+        release_reservations(reservations)
+
+
+def release_expired_reservations(batch_size=500):
+    """
+    Release reservations past their expiry, a batch per transaction.
+    Reservations locked by an order being edited or finalized are skipped.
+    Returns the number released.
+    """
+    released = 0
+    while True:
+        with transaction.atomic():
+            batch = list(
+                StockReservation.objects.select_for_update(skip_locked=True)
+                .filter(expires_at__lte=now())
+                .order_by("expires_at")[:batch_size]
+            )
+            if batch:
+                release_reservations(batch)
+        if not batch:
+            return released
+        released += len(batch)
+        bump_catalog_version()
+
+
+def resync_reserved_quantities():
+    """
+    Recompute every `Product.reserved_quantity` from the reservations, in
+    one UPDATE. Repairs drift from writes that bypassed this module.
+    """
+    held = (
+        StockReservation.objects.filter(product=OuterRef("pk"))
+        .values("product")
+        .annotate(total=Sum("quantity"))
+        .values("total")
+    )
+    updated = (
+        Product.objects.annotate(held=Coalesce(Subquery(held), 0))
+        .exclude(reserved_quantity=F("held"))
+        .update(reserved_quantity=Coalesce(Subquery(held), 0), updated_at=now())
+    )
+    if updated:
+        bump_catalog_version()
+    return updated
+
+
+def backfill_stock_deducted(statuses=("Finalized", "Completed")):
+    """
+    Mark orders finalized before `stock_deducted_at` existed as deducted,
+    dated at their last update. Run once when deploying it: the status is
+    client-writable, so it is only trusted for orders holding no
+    reservations. Returns the number of orders marked.
+    """
+    reserved = StockReservation.objects.filter(order=OuterRef("pk"))
+    return (
+        OrderCard.objects.filter(status__in=statuses, stock_deducted_at__isnull=True)
+        .exclude(Exists(reserved))
+        .update(stock_deducted_at=F("updated_at"))
+    )
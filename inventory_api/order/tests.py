@@ -1,3 +1,564 @@
-from django.test import TestCase
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import StringIO
+from unittest import skipUnless
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework import status
+from rest_framework.test import APIClient, APITestCase
+from inventory.models import Product, StockMovement
+from inventory.testing import IndexPlanTestCase
+from staff.models import Staff
+from .models import OrderCard, OrderPart, SequenceCounter, StockReservation
+from .sequences import create_order_number_sequence, next_counter_value
 
-# Create your tests here.
+
+class OrderAPITestCase(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Oil Filter", sku="OF-1", price=120, quantity=10
+        )
+        self.order = OrderCard.objects.create(
+            customer_name="Ravi",
+            customer_address="Pune",
+            customer_phone="9800000000",
+        )
+        OrderPart.objects.create(
+            order=self.order,
+            product=self.product,
+            part_id=str(self.product.id),
+            quantity=2,
+        )
+
+    def test_sparse_fieldset(self):
+        """Test narrowing orders and their nested parts with fields="""
+        response = self.client.get(
+            "/api/orders/",
+            {"fields": "order_number,order_parts.quantity,order_parts.product.sku"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(
+            response.data["results"],
+            [
+                {
+                    "order_number": self.order.order_number,
+                    "order_parts": [{"quantity": 2, "product": {"sku": "OF-1"}}],
+                }
+            ],
+        )
+
+    def test_sparse_fieldset_exclude(self):
+        """Test dropping nested product fields with exclude="""
+        response = self.client.get(
+            f"/api/orders/{self.order.id}/",
+            {"exclude": "order_parts.product.description,otp_generated_at"},
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotIn("otp_generated_at", response.data)
+        product = response.data["order_parts"][0]["product"]
+        self.assertNotIn("description", product)
+        self.assertIn("sku", product)
+
+    def test_fast_read_parity(self):
+        """Test the fast read path renders the same orders payload"""
+        OrderCard.objects.create(
+            customer_name="Asha", customer_address="Goa", customer_phone="9811111111"
+        )
+        with override_settings(FAST_READ_SERIALIZERS=False):
+            expected = self.client.get("/api/orders/")
+        with override_settings(FAST_READ_SERIALIZERS=True):
+            with self.assertNumQueries(3):  # Orders, parts, products
+                actual = self.client.get("/api/orders/")
+        self.assertEqual(actual.content, expected.content)
+
+    def test_list_query_count_is_fixed(self):
+        """Test that a page costs the same queries whatever its size"""
+        for i in range(6):
+            order = OrderCard.objects.create(
+                customer_name=f"Customer {i}",
+                customer_address="Pune",
+                customer_phone="9800000000",
+            )
+            for _ in range(2):
+                OrderPart.objects.create(
+                    order=order, product=self.product, part_id=str(self.product.id)
+                )
+        for page_size in (1, 3, 7):
+            with self.assertNumQueries(2):  # Orders, parts joined to products
+                response = self.client.get(f"/api/orders/?page_size={page_size}")
+            self.assertEqual(len(response.data["results"]), page_size)
+
+        seen = []
+        url = "/api/orders/?page_size=3"
+        while url:
+            response = self.client.get(url)
+            seen.extend(order["id"] for order in response.data["results"])
+            url = response.data["next"]
+        self.assertEqual(len(set(seen)), 7)
+
+    def test_list_filters(self):
+        lead = Staff.objects.create(name="Lead")
+        OrderCard.objects.create(
+            customer_name="Asha",
+            customer_address="Goa",
+            customer_phone="9811111111",
+            status="Finalized",
+            progress_status=3,
+            team_lead=lead,
+        )
+        for params, expected in (
+            ({"status": "Finalized"}, ["Asha"]),
+            ({"progress_status": 1}, ["Ravi"]),
+            ({"team_lead": str(lead.id)}, ["Asha"]),
+            ({"customer_phone": "9800000000"}, ["Ravi"]),
+            (
+                {"created_on": self.order.created_at.date().isoformat()},
+                ["Asha", "Ravi"],
+            ),
+        ):
+            response = self.client.get("/api/orders/", params)
+            names = [order["customer_name"] for order in response.data["results"]]
+            self.assertEqual(names, expected, params)
+        response = self.client.get("/api/orders/?team_lead=nope")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_add_parts_is_set_based(self):
+        """Test that a job card costs the same few queries however long it is"""
+        products = [
+            Product.objects.create(name=f"Part {i}", sku=f"P-{i}", price=10, quantity=5)
+            for i in range(40)
+        ]
+        parts = [{"part_id": str(self.product.id), "quantity": 5}] + [
+            {"part_id": str(product.id), "quantity": 1} for product in products
+        ]
+        url = f"/api/orders/{self.order.id}/add-parts/"
+        # Order, products, existing parts, INSERT, UPDATE, then reservations,
+        # product locks, one stock UPDATE and the reservation INSERT
+        # (+ savepoints and the catalog version bump)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(url, {"parts": parts}, format="json")
+        statements = [
+            q["sql"]
+            for q in queries
+            if not q["sql"].startswith(("SAVEPOINT", "RELEASE"))
+            and "inventory_catalogversion" not in q["sql"]
+        ]
+        self.assertEqual(len(statements), 9, statements)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data["added_or_updated_parts"]), 41)
+        self.assertEqual(response.data["added_or_updated_parts"][0]["quantity"], 5)
+        self.assertEqual(self.order.order_parts.count(), 41)
+
+        # Resubmitting a shorter list updates and removes in place
+        parts = [{"part_id": str(products[0].id), "quantity": 3}]
+        response = self.client.post(url, {"parts": parts}, format="json")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertEqual(
+            list(self.order.order_parts.values_list("part_id", "quantity")),
+            [(str(products[0].id), 3)],
+        )
+
+    def test_add_parts_unknown_product_changes_nothing(self):
+        parts = [
+            {"part_id": str(self.product.id), "quantity": 9},
+            {"part_id": "00000000-0000-0000-0000-000000000000"},
+        ]
+        response = self.client.post(
+            f"/api/orders/{self.order.id}/add-parts/", {"parts": parts}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(self.order.order_parts.get().quantity, 2)
+
+    def test_finalize_deducts_stock_once(self):
+        url = f"/api/orders/{self.order.id}/finalize/"
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 8)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "Finalized")
+        self.assertIsNotNone(self.order.stock_deducted_at)
+
+        # Finalizing again leaves stock alone
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data["message"], "Order already finalized.")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 8)
+
+    def test_backfilled_legacy_order_is_not_deducted_again(self):
+        """Test that orders finalized before stock_deducted_at are marked once"""
+        OrderCard.objects.filter(pk=self.order.pk).update(status="Completed")
+        out = StringIO()
+        call_command("backfill_stock_deducted", stdout=out)
+        self.assertIn("Marked 1 orders as deducted", out.getvalue())
+
+        response = self.client.post(f"/api/orders/{self.order.id}/finalize/")
+        self.assertEqual(response.data["message"], "Order already finalized.")
+        response = self.client.post(
+            f"/api/orders/{self.order.id}/add-parts/",
+            {"parts": [{"part_id": str(self.product.id), "quantity": 3}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (self.product.quantity, self.product.reserved_quantity), (10, 0)
+        )
+
+    def test_status_written_by_client_does_not_skip_deduction(self):
+        response = self.client.post(
+            f"/api/orders/{self.order.id}/add-parts/",
+            {"parts": [{"part_id": str(self.product.id), "quantity": 4}]},
+            format="json",
+        )
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.client.put(
+            f"/api/orders/{self.order.id}/update/",
+            {"status": "Completed"},
+            format="json",
+        )
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "Completed")
+        # Holding a reservation, so the backfill leaves it alone
+        call_command("backfill_stock_deducted", stdout=StringIO())
+
+        response = self.client.post(f"/api/orders/{self.order.id}/finalize/")
+        self.assertEqual(
+            response.data["message"], "Order finalized and inventory updated."
+        )
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (self.product.quantity, self.product.reserved_quantity), (6, 0)
+        )
+
+    def test_finalize_short_stock_changes_nothing(self):
+        scarce = Product.objects.create(
+            name="Brake Pad", sku="BP-1", price=50, quantity=1
+        )
+        OrderPart.objects.create(
+            order=self.order, product=scarce, part_id=str(scarce.id), quantity=2
+        )
+        response = self.client.post(f"/api/orders/{self.order.id}/finalize/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["error"], "Not enough stock for Brake Pad")
+        self.product.refresh_from_db()
+        self.assertEqual(self.product.quantity, 10)
+        self.order.refresh_from_db()
+        self.assertEqual(self.order.status, "Pending")
+        self.assertIsNone(self.order.stock_deducted_at)
+
+    def test_finalize_locks_in_pk_order(self):
+        products = [
+            Product.objects.create(name=f"Part {i}", sku=f"P-{i}", price=10, quantity=5)
+            for i in range(5)
+        ]
+        for product in products:
+            OrderPart.objects.create(
+                order=self.order, product=product, part_id=str(product.id), quantity=1
+            )
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.post(f"/api/orders/{self.order.id}/finalize/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        updates = [
+            q["sql"]
+            for q in queries
+            if q["sql"].startswith('UPDATE "inventory_product"')
+        ]
+        # One stock UPDATE for all six products
+        self.assertEqual(len(updates), 1, updates)
+        if connection.features.has_select_for_update:
+            locks = [q["sql"] for q in queries if "FOR UPDATE" in q["sql"]]
+            # Order, its reservations, then products in pk order
+            self.assertEqual(len(locks), 3, locks)
+            self.assertIn("ORDER BY", locks[2])
+        self.assertEqual(
+            sorted(Product.objects.values_list("quantity", flat=True)), [4] * 5 + [8]
+        )
+
+
+class StockReservationTestCase(APITestCase):
+    def setUp(self):
+        self.product = Product.objects.create(
+            name="Oil Filter", sku="OF-1", price=120, quantity=10
+        )
+        self.order = create_order(1)
+        self.other = create_order(2)
+
+    def add_parts(self, order, quantity):
+        return self.client.post(
+            f"/api/orders/{order.id}/add-parts/",
+            {"parts": [{"part_id": str(self.product.id), "quantity": quantity}]},
+            format="json",
+        )
+
+    def assertStock(self, quantity, reserved):
+        self.product.refresh_from_db()
+        self.assertEqual(
+            (self.product.quantity, self.product.reserved_quantity),
+            (quantity, reserved),
+        )
+
+    def test_add_parts_reserves_the_difference(self):
+        self.assertEqual(self.add_parts(self.order, 6).status_code, 201)
+        self.assertStock(10, 6)
+        self.assertEqual(self.add_parts(self.order, 4).status_code, 204)
+        self.assertStock(10, 4)
+        self.assertEqual(self.order.stock_reservations.get().quantity, 4)
+
+        response = self.client.post(
+            f"/api/orders/{self.order.id}/add-parts/", {"parts": []}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertStock(10, 0)
+        self.assertFalse(StockReservation.objects.exists())
+
+    def test_reserved_stock_is_not_available_to_others(self):
+        self.add_parts(self.order, 8)
+        response = self.add_parts(self.other, 3)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(response.data["error"], "Not enough stock for Oil Filter")
+        self.assertFalse(self.other.order_parts.exists())
+        self.assertStock(10, 8)
+
+        # Nor can the other order finalize around the reservation
+        OrderPart.objects.create(
+            order=self.other,
+            product=self.product,
+            part_id=str(self.product.id),
+            quantity=3,
+        )
+        response = self.client.post(f"/api/orders/{self.other.id}/finalize/")
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertStock(10, 8)
+
+    def test_finalize_consumes_reservation(self):
+        self.add_parts(self.order, 8)
+        self.add_parts(self.other, 2)
+        response = self.client.post(f"/api/orders/{self.order.id}/finalize/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertStock(2, 2)
+        self.assertFalse(self.order.stock_reservations.exists())
+        self.assertEqual(
+            list(
+                StockMovement.objects.filter(product_id=self.product.pk)
+                .order_by("created_at")
+                .values_list("reason", "delta", "reference")
+            ),
+            [
+                # The product predates the ledger, so it opens with its stock
+                (StockMovement.OPENING, 10, None),
+                (StockMovement.ORDER, -8, str(self.order.pk)),
+            ],
+        )
+
+        # Parts edited after finalizing hold nothing; stock is already gone
+        self.assertEqual(self.add_parts(self.order, 1).status_code, 204)
+        self.assertStock(2, 2)
+
+    def test_quantity_cannot_drop_below_reserved(self):
+        """Test that every quantity write keeps reserved stock finalizable"""
+        self.add_parts(self.order, 6)
+        response = self.client.patch(
+            f"/api/products/{self.product.id}/update/", {"quantity": 5}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertIn("quantity", response.data)
+
+        response = self.client.post(
+            "/api/products/bulk/",
+            [{"id": str(self.product.id), "changes": {"quantity": 5}}],
+            format="json",
+        )
+        self.assertEqual(response.data["results"][0]["status"], "invalid")
+
+        csv_file = SimpleUploadedFile(
+            "products.csv", b"name,sku,price,quantity\nOil Filter,OF-1,120,5\n"
+        )
+        response = self.client.post(
+            "/api/products/upload-products-csv/",
+            {"file": csv_file, "mode": "upsert"},
+            format="multipart",
+        )
+        self.assertEqual(response.data["summary"]["errors"], 1)
+        self.assertStock(10, 6)
+
+        # Down to exactly the reserved amount is fine, and still finalizes
+        response = self.client.patch(
+            f"/api/products/{self.product.id}/update/", {"quantity": 6}, format="json"
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        response = self.client.post(f"/api/orders/{self.order.id}/finalize/")
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertStock(0, 0)
+
+    def test_delete_order_releases_reservation(self):
+        self.add_parts(self.order, 5)
+        response = self.client.delete(f"/api/orders/{self.order.id}/delete/")
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertStock(10, 0)
+
+    def test_sweeper_releases_expired_reservations(self):
+        self.add_parts(self.order, 5)
+        self.add_parts(self.other, 3)
+        self.order.stock_reservations.update(expires_at=now() - timedelta(seconds=1))
+        out = StringIO()
+        call_command("release_expired_reservations", stdout=out)
+        self.assertIn("Released 1 expired reservations", out.getvalue())
+        self.assertStock(10, 3)
+        self.assertEqual(StockReservation.objects.get().order_id, self.other.id)
+
+    def test_resync_repairs_drift(self):
+        self.add_parts(self.order, 5)
+        Product.objects.filter(pk=self.product.pk).update(reserved_quantity=9)
+        out = StringIO()
+        call_command("release_expired_reservations", "--resync", stdout=out)
+        self.assertIn("Resynced reserved quantity of 1 products", out.getvalue())
+        self.assertStock(10, 5)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs row locks")
+class FinalizeOrderConcurrencyTestCase(TransactionTestCase):
+    def test_concurrent_finalize_does_not_oversell(self):
+        product = Product.objects.create(
+            name="Clutch", sku="CL-1", price=90, quantity=3
+        )
+        orders = []
+        for i in range(4):
+            order = OrderCard.objects.create(
+                customer_name=f"Customer {i}",
+                customer_address="Pune",
+                customer_phone=f"98000000{i:02d}",
+            )
+            OrderPart.objects.create(
+                order=order, product=product, part_id=str(product.id), quantity=1
+            )
+            orders.append(order)
+        # Two requests per order race each other as well
+        urls = [f"/api/orders/{order.id}/finalize/" for order in orders] * 2
+
+        def finalize(url):
+            try:
+                return APIClient().post(url).status_code
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=len(urls)) as pool:
+            codes = list(pool.map(finalize, urls))
+
+        product.refresh_from_db()
+        self.assertEqual(product.quantity, 0)
+        # The order left without stock is refused on both of its requests
+        self.assertEqual(codes.count(status.HTTP_400_BAD_REQUEST), 2)
+        self.assertEqual(
+            OrderCard.objects.filter(stock_deducted_at__isnull=False).count(), 3
+        )
+
+
+def create_order(i):
+    return OrderCard.objects.create(
+        customer_name=f"Customer {i}",
+        customer_address="Pune",
+        customer_phone=f"98{i:08d}",
+    )
+
+
+class OrderNumberTestCase(TestCase):
+    def test_numbers_increase_from_start(self):
+        first, second = create_order(1), create_order(2)
+        self.assertGreaterEqual(first.order_number, 100)
+        self.assertEqual(second.order_number, first.order_number + 1)
+
+    def test_allocation_does_not_touch_orders(self):
+        create_order(1)
+        with CaptureQueriesContext(connection) as queries:
+            create_order(2)
+        reads = [q["sql"] for q in queries if "order_ordercard" in q["sql"]]
+        self.assertEqual(len(reads), 1, reads)
+        self.assertTrue(reads[0].startswith("INSERT"))
+
+    def test_counter_continues_after_existing_numbers(self):
+        OrderCard.objects.create(
+            order_number=500,
+            customer_name="Asha",
+            customer_address="Pune",
+            customer_phone="9800000001",
+        )
+        SequenceCounter.objects.all().delete()
+        self.assertEqual(
+            next_counter_value(
+                SequenceCounter.ORDER_NUMBER,
+                start=100,
+                seed=lambda: OrderCard.objects.get().order_number,
+            ),
+            501,
+        )
+        self.assertEqual(next_counter_value("fresh", start=100), 100)
+        self.assertEqual(next_counter_value("fresh", count=10), 101)
+        self.assertEqual(next_counter_value("fresh"), 111)
+
+
+@skipUnless(connection.vendor == "postgresql", "needs a real sequence")
+class OrderNumberSequenceTestCase(TransactionTestCase):
+    def test_parallel_creates_get_unique_numbers(self):
+        def create(i):
+            try:
+                return create_order(i).order_number
+            finally:
+                connections.close_all()
+
+        with ThreadPoolExecutor(max_workers=16) as pool:
+            numbers = list(pool.map(create, range(300)))
+
+        self.assertEqual(len(set(numbers)), 300)
+        self.assertGreaterEqual(min(numbers), 100)
+        self.assertEqual(
+            sorted(numbers),
+            sorted(OrderCard.objects.values_list("order_number", flat=True)),
+        )
+
+    def test_sequence_moves_past_existing_numbers(self):
+        highest = create_order(0).order_number + 1000
+        OrderCard.objects.create(
+            order_number=highest,
+            customer_name="Asha",
+            customer_address="Pune",
+            customer_phone="9800000001",
+        )
+        create_order_number_sequence(sender=None)
+        self.assertEqual(create_order(1).order_number, highest + 1)
+
+
+class OrderIndexPlanTestCase(IndexPlanTestCase):
+    """
+    Each OrderCardFilter lookup, in list order, must be answered from an index.
+    """
+
+    table = "order_ordercard"
+
+    FILTERS = [
+        ({"status": "Pending"}, "order_status_idx"),
+        ({"progress_status": "2"}, "order_progress_idx"),
+        (
+            {"team_lead": "00000000-0000-0000-0000-000000000001"},
+            "order_team_lead_idx",
+        ),
+        (
+            {"sales_executive": "00000000-0000-0000-0000-000000000001"},
+            "order_sales_exec_idx",
+        ),
+        ({"customer_phone": "9800000000"}, "order_phone_idx"),
+        (
+            {"created_after": "2024-01-01", "created_before": "2024-02-01"},
+            "order_created_idx",
+        ),
+    ]
+
+    def test_filters_use_indexes(self):
+        for data, index in self.FILTERS:
+            plan = self.explain_request("/api/orders/", data)
+            self.assertSearchesIndex(plan, index, f"{data}: {plan}")
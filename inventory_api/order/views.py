@@ -1,7 +1,18 @@
 from rest_framework.views import APIView
 from rest_framework.response import Response
 from rest_framework import status
+from .filters import OrderCardFilter
 from .models import OrderCard, OrderPart
+from .pagination import OrderCardPagination
+from .stock import (
+    InsufficientStock,
+    StockConflict,
+    deduct_order_stock,
+    release_order_reservations,
+    reserve_order_stock,
+)
+from inventory.cache import invalidates_product_cache
+from inventory.fastpath import FastReadSerializer, fast_read_enabled
 from inventory.models import Product
 from .serializers import (
     OrderCardDetailSerializer,
@@ -10,20 +21,74 @@ from .serializers import (
     SendOTPSerializer,
     VerifyOTPSerializer,
 )
-from django.db import IntegrityError
+import uuid
+from django.db import IntegrityError, transaction
+from django.db.models import Prefetch
+from django.utils.timezone import now
 from django.core.mail import send_mail
 from django.shortcuts import get_object_or_404
 
 
 class OrderCardListView(APIView):
     """
-    Get a list of all orders.
+    Get a list of orders with:
+    - Filtering (status, progress status, staff, customer phone, dates)
+    - Cursor pagination (`cursor`, `page_size`, `ordering`)
+
+    Parts and their products are loaded with one prefetch query, so the
+    query count does not grow with the page size.
     """
 
     def get(self, request):
-        orders = OrderCard.objects.all().order_by("-created_at")
-        serializer = OrderCardDetailSerializer(orders, many=True)
-        return Response(serializer.data, status=status.HTTP_200_OK)
+        filterset = OrderCardFilter(data=request.GET, queryset=OrderCard.objects.all())
+        if not filterset.is_valid():
+            return Response(filterset.errors, status=status.HTTP_400_BAD_REQUEST)
+        orders = filterset.qs
+
+        ordering = request.GET.get("ordering")
+        paginator = OrderCardPagination()
+        context = {"request": request}
+        list_serializer = OrderCardDetailSerializer(context=context)
+
+        if fast_read_enabled():
+            fast = FastReadSerializer(list_serializer)
+            ordering_name = (ordering or paginator.default_ordering).lstrip("-")
+            paginator.get_ordering_field(orders, ordering_name)
+            page = paginator.paginate_queryset(
+                fast.get_values(orders, ordering_name),
+                request,
+                view=self,
+                ordering=ordering,
+            )
+            return paginator.get_paginated_response(fast.serialize(page))
+
+        orders = orders.only(*list_serializer.get_select_fields())
+        if "order_parts" in list_serializer.fields:
+            part_serializer = list_serializer.fields["order_parts"].child
+            orders = orders.prefetch_related(
+                Prefetch("order_parts", queryset=get_part_queryset(part_serializer))
+            )
+        page = paginator.paginate_queryset(
+            orders, request, view=self, ordering=ordering
+        )
+        serializer = OrderCardDetailSerializer(page, many=True, context=context)
+        return paginator.get_paginated_response(serializer.data)
+
+
+def get_part_queryset(part_serializer):
+    """
+    Order parts joined to their product, narrowed to the columns the
+    (possibly sparse) part serializer renders.
+    """
+    parts = OrderPart.objects.all()
+    select = [*part_serializer.get_select_fields(), "order"]
+    product_serializer = part_serializer.fields.get("product")
+    if product_serializer is not None:
+        parts = parts.select_related("product")
+        select += [
+            f"product__{name}" for name in product_serializer.get_select_fields()
+        ]
+    return parts.only(*select)
 
 
 class OrderCardCreateView(APIView):
@@ -55,14 +120,16 @@ class OrderCardDetailView(APIView):
     """
 
     def get(self, request, order_id):
+        context = {"request": request}
+        select = OrderCardDetailSerializer(context=context).get_select_fields()
         try:
-            order = OrderCard.objects.get(id=order_id)
+            order = OrderCard.objects.only(*select).get(id=order_id)
         except OrderCard.DoesNotExist:
             return Response(
                 {"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        serializer = OrderCardDetailSerializer(order)
+        serializer = OrderCardDetailSerializer(order, context=context)
         return Response(serializer.data, status=status.HTTP_200_OK)
 
 
@@ -94,10 +161,13 @@ class OrderCardDeleteView(APIView):
     Delete an order.
     """
 
+    @invalidates_product_cache
     def delete(self, request, order_id):
         try:
-            order = OrderCard.objects.get(id=order_id)
-            order.delete()
+            with transaction.atomic():
+                order = OrderCard.objects.select_for_update().get(id=order_id)
+                release_order_reservations(order)  # Before the cascade drops them
+                order.delete()
             return Response(
                 {"message": "Order deleted successfully"},
                 status=status.HTTP_204_NO_CONTENT,
@@ -111,105 +181,167 @@ class OrderCardDeleteView(APIView):
 class AddPartsToOrderView(APIView):
     """
     Handle adding, updating, or deleting multiple parts in an order.
+
+    The submitted list replaces the order's parts: products are loaded with
+    one `in_bulk`, diffed against the existing parts in memory, and the
+    result is written with one DELETE, one `bulk_create` and one
+    `bulk_update` in a single transaction. The parts' stock is reserved in
+    the same transaction (see `order.stock`), so a card that saves can be
+    finalized.
     """
 
+    @invalidates_product_cache
     def post(self, request, order_id):
-        try:
-            order = OrderCard.objects.get(id=order_id)
-        except OrderCard.DoesNotExist:
-            return Response(
-                {"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND
-            )
-
         parts = request.data.get("parts", [])  # List of parts
 
-        added_or_updated_parts = []  # To store added/updated parts
-        deleted_parts = []  # To store deleted parts
-
-        # Delete removed parts from db
-        parts_in_db = OrderPart.objects.filter(order=order)
-        received_part_ids = {part["part_id"] for part in parts}
-        parts_to_delete = parts_in_db.exclude(part_id__in=received_part_ids)
-        if parts_to_delete.exists():
-            try:
-                parts_to_delete.delete()
-            except OrderPart.DoesNotExist:
-                deleted_parts.append(
-                    {"part_id": product_id, "message": "Part not found"}
-                )
-
+        # Validate the whole list before touching the order
+        wanted = {}
         for part_data in parts:
-            product_id = part_data.get("part_id")
-            quantity = int(part_data.get("quantity", 1))
+            product_id = str(part_data.get("part_id"))
             try:
-                product = Product.objects.get(id=product_id)
-            except Product.DoesNotExist:
+                wanted[product_id] = int(part_data.get("quantity", 1))
+            except (TypeError, ValueError):
                 return Response(
-                    {"error": f"Product with ID {product_id} not found"},
-                    status=status.HTTP_404_NOT_FOUND,
+                    {"error": f"Invalid quantity for part {product_id}"},
+                    status=status.HTTP_400_BAD_REQUEST,
                 )
 
-            # Create or update the OrderPart
-            order_part, created = OrderPart.objects.get_or_create(
-                order=order,
-                product=product,
-                part_id=product_id,
-                defaults={
-                    "quantity": quantity,
-                },
-            )
-
+        try:
+            with transaction.atomic():
+                try:
+                    order = OrderCard.objects.select_for_update().get(id=order_id)
+                except OrderCard.DoesNotExist:
+                    return Response(
+                        {"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND
+                    )
+                products = self.get_products(wanted)
+                for product_id in wanted:
+                    if product_id not in products:
+                        return Response(
+                            {"error": f"Product with ID {product_id} not found"},
+                            status=status.HTTP_404_NOT_FOUND,
+                        )
+                results, to_create = self.save_parts(order, wanted, products)
+                if order.stock_deducted_at is None:
+                    reserved = {}
+                    for product_id, quantity in wanted.items():
+                        pk = products[product_id].pk
+                        reserved[pk] = reserved.get(pk, 0) + quantity
+                    reserve_order_stock(order, reserved)
+        except Product.DoesNotExist as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except InsufficientStock as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except StockConflict as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
+
+        added_or_updated_parts = [
+            OrderPartSerializer(results[str(part_data.get("part_id"))]).data
+            for part_data in parts
+        ]
+        created = {part.part_id for part in to_create}
+        if not parts:
+            code = status.HTTP_200_OK
+        elif str(parts[-1].get("part_id")) in created:
             code = status.HTTP_201_CREATED
-
-            if not created:
-                # If the part already exists, update the quantity and totals
-                order_part.quantity = quantity
-                order_part.save()
-                code = status.HTTP_204_NO_CONTENT
-
-            # Add the part to the response list
-            added_or_updated_parts.append(OrderPartSerializer(order_part).data)
+        else:
+            code = status.HTTP_204_NO_CONTENT
 
         return Response(
             {
                 "added_or_updated_parts": added_or_updated_parts,
-                "deleted_parts": deleted_parts,
+                "deleted_parts": [],
             },
             status=code,
         )
 
+    @staticmethod
+    def save_parts(order, wanted, products):
+        existing = {part.part_id: part for part in order.order_parts.all()}
+        to_create, to_update, results = [], [], {}
+        for product_id, quantity in wanted.items():
+            product = products[product_id]
+            part = existing.get(product_id)
+            if part is None:
+                part = OrderPart(
+                    order=order, product=product, part_id=product_id, quantity=quantity
+                )
+                to_create.append(part)
+            else:
+                part.product = product  # Already loaded, no lazy fetch
+                if part.quantity != quantity:
+                    part.quantity = quantity
+                    to_update.append(part)
+            results[product_id] = part
+        removed = [
+            part.id for part_id, part in existing.items() if part_id not in wanted
+        ]
+
+        if removed:
+            OrderPart.objects.filter(id__in=removed).delete()
+        OrderPart.objects.bulk_create(to_create)
+        OrderPart.objects.bulk_update(to_update, ["quantity"])
+        return results, to_create
+
+    @staticmethod
+    def get_products(product_ids):
+        ids = {}
+        for product_id in product_ids:
+            try:
+                ids[product_id] = uuid.UUID(product_id)
+            except ValueError:
+                continue  # Reported as not found
+        found = Product.objects.in_bulk(set(ids.values()))
+        return {product_id: found[pk] for product_id, pk in ids.items() if pk in found}
+
 
 class FinalizeOrderView(APIView):
+    """
+    Deduct the order's parts from stock and mark it finalized, all in one
+    transaction. The order row is locked first, so concurrent or repeated
+    finalizations of the same order deduct once; the order's reservations
+    become the deduction, and product rows are locked in pk order so
+    overlapping orders cannot deadlock (see `order.stock`).
+    """
+
+    @invalidates_product_cache
     def post(self, request, order_id):
         try:
-            order = OrderCard.objects.get(id=order_id)
-        except OrderCard.DoesNotExist:
-            return Response(
-                {"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND
-            )
-
-        # Deduct quantities from inventory
-        for part in order.order_parts.all():
-            try:
-                product = Product.objects.get(id=part.part_id)
-            except Product.DoesNotExist:
-                return Response(
-                    {"error": f"Product with ID {part.part_id} not found"},
-                    status=status.HTTP_404_NOT_FOUND,
-                )
-
-            if product.quantity >= part.quantity:
-                product.quantity -= part.quantity
-                product.save()
-            else:
-                return Response(
-                    {"error": f"Not enough stock for {product.name}"},
-                    status=status.HTTP_400_BAD_REQUEST,
-                )
-
-        # Mark order as finalized
-        order.status = "Finalized"
-        order.save()
+            with transaction.atomic():
+                try:
+                    order = OrderCard.objects.select_for_update().get(id=order_id)
+                except OrderCard.DoesNotExist:
+                    return Response(
+                        {"error": "Order not found"}, status=status.HTTP_404_NOT_FOUND
+                    )
+                if order.stock_deducted_at is not None:
+                    return Response(
+                        {"message": "Order already finalized."},
+                        status=status.HTTP_200_OK,
+                    )
+
+                wanted = {}
+                for part in order.order_parts.all():
+                    try:
+                        pk = uuid.UUID(part.part_id)
+                    except ValueError:
+                        return Response(
+                            {"error": f"Product with ID {part.part_id} not found"},
+                            status=status.HTTP_404_NOT_FOUND,
+                        )
+                    wanted[pk] = wanted.get(pk, 0) + part.quantity
+                deduct_order_stock(order, wanted)
+
+                # Mark order as finalized
+                order.status = "Finalized"
+                order.stock_deducted_at = now()
+                order.save(update_fields=["status", "stock_deducted_at", "updated_at"])
+        except Product.DoesNotExist as e:
+            return Response({"error": str(e)}, status=status.HTTP_404_NOT_FOUND)
+        except InsufficientStock as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        except StockConflict as e:
+            return Response({"error": str(e)}, status=status.HTTP_409_CONFLICT)
 
         return Response(
             {"message": "Order finalized and inventory updated."},